@@ -28,6 +28,7 @@ function run () {
         --env "GIT_COMMIT=$GIT_COMMIT" \
         --env "DRY_RUN=$DRY_RUN" \
         --env "DEBUG=$DEBUG" \
+        --env "POLYGON_PRIORITY=$POLYGON_PRIORITY" \
         -v "$DATA_DIR":/data \
         -v "$APP_DIR":/app \
         $daemon \
@@ -94,20 +95,24 @@ case $action in
     # Strategy: biggest loser stocks
     "biggest-loser-stocks-buy")
         refresh_tokens_if_needed
+        export POLYGON_PRIORITY=live
         run_py_main src.strat.losers.stocks "buy"
         ;;
     "biggest-loser-stocks-sell")
         refresh_tokens_if_needed
+        export POLYGON_PRIORITY=live
         run_py_main src.strat.losers.stocks "sell"
         ;;
 
     # Strategy: biggest loser warrants
     "biggest-loser-warrants-buy")
         refresh_tokens_if_needed
+        export POLYGON_PRIORITY=live
         run_py_main src.strat.losers.warrants "buy"
         ;;
     "biggest-loser-warrants-sell")
         refresh_tokens_if_needed
+        export POLYGON_PRIORITY=live
         run_py_main src.strat.losers.warrants "sell"
         ;;
 
@@ -119,6 +124,7 @@ case $action in
         ;;
 
     "meemaw")
+        export POLYGON_PRIORITY=live
         run_py_main src.strat.meemaw.live
         ;;
 
@@ -188,6 +194,7 @@ case $action in
             
             # TODO: retest after refactor
             "record")
+                export POLYGON_PRIORITY=live
                 run_py_main src.backtest.chronicle.record "$@"
                 ;;
             
@@ -206,17 +213,20 @@ case $action in
         esac
         ;;
 
+    # (Polygon requests of cache backfills yield to live ones, see src/data/rate_limit.py)
     "prepare-grouped-aggs-cache")
+        export POLYGON_PRIORITY=backfill
         run_py_main src.scripts.build_grouped_aggs_cache "$@"
         ;;
     
     "prepare-ticker-details-cache")
+        export POLYGON_PRIORITY=backfill
         run_py_main src.scripts.build_ticker_details_cache "$@"
         ;;
 
     "collector-nightly")
         today=`date +%Y-%m-%d`
-        ./run.sh prepare-grouped-aggs-cache --end $today --start end-2y --clear # polygon free tier limits data to 2 years back
+        ./run.sh prepare-grouped-aggs-cache --end $today --start end-2y --prune # polygon free tier limits data to 2 years back (re-run resumes where it stopped, older days are deleted)
         ./run.sh prepare-ticker-details-cache --end $today --start end-2y # match grouped-aggs cache
 
         ./run.sh chronicle create supernovas --start end-1y --end $today  # finnhub free tier limits data to 1 year back
@@ -407,6 +417,10 @@ case $action in
             "simulate-account")
                 run_py_main src.risk.simulate_account "$@"
                 ;;
+
+            "monte-carlo-sizing")
+                run_py_main src.risk.monte_carlo "$@"
+                ;;
             
             "export-pine")
                 run_py_main src.outputs.to_pine_script "$@" | pbcopy
@@ -1,50 +1,108 @@
 import argparse
+import collections
+from collections.abc import Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
 from copy import deepcopy
 from datetime import date, datetime, time, timedelta
 import logging
 import os
-from typing import Iterable, Optional, cast
+from typing import Iterable, Iterator, Optional, cast
 import typing
+
+import numpy as np
+
 from src.backtest.chronicle import types
-from src.data.polygon import get_candles
+from src.data.polygon import candle_arrays
 from src.data.types.candles import CandleIntraday
 from src.data.polygon.grouped_aggs import Ticker, get_cache_entry_refresh_time, get_cache_prepared_date_range_with_leadup_days
 from src.scripts.helpers.parse_period import add_range_args, interpret_args
 
 from src.scan.utils.all_tickers_on_day import get_all_tickers_on_day
-from src.scan.utils.scanners import PrescannerFilter, ScannerFilter, get_leadup_period, get_prescanner_filter, get_scanner_filter
+from src.scan.utils.scanners import PrescannerFilter, ScannerFilter, get_leadup_period, get_prescanner_filter, get_scanner_filter, get_scanner_module_hash
 from src.trading_day import MARKET_TIMEZONE, generate_trading_days
 
 
 from src.backtest.chronicle import from_backtest
 
-# TODO: to parallelize, need to synchronize cache read/writes by cache key to avoid potential data corruption issues
-# (or demand that parallelization only be by day, then only sync when cross day boundaries? case a: float/short interest (sync). case b: yesterday's 1m candles (no sync). case c: monday of this week's 1m candles (sync))
-
-
-def build_daily_candle_from_1m_candles(symbol: str, candles: list[CandleIntraday]) -> Optional[Ticker]:
-    if not candles:
-        return None
-
-    opening_candle = next(
-        filter(lambda c: c["datetime"].time() >= time(9, 30), candles), None)
-    if not opening_candle:
-        return None
-
-    high = 0
-    low = 1e9
-    volume = 0
-    close = opening_candle['close']
-    o = opening_candle['open']
-    for candle in candles:
-        if candle['datetime'].time() >= time(9, 30):
-            if not o:
-                o = candle['open']
-
-            high = max(high, candle['high'])
-            low = min(low, candle['low'])
-
-        close = candle['close']
+# Days are independent, so they are backtested in parallel (one day per worker process).
+# Workers share the cache: writes are atomic and fetches are locked per cache key (see src/caching/basics.py),
+# so e.g. float/short interest or leadup candles needed by several days are fetched once and never read half-written.
+
+
+class CandlesPrefix(Sequence):
+    """
+    The first `length` candles of a candle array, without copying them.
+    Candles are only turned into `CandleIntraday` dicts when accessed.
+    """
+
+    def __init__(self, candles: np.ndarray, length: int):
+        self.candles = candles
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return candle_arrays.to_candles(self.candles[:self.length][index])
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("candle index out of range")
+        return candle_arrays.to_candle(self.candles[index])
+
+    def __iter__(self) -> Iterator[CandleIntraday]:
+        return (candle_arrays.to_candle(row) for row in self.candles[:self.length])
+
+
+def get_market_open_timestamp(day: date) -> int:
+    return int(datetime.combine(day, time(9, 30), tzinfo=MARKET_TIMEZONE).timestamp())
+
+
+class DailyCandleAccumulator:
+    """
+    Builds a symbol's daily candle as it develops, adding 1m candles (a candle array, see `candle_arrays`)
+    as time advances. Each candle is only added once.
+    """
+
+    def __init__(self, symbol: str, candles: np.ndarray, day: date):
+        self.symbol = symbol
+        self.candles = candles
+        self.open_timestamp = get_market_open_timestamp(day)
+        self.count = 0  # candles seen so far
+
+        self.is_open = False
+        self.open = 0.
+        self.high = 0.
+        self.low = 1e9
+        self.close = 0.
+        self.volume = 0.
+        self.trades = 0
+        self.volume_price = 0.  # sum of volume * price, for VWAP
+
+    def advance(self, until: datetime) -> None:
+        """Adds candles starting before `until`."""
+        end = int(np.searchsorted(
+            self.candles["t"], until.timestamp(), side="left"))
+        if end > self.count:
+            self.add(self.candles[self.count:end])
+            self.count = end
+
+    def add(self, candles: np.ndarray) -> None:
+        regular = candles[candles["t"] >= self.open_timestamp]
+        if len(regular):
+            if not self.is_open:
+                self.is_open = True
+                self.open = float(regular["open"][0])
+            if not self.open:
+                opens = regular["open"][regular["open"] != 0]
+                if len(opens):
+                    self.open = float(opens[0])
+
+            self.high = max(self.high, float(regular["high"].max()))
+            self.low = min(self.low, float(regular["low"].min()))
+
+        self.close = float(candles["close"][-1])
 
         # https://forum.alpaca.markets/t/unstable-minute-bar-real-time-data-2022-03-30-googl/8996/9
         # > Volume is a dilemma. Most trades, including most of those excluded above, are included in volume calculations.
@@ -56,33 +114,47 @@ def build_daily_candle_from_1m_candles(symbol: str, candles: list[CandleIntraday
 
         # This will *underestimate* volume. This is a consequence of how candles work and how some trades are excluded from candles.
 
-        volume += candle['volume']
-
-    dcandle: Ticker = {
-        "T": symbol,
-        "o": o,
-        "h": high,
-        "l": low,
-        "c": close,
-        "v": int(volume),
-
-        # obvously wrong values so that nobody uses them
-        # TODO: implement VWAP field based on 1m candles (then correct README.md)
-        "vw": 0,
-        "n": 0,
-    }
-    return dcandle
+        self.volume += float(candles["volume"].sum())
+        self.trades += int(candles["trades"].sum())
+
+        # candles from Polygon have their own VWAP, otherwise use typical price
+        typical_price = (candles["high"] + candles["low"] + candles["close"]) / 3
+        price = np.where(np.isnan(candles["vwap"]) | (
+            candles["vwap"] == 0), typical_price, candles["vwap"])
+        self.volume_price += float((price * candles["volume"]).sum())
+
+    def get_candles(self) -> CandlesPrefix:
+        return CandlesPrefix(self.candles, self.count)
+
+    def build(self) -> Optional[Ticker]:
+        if not self.is_open:
+            return None
+
+        dcandle: Ticker = {
+            "T": self.symbol,
+            "o": self.open,
+            "h": self.high,
+            "l": self.low,
+            "c": self.close,
+            "v": int(self.volume),
+            # (same caveats as volume: trades without a 1m candle are missing)
+            "vw": self.volume_price / self.volume if self.volume else self.close,
+            "n": self.trades,
+        }
+        return dcandle
+
+
+def build_daily_candle_from_1m_candles(symbol: str, candles: np.ndarray, day: date) -> Optional[Ticker]:
+    if not len(candles):
+        return None
+    accumulator = DailyCandleAccumulator(symbol, candles, day)
+    accumulator.add(candles)
+    return accumulator.build()
 
 
-def get_1m_candles_by_symbol(symbols: list[str], day: date) -> dict[str, list[CandleIntraday]]:
-    symbol_to_candles: dict[str, list[CandleIntraday]] = {}
-    for symbol in symbols:
-        candles = get_candles.get_1m_candles(symbol, day, day)
-        if not candles:
-            logging.warn(f"no candles for {symbol} on {day}, {candles=}")
-            continue
-        symbol_to_candles[symbol] = candles
-    return symbol_to_candles
+def get_1m_candles_by_symbol(symbols: list[str], day: date) -> dict[str, np.ndarray]:
+    """Candle arrays (see `candle_arrays`) of symbols having candles on `day`."""
+    return candle_arrays.get_1m_candle_arrays(symbols, day)
 
 
 def every_minute(minutes=1):
@@ -152,11 +224,16 @@ def backtest_on_day(day: date, scanner_filter: ScannerFilter, prescanner_filter:
     tickers = list(filter(lambda t: t["T"] in symbol_to_candles, tickers))
 
     # Adjust 1m candles as we go
+    market_open_timestamp = get_market_open_timestamp(day)
     for ticker in tickers:
         adjusted_open = ticker['o']
-        opening_unadjusted_candle = next(filter(lambda c: c['datetime'].time() >= time(
-            9, 30), symbol_to_candles[ticker['T']]))
-        unadjusted_open = opening_unadjusted_candle['open']
+        candles = symbol_to_candles[ticker['T']]
+        opening_index = int(np.searchsorted(
+            candles['t'], market_open_timestamp, side='left'))
+        if opening_index == len(candles):
+            # no candle during market hours, will not show up in daily candles anyway
+            continue
+        unadjusted_open = float(candles['open'][opening_index])
 
         open_price_ratio = (adjusted_open / unadjusted_open)
         if (day, ticker['T']) in [
@@ -164,7 +241,7 @@ def backtest_on_day(day: date, scanner_filter: ScannerFilter, prescanner_filter:
             (date(2020, 8, 24), 'ONTX'),
         ]:
             # data from stock split is kinda screwed up
-            symbol_to_candles[ticker['T']] = []  # means: skip this one later
+            symbol_to_candles[ticker['T']] = candles[:0]  # means: skip this one later
             continue
 
         if round(open_price_ratio, 3) in (
@@ -177,14 +254,10 @@ def backtest_on_day(day: date, scanner_filter: ScannerFilter, prescanner_filter:
             0.033,  # 1:30
         ):
             # 2022-08-25 09:41:03,438   WARNING  2020-08-24 ONTX mismatch open price! adjusted_open=4.128 unadjusted_open=4.779 ratio=0.8637790332705587 TODO: implement candle adjustment
-            symbol_to_candles[ticker['T']] = [{
-                'datetime': c['datetime'],
-                'close': c['close'] * open_price_ratio,
-                'open': c['open'] * open_price_ratio,
-                'high': c['high'] * open_price_ratio,
-                'low': c['low'] * open_price_ratio,
-                'volume': c['volume']
-            } for c in symbol_to_candles[ticker['T']]]
+            adjusted_candles = candles.copy()
+            for field in ('open', 'high', 'low', 'close', 'vwap'):
+                adjusted_candles[field] *= open_price_ratio
+            symbol_to_candles[ticker['T']] = adjusted_candles
         elif open_price_ratio > 1.01 or open_price_ratio < 0.99:
             # obvious stock split
             logging.warn(
@@ -195,25 +268,30 @@ def backtest_on_day(day: date, scanner_filter: ScannerFilter, prescanner_filter:
     # simulate intraday daily candles as they develop
     # (pay attention to how we call scanner)
 
+    accumulators = {
+        t['T']: DailyCandleAccumulator(t['T'], symbol_to_candles[t['T']], day)
+        for t in tickers
+    }
+
     for current_time in times:
         current_datetime = datetime.combine(
             day, current_time, tzinfo=MARKET_TIMEZONE)
-        # build map of symbol to candles visible at current_time
-        symbol_to_current_candles = {}
-        for symbol, candles in symbol_to_candles.items():
-            symbol_to_current_candles[symbol] = list(
-                filter(lambda c: c["datetime"] < current_datetime, candles))
 
-        # build simulated intraday candles
-        daily_candles = [build_daily_candle_from_1m_candles(t['T'],
-                                                            symbol_to_current_candles[t['T']]) for t in tickers if symbol_to_current_candles[t['T']]]
-        daily_candles = [d for d in daily_candles if d]
+        # build simulated intraday candles from candles visible at current_time
+        # (each candle is only added once, as time advances)
+        daily_candles = []
+        for accumulator in accumulators.values():
+            accumulator.advance(current_datetime)
+            daily_candle = accumulator.build()
+            if daily_candle:
+                daily_candles.append(daily_candle)
 
         # filter candidates, record results
         returned_tickers = scanner_filter(
             daily_candles,
             day,
-            lambda s, t, st, en: symbol_to_current_candles[s]
+            lambda s, t, st, en: cast(
+                list[CandleIntraday], accumulators[s].get_candles())
         )
 
         yield types.Snapshot(now=current_datetime, entries=[
@@ -228,12 +306,14 @@ def main():
     parser = add_range_args(parser, required=False)
     parser.add_argument("--frequency", choices=["1m", "5m", "15m",
                         "30m", "1h", "close", "close-11m", "close-15m"], default='close')
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild every day, even if its inputs did not change")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes backtesting days in parallel")
     args = parser.parse_args()
 
     target_chronicle_name = args.target_chronicle_name
     scanner_name = args.scanner
-    scanner_filter = get_scanner_filter(scanner_name)
-    prescanner_filter = get_prescanner_filter(scanner_name)
     leadup_period = get_leadup_period(scanner_name)
 
     cache_start, cache_end = get_cache_prepared_date_range_with_leadup_days(
@@ -271,16 +351,53 @@ def main():
 
     logging.info("Building chronicle...")
 
-    snapshot_feed = yield_snapshots(
-        start, end, scanner_filter, prescanner_filter, times)
-    from_backtest.write_snapshots(
+    days = list(generate_trading_days(start, end))
+    recomputed_days = from_backtest.update_snapshots(
         target_chronicle_name,
-        snapshot_feed,
+        lambda days: yield_snapshots_for_days(
+            days, scanner_name, times, workers=args.workers),
         types.ChronicleMeta(start=start, end=end, classification='backtest',
-                            origin=scanner_name, commit=os.environ.get("GIT_COMMIT", 'dev'))
+                            origin=scanner_name, commit=os.environ.get("GIT_COMMIT", 'dev')),
+        days=days,
+        scanner_hash=get_scanner_module_hash(scanner_name),
+        times=[t.strftime("%H:%M") for t in times],
+        leadup_period=leadup_period,
+        full=args.full,
     )
+    logging.info(f"recomputed {len(recomputed_days)}/{len(days)} days")
 
 
-def yield_snapshots(start: date, end: date, scanner_filter: ScannerFilter, prescanner_filter: PrescannerFilter, times: typing.Optional[list[time]] = None) -> typing.Iterator[types.Snapshot]:
-    for day in generate_trading_days(start, end):
-        yield from backtest_on_day(day, scanner_filter, prescanner_filter, times)
+def yield_snapshots(start: date, end: date, scanner: str, times: typing.Optional[list[time]] = None, workers: int = 1) -> typing.Iterator[types.Snapshot]:
+    yield from yield_snapshots_for_days(list(generate_trading_days(start, end)), scanner, times, workers=workers)
+
+
+def _backtest_day(day: date, scanner: str, times: typing.Optional[list[time]]) -> list[types.Snapshot]:
+    # (filters are resolved here: prescanners are closures, which can't be sent to worker processes)
+    return list(backtest_on_day(day, get_scanner_filter(scanner), get_prescanner_filter(scanner), times))
+
+
+def yield_snapshots_for_days(days: list[date], scanner: str, times: typing.Optional[list[time]] = None, workers: int = 1) -> typing.Iterator[types.Snapshot]:
+    """
+    Snapshots of `scanner` on `days`, in order. With `workers` > 1, days are backtested in that many processes.
+    """
+    if workers <= 1 or len(days) <= 1:
+        scanner_filter = get_scanner_filter(scanner)
+        prescanner_filter = get_prescanner_filter(scanner)
+        for day in days:
+            yield from backtest_on_day(day, scanner_filter, prescanner_filter, times)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # keep a bounded number of days in flight, yielding them in day order as they complete
+        pending: collections.deque[Future] = collections.deque()
+        try:
+            for day in days:
+                pending.append(executor.submit(
+                    _backtest_day, day, scanner, times))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
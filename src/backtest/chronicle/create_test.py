@@ -0,0 +1,135 @@
+from datetime import date, datetime, time
+import time as time_module
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.backtest.chronicle import create, types
+from src.data.polygon import candle_arrays, ticker_types_index
+from src.trading_day import MARKET_TIMEZONE, generate_trading_days
+
+DAYS = list(generate_trading_days(date(2022, 1, 3), date(2022, 1, 14)))
+
+
+def fake_backtest_on_day(day, scanner_filter, prescanner_filter, times):
+    # earlier days finish last
+    time_module.sleep(0.01 * (len(DAYS) - DAYS.index(day)))
+    for t in times:
+        now = datetime.combine(day, t, tzinfo=MARKET_TIMEZONE)
+        yield types.Snapshot(now=now, entries=[])
+
+
+class TestYieldSnapshotsForDays(unittest.TestCase):
+    @mock.patch.object(create, "backtest_on_day", side_effect=fake_backtest_on_day)
+    def test_parallel_snapshots_are_in_day_order(self, _backtest_on_day):
+        times = [time(9, 30), time(15, 59)]
+        expected = list(create.yield_snapshots_for_days(
+            DAYS, "supernovas", times))
+
+        snapshots = list(create.yield_snapshots_for_days(
+            DAYS, "supernovas", times, workers=4))
+
+        self.assertEqual([s.now for s in snapshots],
+                         [s.now for s in expected])
+        self.assertEqual(len(snapshots), 2 * len(DAYS))
+
+    @mock.patch("src.scan.utils.asset_class.get_ticker_type_masks",
+                side_effect=lambda symbols, _day, _types: np.full(len(symbols), ticker_types_index.TYPE_BITS["CS"]))
+    @mock.patch.object(create, "get_1m_candles_by_symbol", side_effect=lambda symbols, day: {symbol: make_nova_candles(day) if symbol == "NOVA" else make_candles(day) for symbol in symbols})
+    @mock.patch.object(create, "get_all_tickers_on_day", side_effect=lambda day: [
+        {"T": "NOVA", "o": 3., "h": 16., "l": 2., "c": 15., "v": 2800, "n": 28, "vw": 10.},
+        {"T": "FLAT", "o": 12., "h": 13., "l": 11., "c": 12.5, "v": 2800, "n": 28, "vw": 12.},
+    ])
+    def test_workers_run_scanner_module(self, *_mocks):
+        # (worker processes are forked, mocks included)
+        times = [time(15, 59)]
+        expected = list(create.yield_snapshots_for_days(
+            DAYS[:4], "supernovas", times))
+
+        snapshots = list(create.yield_snapshots_for_days(
+            DAYS[:4], "supernovas", times, workers=2))
+
+        self.assertEqual([[entry.ticker["T"] for entry in s.entries] for s in snapshots], [["NOVA"]] * 4)
+        self.assertEqual([s.to_dict() for s in snapshots], [s.to_dict() for s in expected])
+
+
+def make_candles(day: date) -> np.ndarray:
+    raw_candles = []
+    for i, (hour, minute) in enumerate([(9, 0), (9, 29), (9, 30), (9, 31), (10, 0), (15, 59), (16, 30)]):
+        price = 10. + i
+        raw_candles.append({
+            "t": int(datetime.combine(day, time(hour, minute), tzinfo=MARKET_TIMEZONE).timestamp()) * 1000,
+            "o": price - 0.5,
+            "h": price + 1,
+            "l": price - 1,
+            "c": price,
+            "v": 100 * (i + 1),
+            "n": i + 1,
+            "vw": price + 0.25,
+        })
+    return candle_arrays.from_raw_candles(raw_candles)
+
+
+def make_nova_candles(day: date) -> np.ndarray:
+    candles = make_candles(day)
+    # opens at 3, closes at 15 (+400%)
+    candles["open"][2] = 3.
+    candles["low"][2] = 2.
+    return candles
+
+
+class TestDailyCandleAccumulator(unittest.TestCase):
+    def assertCandlesAlmostEqual(self, a, b):
+        assert a and b
+        self.assertEqual(a.keys(), b.keys())
+        for key in a:
+            self.assertAlmostEqual(a[key], b[key], msg=key)
+
+    def test_matches_candle_built_from_scratch(self):
+        day = DAYS[0]
+        candles = make_candles(day)
+        accumulator = create.DailyCandleAccumulator("AAPL", candles, day)
+
+        for t in create.every_minute() + [time(23, 59)]:
+            now = datetime.combine(day, t, tzinfo=MARKET_TIMEZONE)
+            accumulator.advance(now)
+
+            visible = candles[candles["t"] < now.timestamp()]
+            self.assertEqual([c["datetime"] for c in accumulator.get_candles()],
+                             [c["datetime"] for c in candle_arrays.to_candles(visible)])
+
+            expected = create.build_daily_candle_from_1m_candles(
+                "AAPL", visible, day)
+            if expected:
+                self.assertCandlesAlmostEqual(accumulator.build(), expected)
+            else:
+                self.assertIsNone(accumulator.build())
+
+        daily_candle = accumulator.build()
+        assert daily_candle
+        self.assertEqual((daily_candle["o"], daily_candle["h"], daily_candle["l"], daily_candle["c"]),
+                         (11.5, 17., 11., 16.))
+        self.assertEqual((daily_candle["v"], daily_candle["n"]), (2800, 28))
+        volume_price = sum((10. + i + 0.25) * 100 * (i + 1) for i in range(7))
+        self.assertAlmostEqual(daily_candle["vw"], volume_price / 2800)
+
+    def test_no_candle_before_open(self):
+        day = DAYS[0]
+        candles = make_candles(day)
+        accumulator = create.DailyCandleAccumulator("AAPL", candles, day)
+        accumulator.advance(datetime.combine(
+            day, time(9, 30), tzinfo=MARKET_TIMEZONE))
+
+        self.assertEqual(len(accumulator.get_candles()), 2)
+        self.assertIsNone(accumulator.build())
+
+    def test_candles_prefix(self):
+        candles = make_candles(DAYS[0])
+        prefix = create.CandlesPrefix(candles, 3)
+
+        self.assertEqual(len(prefix), 3)
+        self.assertEqual(prefix[-1], candle_arrays.to_candle(candles[2]))
+        self.assertEqual(prefix[1:], candle_arrays.to_candles(candles[1:3]))
+        with self.assertRaises(IndexError):
+            prefix[3]
@@ -1,19 +1,30 @@
+import datetime
 import os
 import shutil
 import typing
-from src.backtest.chronicle import types
+from src.backtest.chronicle import snapshot_index, types
 from src.outputs import pathing, json_dump, jsonl_dump
 
 
 def get(chronicle_name: str) -> types.Chronicle:
+    """Whole chronicle (prefer `read_snapshots` to go through snapshots without keeping them)."""
+    # (`list` is shadowed here)
+    snapshots = [snapshot for snapshot in read_snapshots(chronicle_name)]
+    return types.Chronicle.from_data(snapshots, get_metadata(chronicle_name))
+
+
+def get_metadata(chronicle_name: str) -> types.ChronicleMeta:
     paths = pathing.get_chronicle_folder_paths(chronicle_name)
+    return types.ChronicleMeta.from_dict(json_dump.read_json(paths['metadata.json']))
 
-    metadata = types.ChronicleMeta.from_dict(
-        json_dump.read_json(paths['metadata.json']))
-    snapshots = [types.Snapshot.from_dict(
-        l) for l in jsonl_dump.read_jsonl_lines(paths['snapshots.jsonl'])]
 
-    return types.Chronicle.from_data(snapshots, metadata)
+def read_snapshots(chronicle_name: str, start: typing.Optional[datetime.date] = None, end: typing.Optional[datetime.date] = None) -> typing.Iterator[types.Snapshot]:
+    """
+    Snapshots between `start` and `end` (inclusive) one at a time, seeking to `start`.
+    Entries of a snapshot are decoded when accessed.
+    """
+    paths = pathing.get_chronicle_folder_paths(chronicle_name)
+    return snapshot_index.read_snapshots(paths['snapshots.jsonl'], paths['snapshots.index.json'], start, end)
 
 
 def delete(chronicle_name: str):
@@ -47,3 +58,19 @@ def append_snapshots(chronicle_name: str, snapshots: typing.Iterable[types.Snaps
     jsonl_dump.append_jsonl(paths['snapshots.jsonl'], (
         snapshot.to_dict() for snapshot in snapshots
     ))
+
+
+def append_missed_minutes(chronicle_name: str, missed_minutes: typing.Iterable[types.MissedMinute]):
+    paths = pathing.get_chronicle_folder_paths(chronicle_name)
+
+    jsonl_dump.append_jsonl(paths['missed_minutes.jsonl'], (
+        missed_minute.to_dict() for missed_minute in missed_minutes
+    ))
+
+
+def read_missed_minutes(chronicle_name: str) -> typing.List[types.MissedMinute]:
+    paths = pathing.get_chronicle_folder_paths(chronicle_name)
+    try:
+        return [types.MissedMinute.from_dict(d) for d in jsonl_dump.read_jsonl_lines(paths['missed_minutes.jsonl'], schema=types.MISSED_MINUTE_SCHEMA)]
+    except FileNotFoundError:
+        return []
@@ -1,3 +1,4 @@
+from collections import Counter
 from datetime import datetime, time, timedelta
 import logging
 from typing import Iterator, Optional, Tuple
@@ -25,14 +26,16 @@ def main():
     chronicle_names = crud.list()
     for chronicle_name in chronicle_names:
         print(chronicle_name)
-        chronicle = crud.get(chronicle_name)
-        print(f'    meta.start: {chronicle.metadata.start}')
-        print(f'    meta.end  : {chronicle.metadata.end  }')
-        print(f'    meta.class: {chronicle.metadata.classification  }')
-        print(f'    meta.origin: {chronicle.metadata.origin  }')
-        print(f'    meta.commit: {chronicle.metadata.commit  }')
-
-        start, end, gaps = get_chronicle_span(iter(chronicle.snapshots))
+        chronicle_metadata = crud.get_metadata(chronicle_name)
+        print(f'    meta.start: {chronicle_metadata.start}')
+        print(f'    meta.end  : {chronicle_metadata.end  }')
+        print(f'    meta.class: {chronicle_metadata.classification  }')
+        print(f'    meta.origin: {chronicle_metadata.origin  }')
+        print(f'    meta.commit: {chronicle_metadata.commit  }')
+
+        # (only times are needed, so entries are never decoded)
+        start, end, gaps = get_chronicle_span(
+            crud.read_snapshots(chronicle_name))
         if not start or not end or gaps is None:
             logging.warn(
                 f"{chronicle_name} is empty, skipping")
@@ -49,7 +52,7 @@ def main():
             logging.warn(
                 f"{chronicle_name} has bad end time of {end.time()}")
 
-        if chronicle.metadata.is_recorded():
+        if chronicle_metadata.is_recorded():
             # Issues that can happen:
             # 1. Recording is too short ("partial recording")
             #    (may be able to combine 2 recordings, but may have different metadata e.g. commit_id)
@@ -64,6 +67,12 @@ def main():
                 logging.warn(
                     f"{chronicle_name} has gaps")
 
+            missed_minutes = crud.read_missed_minutes(chronicle_name)
+            if missed_minutes:
+                reasons = Counter(m.reason for m in missed_minutes)
+                logging.warn(
+                    f"{chronicle_name} missed {len(missed_minutes)} minutes ({dict(reasons)})")
+
             # TODO: recover code for sake of seeing gaps
             # print()
             # print("Partial recordings:")
@@ -1,7 +1,12 @@
-
+import datetime
+import heapq
+import logging
+import os
 import typing
 
-from src.backtest.chronicle import crud, types
+from src.backtest.chronicle import crud, manifest, types
+from src.backtest.chronicle.snapshot_index import get_snapshot_line_day, remove_index
+from src.outputs import json_dump, pathing
 
 
 def write_snapshots(chronicle_name: str, snapshots: typing.Iterable[types.Snapshot], metadata: types.ChronicleMeta):
@@ -12,3 +17,102 @@ def write_snapshots(chronicle_name: str, snapshots: typing.Iterable[types.Snapsh
 
     crud.create(chronicle_name, metadata)
     crud.append_snapshots(chronicle_name, snapshots)
+
+
+SnapshotsForDays = typing.Callable[[list[datetime.date]],
+                                   typing.Iterable[types.Snapshot]]
+
+def _read_last_line(path: str) -> str:
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        chunk = b''
+        while position > 0 and chunk.count(b'\n') < 2:
+            step = min(position, 64 * 1024)
+            position -= step
+            f.seek(position)
+            chunk = f.read(step) + chunk
+    lines = chunk.rstrip(b'\n').split(b'\n')
+    return lines[-1].decode() if lines else ''
+
+
+def _encode_snapshots(snapshots: typing.Iterable[types.Snapshot]) -> typing.Iterator[tuple[datetime.date, str]]:
+    for snapshot in snapshots:
+        yield snapshot.now.date(), json_dump.to_json_string(snapshot.to_dict()) + "\n"
+
+
+def update_snapshots(chronicle_name: str, snapshots_for_days: SnapshotsForDays, metadata: types.ChronicleMeta,
+                     days: list[datetime.date], scanner_hash: str, times: list[str], leadup_period: int,
+                     full: bool = False) -> list[datetime.date]:
+    """
+    Brings a backtest chronicle up to date for `days`, recomputing only days whose inputs
+    (scanner source, time grid, grouped aggs and ticker details cache entries) changed since it was last built.
+    New days after the last built day are appended, otherwise snapshots.jsonl is rewritten, copying unchanged days over.
+    Returns the days that were recomputed.
+    """
+    paths = pathing.get_chronicle_folder_paths(chronicle_name)
+
+    # capture inputs before computing, so a cache refresh while building is picked up next time
+    states = manifest.CacheEntryStates()
+    current = manifest.ChronicleManifest(origin=metadata.origin, days={
+        day: manifest.build_day_inputs(scanner_hash, times, manifest.get_input_days(
+            day, leadup_period), states) for day in days
+    })
+
+    previous = None if full else manifest.read_manifest(chronicle_name)
+    if previous and (previous.origin != metadata.origin or not os.path.exists(paths['snapshots.jsonl'])):
+        previous = None
+
+    if not previous:
+        logging.info(f"building {chronicle_name} from scratch")
+        write_snapshots(chronicle_name, snapshots_for_days(days), metadata)
+        manifest.write_manifest(chronicle_name, current)
+        return days
+
+    changed_days = [day for day in days if not manifest.is_day_unchanged(
+        previous.days.get(day), scanner_hash, times, manifest.get_input_days(day, leadup_period), states)]
+    removed_days = set(previous.days.keys()) - set(days)
+    logging.info(
+        f"{len(changed_days)}/{len(days)} days to recompute, {len(removed_days)} to remove from {chronicle_name}")
+
+    # if interrupted from here on, the next build starts from scratch
+    os.remove(paths['manifest.json'])
+
+    last_built_day = max(previous.days.keys(), default=None)
+    last_line_day = get_snapshot_line_day(
+        _read_last_line(paths['snapshots.jsonl']))
+    can_append = not removed_days and last_built_day is not None and \
+        all(day > last_built_day for day in changed_days) and \
+        (last_line_day is None or last_line_day <= last_built_day)
+
+    if not changed_days and not removed_days:
+        pass
+    elif can_append:
+        crud.append_snapshots(chronicle_name, snapshots_for_days(changed_days))
+    else:
+        _rewrite_snapshots(
+            paths['snapshots.jsonl'], snapshots_for_days(changed_days), keep_days=set(days) & set(previous.days.keys()) - set(changed_days))
+        remove_index(paths['snapshots.index.json'])
+
+    json_dump.write_json(paths['metadata.json'], metadata.to_dict())
+    manifest.write_manifest(chronicle_name, current)
+    return changed_days
+
+
+def _read_kept_lines(f: typing.TextIO, keep_days: set[datetime.date]) -> typing.Iterator[tuple[datetime.date, str]]:
+    for line in f:
+        day = get_snapshot_line_day(line)
+        # (a line without newline was cut short by an interrupted write)
+        if day in keep_days and line.endswith("\n"):
+            yield day, line
+
+
+def _rewrite_snapshots(path: str, snapshots: typing.Iterable[types.Snapshot], keep_days: set[datetime.date]):
+    """
+    Merges existing lines of `keep_days` with `snapshots` of recomputed days, both in day order.
+    """
+    tmp_path = path + ".tmp"
+    with open(path) as old, open(tmp_path, "w") as f:
+        for _, line in heapq.merge(_read_kept_lines(old, keep_days), _encode_snapshots(snapshots), key=lambda x: x[0]):
+            f.write(line)
+    os.replace(tmp_path, path)
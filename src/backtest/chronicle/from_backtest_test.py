@@ -0,0 +1,123 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.backtest.chronicle import crud, from_backtest, manifest, types
+from src.caching.basics import write_json_cache
+from src.data.polygon.grouped_aggs_store import get_grouped_aggs_cache_key
+from src.trading_day import MARKET_TIMEZONE, generate_trading_days
+
+CHRONICLE = "test-chronicle"
+DAYS = list(generate_trading_days(
+    datetime.date(2022, 1, 3), datetime.date(2022, 1, 7)))
+TIMES = ["15:59"]
+
+
+def cache_day(day: datetime.date, close: float = 1.):
+    write_json_cache(get_grouped_aggs_cache_key(day), {
+                     "results": [{"T": "AAPL", "c": close}]})
+
+
+class TestUpdateSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        chronicles_dir = os.path.join(self.tmp_dir.name, "chronicles")
+        os.makedirs(os.path.join(cache_dir, "polygon", "grouped_aggs"))
+        os.makedirs(chronicles_dir)
+        paths = {"data": {"cache": {"dir": cache_dir},
+                          "chronicles": {"dir": chronicles_dir}}}
+        self.patchers = [
+            mock.patch("src.caching.basics.get_paths", return_value=paths),
+            mock.patch("src.outputs.pathing.get_paths", return_value=paths),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+        for day in generate_trading_days(DAYS[0] - datetime.timedelta(days=7), DAYS[-1] + datetime.timedelta(days=7)):
+            cache_day(day)
+        self.computed_days: list[datetime.date] = []
+
+    def tearDown(self):
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def snapshots_for_days(self, days: list[datetime.date]):
+        for day in days:
+            self.computed_days.append(day)
+            now = datetime.datetime.combine(
+                day, datetime.time(15, 59), tzinfo=MARKET_TIMEZONE)
+            yield types.Snapshot(now=now, entries=[types.ChronicleEntry(now=now, ticker={"T": "AAPL", "c": 1.})])
+
+    def update(self, days=DAYS, scanner_hash="a", full=False):
+        self.computed_days = []
+        metadata = types.ChronicleMeta(
+            start=days[0], end=days[-1], classification="backtest", origin="scanner", commit="dev")
+        return from_backtest.update_snapshots(
+            CHRONICLE, self.snapshots_for_days, metadata, days=days, scanner_hash=scanner_hash, times=TIMES,
+            leadup_period=1, full=full)
+
+    def get_days(self) -> list[datetime.date]:
+        return [s.now.date() for s in crud.get(CHRONICLE).snapshots]
+
+    def test_only_changed_days_are_recomputed(self):
+        self.assertEqual(self.update(), DAYS)
+        self.assertEqual(self.get_days(), DAYS)
+
+        self.assertEqual(self.update(), [])
+
+        # re-fetched, but same contents
+        cache_day(DAYS[2])
+        self.assertEqual(self.update(), [])
+
+        # changed contents: the day itself and days looking back at it
+        cache_day(DAYS[2], close=2.)
+        self.assertEqual(self.update(), DAYS[2:])
+        self.assertEqual(self.computed_days, DAYS[2:])
+        self.assertEqual(self.get_days(), DAYS)
+
+        self.assertEqual(self.update(scanner_hash="b"), DAYS)
+        self.assertEqual(self.update(full=True), DAYS)
+
+    def test_ticker_details_are_inputs_of_their_day(self):
+        os.makedirs(os.path.join(self.tmp_dir.name,
+                    "cache", "polygon", "ticker_details"))
+        self.update()
+
+        write_json_cache(
+            f"polygon/ticker_details/CS_{DAYS[1]}", [{"ticker": "AAPL"}])
+        self.assertEqual(self.update(), [DAYS[1]])
+        self.assertEqual(self.update(), [])
+
+    def test_appends_new_days_and_removes_old_ones(self):
+        self.update(days=DAYS[:3])
+
+        with mock.patch.object(from_backtest, "_rewrite_snapshots") as rewrite:
+            self.assertEqual(self.update(), DAYS[3:])
+            rewrite.assert_not_called()
+        self.assertEqual(self.get_days(), DAYS)
+
+        self.assertEqual(self.update(days=DAYS[1:4]), [])
+        self.assertEqual(self.get_days(), DAYS[1:4])
+        metadata = crud.get(CHRONICLE).metadata
+        self.assertEqual((metadata.start, metadata.end), (DAYS[1], DAYS[3]))
+
+    def test_interrupted_update_rebuilds_from_scratch(self):
+        self.update(days=DAYS[:3])
+
+        def interrupted(days):
+            yield from self.snapshots_for_days(days[:1])
+            raise KeyboardInterrupt()
+
+        cache_day(DAYS[1], close=2.)
+        with self.assertRaises(KeyboardInterrupt):
+            from_backtest.update_snapshots(
+                CHRONICLE, interrupted, crud.get(CHRONICLE).metadata, days=DAYS, scanner_hash="a", times=TIMES,
+                leadup_period=1)
+        assert manifest.read_manifest(CHRONICLE) is None
+
+        self.assertEqual(self.update(), DAYS)
+        self.assertEqual(self.get_days(), DAYS)
@@ -0,0 +1,204 @@
+import dataclasses
+import datetime
+import hashlib
+import os
+import typing
+
+from src.caching.basics import _get_cache_path, get_entry_time, get_matching_entries
+from src.data.polygon.grouped_aggs_store import get_grouped_aggs_cache_key
+from src.outputs import json_dump, pathing
+from src.trading_day import generate_trading_days, n_trading_days_ago
+
+#
+# Per-day manifest of a backtest chronicle: the inputs each day's snapshots were computed from.
+# When rebuilding a chronicle, only days whose inputs changed need to be recomputed.
+#
+# Inputs of a day:
+# - hash of the scanner's source (its module and the `src` modules it imports)
+# - time grid (times of day the scanner was invoked)
+# - grouped aggs cache entries of the day and its leadup days (entry time, and digest of contents for when
+#   entries were re-fetched but did not change). The grouped aggs store only answers for days matching these entries.
+# - ticker details cache entries of the day, by type (asset classes, also what the ticker types index is built from)
+#
+
+TICKER_DETAILS_CACHE_PREFIX = "polygon/ticker_details/"
+
+
+@dataclasses.dataclass
+class CacheEntryState:
+    entry_time: typing.Optional[float]
+    digest: typing.Optional[str]
+
+    def to_dict(self) -> dict:
+        return {"entry_time": self.entry_time, "digest": self.digest}
+
+    @staticmethod
+    def from_dict(d: dict):
+        return CacheEntryState(entry_time=d["entry_time"], digest=d["digest"])
+
+
+@dataclasses.dataclass
+class DayInputs:
+    scanner_hash: str
+    times: list[str]
+    cache_entries: dict[str, CacheEntryState]  # ISO day -> state
+    # type -> state, None if not known (manifests written before it was tracked)
+    ticker_details: typing.Optional[dict[str, CacheEntryState]] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "scanner_hash": self.scanner_hash,
+            "times": self.times,
+            "cache_entries": {day: state.to_dict() for day, state in self.cache_entries.items()},
+            "ticker_details": {t: state.to_dict() for t, state in self.ticker_details.items()}
+            if self.ticker_details is not None else None,
+        }
+
+    @staticmethod
+    def from_dict(d: dict):
+        return DayInputs(
+            scanner_hash=d["scanner_hash"],
+            times=d["times"],
+            cache_entries={day: CacheEntryState.from_dict(
+                state) for day, state in d["cache_entries"].items()},
+            ticker_details={t: CacheEntryState.from_dict(state) for t, state in d["ticker_details"].items()}
+            if d.get("ticker_details") is not None else None,
+        )
+
+
+@dataclasses.dataclass
+class ChronicleManifest:
+    origin: str  # scanner
+    days: dict[datetime.date, DayInputs]
+
+    def to_dict(self) -> dict:
+        return {
+            "origin": self.origin,
+            "days": {day.isoformat(): inputs.to_dict() for day, inputs in sorted(self.days.items())},
+        }
+
+    @staticmethod
+    def from_dict(d: dict):
+        return ChronicleManifest(
+            origin=d["origin"],
+            days={datetime.date.fromisoformat(day): DayInputs.from_dict(
+                inputs) for day, inputs in d["days"].items()},
+        )
+
+
+def read_manifest(chronicle_name: str) -> typing.Optional[ChronicleManifest]:
+    path = pathing.get_chronicle_folder_paths(chronicle_name)['manifest.json']
+    try:
+        return ChronicleManifest.from_dict(json_dump.read_json(path))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def write_manifest(chronicle_name: str, manifest: ChronicleManifest):
+    path = pathing.get_chronicle_folder_paths(chronicle_name)['manifest.json']
+    tmp_path = path + ".tmp"
+    json_dump.write_json(tmp_path, manifest.to_dict())
+    os.replace(tmp_path, path)
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class CacheEntryStates:
+    """
+    Looks up grouped aggs cache entry states, computing digests only when needed (and at most once per day).
+    """
+
+    def __init__(self):
+        self._entry_times: dict[datetime.date, typing.Optional[float]] = {}
+        self._digests: dict[datetime.date, typing.Optional[str]] = {}
+        # day -> type -> cache key, listed once
+        self._ticker_details_keys: typing.Optional[dict[datetime.date, dict[str, str]]] = None
+
+    def get_entry_time(self, day: datetime.date) -> typing.Optional[float]:
+        if day not in self._entry_times:
+            try:
+                self._entry_times[day] = get_entry_time(
+                    get_grouped_aggs_cache_key(day)).timestamp()
+            except OSError:
+                self._entry_times[day] = None
+        return self._entry_times[day]
+
+    def get_digest(self, day: datetime.date) -> typing.Optional[str]:
+        if day not in self._digests:
+            try:
+                self._digests[day] = hash_file(
+                    _get_cache_path(get_grouped_aggs_cache_key(day)))
+            except OSError:
+                self._digests[day] = None
+        return self._digests[day]
+
+    def get(self, day: datetime.date) -> CacheEntryState:
+        return CacheEntryState(entry_time=self.get_entry_time(day), digest=self.get_digest(day))
+
+    def is_unchanged(self, day: datetime.date, previous: CacheEntryState) -> bool:
+        if previous.entry_time is not None and previous.entry_time == self.get_entry_time(day):
+            return True
+        # re-fetched (e.g. nightly cache refresh), check whether contents actually changed
+        return previous.digest is not None and previous.digest == self.get_digest(day)
+
+    def _list_ticker_details_keys(self) -> dict[datetime.date, dict[str, str]]:
+        if self._ticker_details_keys is None:
+            self._ticker_details_keys = {}
+            try:
+                keys = get_matching_entries(TICKER_DETAILS_CACHE_PREFIX)
+            except FileNotFoundError:
+                keys = []
+            for key in keys:
+                t, _, day = key[len(TICKER_DETAILS_CACHE_PREFIX):].rpartition("_")
+                try:
+                    self._ticker_details_keys.setdefault(
+                        datetime.date.fromisoformat(day), {})[t] = key
+                except ValueError:
+                    continue
+        return self._ticker_details_keys
+
+    def get_ticker_details(self, day: datetime.date) -> dict[str, CacheEntryState]:
+        """
+        States of the ticker details cache entries of `day` by type.
+        (entry times only: these entries are not re-fetched once cached, so a new entry time means new contents)
+        """
+        states = {}
+        for t, key in self._list_ticker_details_keys().get(day, {}).items():
+            try:
+                states[t] = CacheEntryState(
+                    entry_time=get_entry_time(key).timestamp(), digest=None)
+            except OSError:
+                continue
+        return states
+
+
+def get_input_days(day: datetime.date, leadup_period: int) -> list[datetime.date]:
+    """The day itself and the leadup days a scanner can look back at."""
+    # scanners skip holidays when looking back, so look back a little further (~1 holiday a month)
+    lookback = leadup_period + leadup_period // 20 + 1 if leadup_period else 0
+    return list(generate_trading_days(n_trading_days_ago(day, lookback), day))
+
+
+def is_day_unchanged(previous: typing.Optional[DayInputs], scanner_hash: str, times: list[str], input_days: list[datetime.date], states: CacheEntryStates) -> bool:
+    if previous is None:
+        return False
+    if previous.scanner_hash != scanner_hash or previous.times != times:
+        return False
+    if set(previous.cache_entries.keys()) != set(d.isoformat() for d in input_days):
+        return False
+    if previous.ticker_details is None or previous.ticker_details != states.get_ticker_details(input_days[-1]):
+        return False
+    return all(states.is_unchanged(d, previous.cache_entries[d.isoformat()]) for d in input_days)
+
+
+def build_day_inputs(scanner_hash: str, times: list[str], input_days: list[datetime.date], states: CacheEntryStates) -> DayInputs:
+    return DayInputs(
+        scanner_hash=scanner_hash,
+        times=times,
+        cache_entries={d.isoformat(): states.get(d) for d in input_days},
+        # (the day itself is last)
+        ticker_details=states.get_ticker_details(input_days[-1]),
+    )
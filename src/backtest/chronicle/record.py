@@ -1,57 +1,183 @@
 import argparse
-from copy import deepcopy
-from datetime import date, time
+from datetime import date, datetime, time, timedelta
 import logging
+import multiprocessing
 import os
+import queue
+import typing
 from typing import cast
 from requests import HTTPError
 from src.backtest.chronicle import crud, types
 
 from src.data.finnhub.finnhub import get_candles
+from src.data.polygon.grouped_aggs import Ticker
 from src.scan.utils.all_tickers_on_day import get_all_tickers_on_day
-from src.scan.utils.scanners import CandleGetter, ScannerFilter, get_scanner_filter
-from src.trading_day import now, today, get_market_close_on_day
+from src.scan.utils.scanners import CandleGetter, get_scanner_filter
+from src.trading_day import MARKET_TIMEZONE, now, today, get_market_close_on_day
 from src.wait import get_next_minute_mark, wait_until
 
 
-def should_continue():
-    return now().time() < time(16, 0)
+#
+# Live recording of scanners: every minute, grouped aggs are fetched once and published to one worker process
+# per scanner (through its queue), so a slow scanner only delays itself.
+#
+# A scanner's snapshot of a minute is due by the next minute mark; when it is skipped because the worker was still
+# busy, or the scanner failed, the minute is recorded as missed (`missed_minutes.jsonl` of the chronicle) instead of
+# leaving an unexplained gap. Late snapshots are still written, and their minute recorded as "late".
+# A watchdog restarts workers that died or hung.
+#
+# Workers of every scanner call the same providers, so providers' rate limits are shared between processes
+# (see `http_client.build_limited_provider`).
+#
 
+# how long a scanner can take on a minute before its worker is considered hung and restarted
+HUNG_AFTER = timedelta(minutes=5)
 
-def loop(scanner_filters: dict[str, ScannerFilter]):
-    while should_continue():
-        try:
-            execute_phases(scanner_filters)
-        except HTTPError as e:
-            logging.exception(
-                f"HTTP {e.response.status_code} {e.response.text}")
-        except Exception as e:
-            logging.exception(f"Unexpected Exception")
+Minute = typing.Tuple[datetime, list[Ticker]]  # minute mark, tickers
 
 
-def execute_phases(scanner_filters: dict[str, ScannerFilter]):
-    next_min = get_next_minute_mark(now())
-    wait_until(next_min)
+def should_continue():
+    return now().time() < time(16, 0)
 
-    day = today()
-    tickers = get_all_tickers_on_day(day)
 
-    # TODO: run each loop in its own process, so one slow scanner doesn't block others
-    for scanner_name, scanner_filter in scanner_filters.items():
-        logging.info(f"Scanning {scanner_name}")
-        copied_tickers = deepcopy(tickers)
+def record_missed(scanner_name: str, minute: datetime, reason: str):
+    logging.warning(f"{scanner_name} missed {minute} ({reason})")
+    crud.append_missed_minutes(build_chronicle_name(scanner_name, minute.date()), [
+                               types.MissedMinute(now=minute, reason=reason)])
 
+
+def take_latest(minutes: "queue.Queue[typing.Optional[Minute]]", minute: Minute, scanner_name: str) -> typing.Tuple[Minute, bool]:
+    """Latest minute published (recording older ones as skipped), and whether to stop after it."""
+    while True:
+        try:
+            newer = minutes.get_nowait()
+        except queue.Empty:
+            return minute, False
+        if newer is None:
+            return minute, True
+        record_missed(scanner_name, minute[0], "skipped")
+        minute = newer
+
+
+def run_scanner_worker(scanner_name: str, minutes: "queue.Queue[typing.Optional[Minute]]", busy: typing.Any):
+    """
+    Records snapshots of `scanner_name` for minutes published to `minutes` (until None),
+    setting `busy` to the (minute, start) timestamps of the minute being scanned.
+    """
+    scanner_filter = get_scanner_filter(scanner_name)
+    stop = False
+    while not stop:
+        published = minutes.get()
+        if published is None:
+            return
+        (minute, tickers), stop = take_latest(minutes, published, scanner_name)
+
+        busy[0], busy[1] = minute.timestamp(), now().timestamp()
         try:
             # TODO: remove this cast, get_candles and CandleGetter types not aligned
             # call it intraday_candle_getter
             candidates = scanner_filter(
-                copied_tickers, day, cast(CandleGetter, get_candles))
-        except Exception as e:
+                tickers, minute.date(), cast(CandleGetter, get_candles))
+        except HTTPError as e:
+            logging.exception(
+                f"Scanner {scanner_name} failed, HTTP {e.response.status_code} {e.response.text}")
+            record_missed(scanner_name, minute, "failed")
+            continue
+        except Exception:
             logging.exception(f"Scanner {scanner_name} failed, skipping...")
+            record_missed(scanner_name, minute, "failed")
             continue
-
-        crud.append_snapshots(build_chronicle_name(scanner_name, day), snapshots=[types.Snapshot(now=next_min, entries=[
-                              types.ChronicleEntry(ticker=ticker, now=next_min) for ticker in candidates])])
+        finally:
+            busy[0], busy[1] = 0, 0
+
+        crud.append_snapshots(build_chronicle_name(scanner_name, minute.date()), snapshots=[types.Snapshot(now=minute, entries=[
+                              types.ChronicleEntry(ticker=ticker, now=minute) for ticker in candidates])])
+        if now() > minute + timedelta(minutes=1):
+            record_missed(scanner_name, minute, "late")
+
+
+class ScannerWorker:
+    def __init__(self, scanner_name: str):
+        self.scanner_name = scanner_name
+        self.start()
+
+    def start(self):
+        self.minutes: "multiprocessing.Queue[typing.Optional[Minute]]" = multiprocessing.Queue()
+        self.busy = multiprocessing.Array("d", 2, lock=False)
+        self.process = multiprocessing.Process(target=run_scanner_worker, args=(
+            self.scanner_name, self.minutes, self.busy), name=f"record-{self.scanner_name}", daemon=True)
+        self.process.start()
+
+    def publish(self, minute: Minute):
+        self.minutes.put(minute)
+
+    def watch(self):
+        """Restarts the worker if it died or hung, recording the minutes it did not get to as missed."""
+        if not self.process.is_alive():
+            reason = "worker died"
+        elif self.busy[1] and now() - datetime.fromtimestamp(self.busy[1], tz=MARKET_TIMEZONE) > HUNG_AFTER:
+            reason = "worker hung"
+            self.process.terminate()
+        else:
+            return
+
+        self.process.join()
+        unfinished = [datetime.fromtimestamp(
+            self.busy[0], tz=MARKET_TIMEZONE)] if self.busy[0] else []
+        while True:
+            try:
+                published = self.minutes.get_nowait()
+            except queue.Empty:
+                break
+            if published is not None:
+                unfinished.append(published[0])
+        for minute in unfinished:
+            record_missed(self.scanner_name, minute, reason)
+        self.start()
+
+    def stop(self):
+        self.minutes.put(None)
+        self.process.join(timeout=HUNG_AFTER.total_seconds())
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def loop(scanner_names: list[str]):
+    workers = [ScannerWorker(scanner_name) for scanner_name in scanner_names]
+    last_minute: typing.Optional[datetime] = None
+    try:
+        while should_continue():
+            next_min = get_next_minute_mark(now())
+            wait_until(next_min)
+
+            # minutes the loop itself did not get to (fetching took too long)
+            if last_minute is not None:
+                skipped = last_minute + timedelta(minutes=1)
+                while skipped < next_min:
+                    for scanner_name in scanner_names:
+                        record_missed(scanner_name, skipped, "not fetched")
+                    skipped += timedelta(minutes=1)
+            last_minute = next_min
+
+            try:
+                tickers = get_all_tickers_on_day(next_min.date())
+            except Exception as e:
+                if isinstance(e, HTTPError):
+                    logging.exception(
+                        f"HTTP {e.response.status_code} {e.response.text}")
+                else:
+                    logging.exception(f"Unexpected Exception")
+                for scanner_name in scanner_names:
+                    record_missed(scanner_name, next_min, "fetch failed")
+                continue
+
+            for worker in workers:
+                worker.watch()
+                # (each worker gets its own copy of tickers)
+                worker.publish((next_min, tickers))
+    finally:
+        for worker in workers:
+            worker.stop()
 
 
 def build_chronicle_name(scanner_name: str, day: date) -> str:
@@ -65,16 +191,15 @@ def main():
 
     scanner_names = args.scanner.split(',')
 
-    scanner_filters = {
-        scanner_name: get_scanner_filter(scanner_name)
-        for scanner_name in scanner_names
-    }
+    # (fails early on unknown scanners, workers load them again)
+    for scanner_name in scanner_names:
+        get_scanner_filter(scanner_name)
 
     # pre-create folders
-    for scanner_name in scanner_filters.keys():
+    for scanner_name in scanner_names:
         crud.create(build_chronicle_name(scanner_name, today()), metadata=types.ChronicleMeta(
             start=now(), end=get_market_close_on_day(now()) or now(), commit=os.environ.get("GIT_COMMIT", 'dev'), classification='recorded', origin=scanner_name))
 
     logging.info(f"Recording live data for {scanner_names}")
 
-    loop(scanner_filters)
+    loop(scanner_names)
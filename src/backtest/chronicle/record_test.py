@@ -0,0 +1,83 @@
+import datetime
+import os
+import queue
+import tempfile
+import unittest
+from unittest import mock
+
+from src.backtest.chronicle import crud, record, types
+from src.trading_day import MARKET_TIMEZONE
+
+DAY = datetime.date(2022, 1, 3)
+SCANNER = "test_scanner"
+
+
+def minute_mark(minute: int) -> datetime.datetime:
+    return datetime.datetime.combine(DAY, datetime.time(9, 31 + minute), tzinfo=MARKET_TIMEZONE)
+
+
+def scanner_filter(tickers, day, get_candles):
+    if any(t["T"] == "FAIL" for t in tickers):
+        raise ValueError("failed")
+    return [t for t in tickers if t["c"] > 1]
+
+
+class TestScannerWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        chronicles_dir = os.path.join(self.tmp_dir.name, "chronicles")
+        os.makedirs(chronicles_dir)
+        paths = {"data": {"chronicles": {"dir": chronicles_dir}}}
+        self.patchers = [
+            mock.patch("src.outputs.pathing.get_paths", return_value=paths),
+            mock.patch.object(record, "get_scanner_filter",
+                              return_value=scanner_filter),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+        self.chronicle_name = record.build_chronicle_name(SCANNER, DAY)
+        crud.create(self.chronicle_name, types.ChronicleMeta(
+            start=DAY, end=DAY, classification="recorded", origin=SCANNER, commit="dev"))
+
+    def tearDown(self):
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def run_worker(self, published: list, now: datetime.datetime):
+        minutes: queue.Queue = queue.Queue()
+        for p in published + [None]:
+            minutes.put(p)
+        busy = [0., 0.]
+        with mock.patch.object(record, "now", return_value=now):
+            record.run_scanner_worker(SCANNER, minutes, busy)
+        assert busy == [0, 0]
+
+    def test_records_latest_minute_and_missed_ones(self):
+        tickers = [{"T": "AAPL", "c": 2.}, {"T": "TSLA", "c": 0.5}]
+        self.run_worker([(minute_mark(i), tickers) for i in range(3)],
+                        now=minute_mark(2) + datetime.timedelta(seconds=30))
+
+        snapshots = list(crud.read_snapshots(self.chronicle_name))
+        self.assertEqual([s.now for s in snapshots], [minute_mark(2)])
+        self.assertEqual([e.ticker["T"]
+                         for e in snapshots[0].entries], ["AAPL"])
+        self.assertEqual(crud.read_missed_minutes(self.chronicle_name), [
+            types.MissedMinute(now=minute_mark(0), reason="skipped"),
+            types.MissedMinute(now=minute_mark(1), reason="skipped"),
+        ])
+
+    def test_records_late_and_failed_minutes(self):
+        self.run_worker([(minute_mark(0), [{"T": "AAPL", "c": 2.}])],
+                        now=minute_mark(1) + datetime.timedelta(seconds=1))
+        self.run_worker([(minute_mark(2), [{"T": "FAIL", "c": 2.}])],
+                        now=minute_mark(2))
+
+        # late snapshots are written too
+        self.assertEqual([s.now for s in crud.read_snapshots(
+            self.chronicle_name)], [minute_mark(0)])
+        self.assertEqual(crud.read_missed_minutes(self.chronicle_name), [
+            types.MissedMinute(now=minute_mark(0), reason="late"),
+            types.MissedMinute(now=minute_mark(2), reason="failed"),
+        ])
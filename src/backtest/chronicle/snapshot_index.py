@@ -0,0 +1,183 @@
+import bisect
+import dataclasses
+import datetime
+import os
+import typing
+
+from src.backtest.chronicle import types
+from src.outputs import json_dump
+from src.trading_day import MARKET_TIMEZONE
+
+#
+# Reading snapshots.jsonl without loading it: a sidecar index (`snapshots.index.json`) holds the byte offset where
+# each day starts, so reading a range of days seeks to its first line. Snapshots are yielded one at a time, their
+# entries decoded only when accessed.
+#
+# The index covers the file up to its last complete line, and is extended when the file was appended to since
+# (same inode, grown), or rebuilt when it was rewritten. Building it only looks at each line's "now".
+#
+
+NOW_PREFIX = '"now": "'
+_NOW_PREFIX_BYTES = NOW_PREFIX.encode()
+
+
+def get_snapshot_line_day(line: str) -> typing.Optional[datetime.date]:
+    """
+    Day of a snapshots.jsonl line without decoding it. Keys are sorted, so the snapshot's own "now" is the last one.
+    """
+    i = line.rfind(NOW_PREFIX)
+    if i == -1:
+        return None
+    try:
+        return datetime.date.fromisoformat(line[i + len(NOW_PREFIX):i + len(NOW_PREFIX) + 10])
+    except ValueError:
+        return None
+
+
+def _get_line_now(line: bytes) -> typing.Optional[str]:
+    i = line.rfind(_NOW_PREFIX_BYTES)
+    if i == -1:
+        return None
+    start = i + len(_NOW_PREFIX_BYTES)
+    return line[start:line.index(b'"', start)].decode()
+
+
+def _get_line_day(line: bytes) -> typing.Optional[datetime.date]:
+    now = _get_line_now(line)
+    try:
+        return datetime.date.fromisoformat(now[:10]) if now else None
+    except ValueError:
+        return None
+
+
+class LazySnapshot(types.Snapshot):
+    """Snapshot of a snapshots.jsonl line, decoding its entries when first accessed."""
+
+    def __init__(self, now: datetime.datetime, line: str):
+        self.now = now
+        self._line: typing.Optional[str] = line
+        self._entries: typing.Optional[list[types.ChronicleEntry]] = None
+
+    @property
+    def entries(self) -> list[types.ChronicleEntry]:
+        if self._entries is None:
+            assert self._line is not None
+            d = json_dump.from_json_string_with_schema(
+                self._line, types.SNAPSHOT_SCHEMA)
+            self._entries = types.Snapshot.from_dict(d).entries
+            self._line = None
+        return self._entries
+
+    @entries.setter
+    def entries(self, entries: list[types.ChronicleEntry]):
+        self._entries = entries
+        self._line = None
+
+
+@dataclasses.dataclass
+class SnapshotIndex:
+    inode: int
+    size: int  # bytes indexed (up to the end of the last complete line)
+    days: list[typing.Tuple[datetime.date, int]]  # (day, offset of first line), in file order
+    is_sorted: bool  # whether days are in order (otherwise seeking is not possible)
+
+    def to_dict(self) -> dict:
+        return {
+            "inode": self.inode,
+            "size": self.size,
+            "days": [[day.isoformat(), offset] for day, offset in self.days],
+            "is_sorted": self.is_sorted,
+        }
+
+    @staticmethod
+    def from_dict(d: dict):
+        return SnapshotIndex(
+            inode=d["inode"],
+            size=d["size"],
+            days=[(datetime.date.fromisoformat(day), offset)
+                  for day, offset in d["days"]],
+            is_sorted=d["is_sorted"],
+        )
+
+    def get_start_offset(self, start: typing.Optional[datetime.date]) -> int:
+        """Offset of the first line that can be on `start` (market day) or after."""
+        if start is None or not self.is_sorted:
+            return 0
+        # (days are as written, a day earlier in case a time was not written in market time)
+        i = bisect.bisect_left(self.days, (start - datetime.timedelta(days=1), -1))
+        return self.days[i][1] if i < len(self.days) else self.size
+
+
+def _read_index(index_path: str) -> typing.Optional[SnapshotIndex]:
+    try:
+        return SnapshotIndex.from_dict(json_dump.read_json(index_path))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def _write_index(index_path: str, index: SnapshotIndex):
+    tmp_path = index_path + ".tmp"
+    try:
+        json_dump.write_json(tmp_path, index.to_dict())
+        os.replace(tmp_path, index_path)
+    except OSError:  # (read-only chronicles are still readable, just without a saved index)
+        pass
+
+
+def remove_index(index_path: str):
+    """For when snapshots.jsonl is rewritten."""
+    try:
+        os.remove(index_path)
+    except FileNotFoundError:
+        pass
+
+
+def update_index(path: str, index_path: str) -> SnapshotIndex:
+    """Index of snapshots.jsonl at `path`, extending or rebuilding the saved one if the file changed."""
+    stat = os.stat(path)
+    index = _read_index(index_path)
+    if index is None or index.inode != stat.st_ino or index.size > stat.st_size:
+        index = SnapshotIndex(inode=stat.st_ino, size=0,
+                              days=[], is_sorted=True)
+    elif index.size == stat.st_size:
+        return index
+
+    offset = index.size
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):  # still being written
+                break
+            day = _get_line_day(line)
+            if day is not None and (not index.days or day != index.days[-1][0]):
+                if index.days and day < index.days[-1][0]:
+                    index.is_sorted = False
+                index.days.append((day, offset))
+            offset += len(line)
+    index.size = offset
+
+    _write_index(index_path, index)
+    return index
+
+
+def read_snapshots(path: str, index_path: str, start: typing.Optional[datetime.date] = None, end: typing.Optional[datetime.date] = None) -> typing.Iterator[LazySnapshot]:
+    """Snapshots of snapshots.jsonl at `path` between `start` and `end` (inclusive, market days)."""
+    index = update_index(path, index_path)
+    with open(path, "rb") as f:
+        f.seek(index.get_start_offset(start))
+        for line in f:
+            if not line.endswith(b"\n"):  # still being written
+                break
+            now = _get_line_now(line)
+            if now is None:
+                continue
+            snapshot_now = datetime.datetime.fromisoformat(
+                now).astimezone(MARKET_TIMEZONE)
+            day = snapshot_now.date()
+            if start is not None and day < start:
+                continue
+            if end is not None and day > end:
+                if index.is_sorted:
+                    break
+                continue
+            yield LazySnapshot(snapshot_now, line.decode())
@@ -0,0 +1,79 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from src.backtest.chronicle import snapshot_index, types
+from src.outputs import json_dump
+from src.trading_day import MARKET_TIMEZONE, generate_trading_days
+
+DAYS = list(generate_trading_days(
+    datetime.date(2022, 1, 3), datetime.date(2022, 1, 14)))
+
+
+def build_snapshots(days: list[datetime.date]) -> list[types.Snapshot]:
+    snapshots = []
+    for day in days:
+        for minute in range(3):
+            now = datetime.datetime.combine(
+                day, datetime.time(9, 31 + minute), tzinfo=MARKET_TIMEZONE)
+            snapshots.append(types.Snapshot(now=now, entries=[
+                types.ChronicleEntry(now=now, ticker={"T": symbol, "c": minute}) for symbol in ["AAPL", "TSLA"]]))
+    return snapshots
+
+
+class TestSnapshotIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "snapshots.jsonl")
+        self.index_path = os.path.join(
+            self.tmp_dir.name, "snapshots.index.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def append(self, snapshots: list[types.Snapshot], partial_line: str = ""):
+        with open(self.path, "a") as f:
+            for snapshot in snapshots:
+                print(json_dump.to_json_string(snapshot.to_dict()), file=f)
+            f.write(partial_line)
+
+    def read(self, start=None, end=None) -> list[types.Snapshot]:
+        return list(snapshot_index.read_snapshots(self.path, self.index_path, start, end))
+
+    def test_reads_range_lazily(self):
+        snapshots = build_snapshots(DAYS)
+        self.append(snapshots)
+
+        read = self.read(DAYS[3], DAYS[4])
+        self.assertEqual([s.now for s in read], [
+                         s.now for s in snapshots[9:15]])
+        assert all(s._entries is None for s in read)
+        self.assertEqual([s.entries for s in read], [
+                         s.entries for s in snapshots[9:15]])
+
+        self.assertEqual([s.entries for s in self.read()], [
+                         s.entries for s in snapshots])
+
+        index = snapshot_index.update_index(self.path, self.index_path)
+        self.assertEqual([day for day, _ in index.days], DAYS)
+        self.assertEqual(index.get_start_offset(DAYS[3]), index.days[2][1])
+
+    def test_extends_index_after_appends(self):
+        snapshots = build_snapshots(DAYS)
+        self.append(snapshots[:6])
+        self.assertEqual(len(self.read()), 6)
+
+        # a line being written is not read (nor indexed) yet
+        self.append(snapshots[6:12], partial_line='{"entries": [')
+        self.assertEqual([s.now for s in self.read(DAYS[2])], [
+                         s.now for s in snapshots[6:12]])
+        index = snapshot_index.update_index(self.path, self.index_path)
+        self.assertEqual(index.size, os.path.getsize(
+            self.path) - len('{"entries": ['))
+
+        # rewritten
+        os.remove(self.path)
+        self.append(snapshots[12:])
+        self.assertEqual([s.now for s in self.read()], [
+                         s.now for s in snapshots[12:]])
@@ -22,7 +22,7 @@ def chunk_feed_by_day_grouped_by_symbol(chronicle_feed: typing.Iterator[chronicl
 
         for entry in snapshot.entries:
             symbol = entry.ticker['T']
-            tickers_on_day[symbol] = tickers_on_day.get(symbol, []) + [entry]
+            tickers_on_day.setdefault(symbol, []).append(entry)
 
 
 def main():
@@ -32,21 +32,23 @@ def main():
 
     parser.add_argument("chronicle_name", type=str)
     parser.add_argument("result_name", type=str)
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=None)
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=None)
 
     args = parser.parse_args()
 
     chronicle_name = args.chronicle_name
     result_name = args.result_name
 
-    chronicle = crud.get(chronicle_name)
+    chronicle_metadata = crud.get_metadata(chronicle_name)
     md = metadata.from_context(
-        __file__, chronicle.metadata.start, chronicle.metadata.end, {
-            'chronicle.metadata': chronicle.metadata.to_dict(),
+        __file__, args.start or chronicle_metadata.start, args.end or chronicle_metadata.end, {
+            'chronicle.metadata': chronicle_metadata.to_dict(),
             'chronicle_name': chronicle_name
         }
     )
     from_backtest.write_results(result_name, list(chunk_feed_into_signals_by_span(
-        iter(chronicle.snapshots))), md)
+        crud.read_snapshots(chronicle_name, start=args.start, end=args.end))), md)
 
 
 def chunk_feed_into_signals_by_span(chronicle_feed: typing.Iterator[chronicle_types.Snapshot]) -> typing.Iterable[types.FilledOrder]:
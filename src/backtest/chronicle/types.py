@@ -3,6 +3,7 @@ import dataclasses
 import datetime
 
 from src.data.polygon.grouped_aggs import Ticker
+from src.outputs import json_dump
 
 
 @dataclasses.dataclass
@@ -21,6 +22,9 @@ class ChronicleEntry:
         return ChronicleEntry(now=d["now"], ticker=d["ticker"])
 
 
+CHRONICLE_ENTRY_SCHEMA = json_dump.Schema(datetimes=("now",))
+
+
 @dataclasses.dataclass
 class Snapshot:
     now: datetime.datetime
@@ -37,6 +41,30 @@ class Snapshot:
         return Snapshot(entries=[ChronicleEntry.from_dict(entry) for entry in d["entries"]], now=d["now"])
 
 
+SNAPSHOT_SCHEMA = json_dump.Schema(
+    datetimes=("now",), lists={"entries": CHRONICLE_ENTRY_SCHEMA})
+
+
+@dataclasses.dataclass
+class MissedMinute:
+    """Minute of a recorded chronicle with no snapshot, and why."""
+    now: datetime.datetime
+    reason: str
+
+    def to_dict(self) -> dict:
+        return {
+            "now": self.now,
+            "reason": self.reason,
+        }
+
+    @staticmethod
+    def from_dict(d: dict):
+        return MissedMinute(now=d["now"], reason=d["reason"])
+
+
+MISSED_MINUTE_SCHEMA = json_dump.Schema(datetimes=("now",))
+
+
 @dataclasses.dataclass
 class ChronicleMeta:
     start: datetime.date
@@ -1,10 +1,22 @@
+from contextlib import contextmanager
 from datetime import datetime
 
+import fcntl
+import hashlib
 import os
 import json
+import tempfile
+from typing import Iterator, Tuple
 
 from src.outputs.pathing import get_paths
 
+#
+# Cache entries can be read and written by several processes at once (e.g. parallel backtests):
+# - writes go to a temp file which is then renamed over the entry, so readers never see a partially written entry
+#   (temp files get the permissions `open` would give the entry, not `mkstemp`'s owner-only 0600)
+# - `lock_cache_entry` serializes read-fetch-write sequences on a key, so an entry is fetched only once
+#
+
 
 def _get_cache_path(key: str) -> str:
     return os.path.join(get_paths()["data"]["cache"]["dir"], key)
@@ -19,10 +31,51 @@ def read_json_cache(key: str):
         return None
 
 
+# (umask can only be read by setting it, so it is read once, at import)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def create_temp_file(path: str) -> Tuple[int, str]:
+    """
+    File descriptor and path of a new temp file next to `path`, to be renamed over it once written.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.fchmod(fd, 0o666 & ~_UMASK)
+    return fd, tmp_path
+
+
 def write_json_cache(key: str, value) -> None:
     path = _get_cache_path(key)
-    with open(path, "w") as f:
-        json.dump(value, f)
+    fd, tmp_path = create_temp_file(path)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _get_lock_path(key: str) -> str:
+    locks_dir = os.path.join(get_paths()["data"]["cache"]["dir"], ".locks")
+    os.makedirs(locks_dir, exist_ok=True)
+    return os.path.join(locks_dir, hashlib.sha1(key.encode()).hexdigest() + ".lock")
+
+
+@contextmanager
+def lock_cache_entry(key: str) -> Iterator[None]:
+    """
+    Exclusive lock on `key` across processes, e.g. to re-check the cache and fetch only if still missing.
+    """
+    fd = os.open(_get_lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
 
 
 def delete_json_cache(key: str) -> None:
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.caching.basics import _get_cache_path, lock_cache_entry, read_json_cache, write_json_cache
+
+KEY = "test/entry"
+
+
+def _write_many(i: int) -> bool:
+    value = {"writer": i, "payload": "x" * 100_000}
+    for _ in range(20):
+        write_json_cache(KEY, value)
+        # every read sees a complete entry, never a partially written one
+        if read_json_cache(KEY) is None:
+            return False
+    return True
+
+
+def _fetch_once(i: int) -> int:
+    """Returns 1 if this process had to fetch."""
+    if read_json_cache(KEY):
+        return 0
+    with lock_cache_entry(KEY):
+        if read_json_cache(KEY):
+            return 0
+        time.sleep(0.05)
+        write_json_cache(KEY, {"fetched_by": i})
+        return 1
+
+
+class TestCacheConcurrency(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp_dir.name, "test"))
+        self.patcher = mock.patch("src.caching.basics.get_paths", return_value={
+                                  "data": {"cache": {"dir": self.tmp_dir.name}}})
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_concurrent_writes_are_atomic(self):
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            self.assertTrue(all(executor.map(_write_many, range(4))))
+
+        self.assertIn(read_json_cache(KEY)["writer"], range(4))
+        # no temp files left behind
+        self.assertEqual(os.listdir(os.path.dirname(
+            _get_cache_path(KEY))), ["entry"])
+
+    def test_locked_entry_is_fetched_once(self):
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(sum(executor.map(_fetch_once, range(8))), 1)
+
+    def test_entries_get_umask_permissions(self):
+        with mock.patch("src.caching.basics._UMASK", 0o022):
+            write_json_cache(KEY, {})
+
+        self.assertEqual(os.stat(_get_cache_path(KEY)).st_mode & 0o777, 0o644)
@@ -5,16 +5,22 @@ from datetime import datetime, date, timedelta
 from typing import Optional, TypedDict, Union, cast
 from zoneinfo import ZoneInfo
 
-import requests
-
-from src.caching.basics import read_json_cache, write_json_cache
+from src.caching.basics import lock_cache_entry
+from src.data.http_client import build_limited_provider
+from src.data.finnhub.interval_cache import CandleIntervalCache, get_day_interval
 from src.data.types.candles import CandleInterday, CandleIntraday
 
-FINNHUB_API_KEY = os.environ["FINNHUB_API_KEY"]
+
+def get_finnhub_api_key():
+    # read when used, so modules importing this (e.g. scanners) can load without the key
+    return os.environ["FINNHUB_API_KEY"]
 
 
 MARKET_TIMEZONE = ZoneInfo("America/New_York")
 
+# free tier is 60 requests / minute
+FINNHUB = build_limited_provider("finnhub", 60)
+
 
 def get_1m_candles(symbol: str, start: date, end: date) -> Optional[list[CandleIntraday]]:
     candles_1m = get_candles(symbol, "1", start, end)
@@ -44,49 +50,92 @@ def get_candles(symbol: str, resolution: str, start: date, end: date) -> Optiona
     ), "start must be under a 1 year ago (finnhub free tier)"
 
     # finnhub.io says intraday candles are unadjusted (cacheable), but not daily candles
-    # do not cache candles for today or in the future, since that list will change
-    should_cache = not (end >= date.today()) and _is_intraday(resolution)
-
-    # TODO: hit cache if is subset of another cache entry (e.g. 1m candles on April 2 is included in 1m candles from April 1 to April 8)
-    cache_key = f"finnhub/candles/{symbol}_{resolution}_{start.isoformat()}_{end.isoformat()}"
-
-    if should_cache:
-        cached = read_json_cache(cache_key)
-        if cached:
-            return _convert_candles_format(cached, resolution)
+    if _is_intraday(resolution):
+        return _get_intraday_candles_with_cache(symbol, resolution, start, end)
 
     logging.info(
         f"FH: fetching resolution={resolution} candles for {symbol} from {start} to {end}"
     )
     data = _get_candles(symbol, resolution, start, end)
+    return _convert_candles_format(data, resolution)
 
-    if should_cache:
-        write_json_cache(cache_key, data)
 
-    return _convert_candles_format(data, resolution)
+# candles are final once they closed this long ago (data may come in a little late)
+CANDLE_SETTLE_SECONDS = 60
+
+
+def _get_resolution_seconds(resolution: str) -> int:
+    return {"1": 60, "5": 5 * 60, "15": 15 * 60, "30": 30 * 60, "60": 60 * 60}[resolution]
+
+
+def _get_intraday_candles_with_cache(symbol: str, resolution: str, start: date, end: date) -> Optional[list[Union[CandleInterday, CandleIntraday]]]:
+    """
+    Answers from cached intervals, only fetching the gaps (e.g. when called every minute for the last few days,
+    only candles since the last call are fetched).
+    """
+    cache = CandleIntervalCache(symbol, resolution)
+    fetched: dict[int, tuple] = {}
+
+    if cache.get_gaps(start, end):
+        with lock_cache_entry(f"finnhub/candles/{symbol}_{resolution}"):
+            # another process may have fetched some of it while we waited
+            for gap in cache.get_gaps(start, end):
+                logging.info(
+                    f"FH: fetching resolution={resolution} candles for {symbol} from {datetime.fromtimestamp(gap[0], tz=MARKET_TIMEZONE)} to {datetime.fromtimestamp(gap[1], tz=MARKET_TIMEZONE)}"
+                )
+                fetched_at = time.time()
+                data = _get_candles_between(symbol, resolution, gap[0], gap[1])
+                if data.get("s") == "no_data":
+                    candles = {}
+                elif data.get("s") == "ok":
+                    candles = {t: (o, h, l, c, v) for t, o, h, l, c, v in zip(
+                        data["t"], data["o"], data["h"], data["l"], data["c"], data["v"])}
+                else:
+                    logging.warning(
+                        f"Finnhub get_candles response format was unexpected: {data}")
+                    return None
+                fetched.update(candles)
+
+                # do not cache candles that may still change (today's latest, future)
+                final_end = min(gap[1], int(fetched_at) - CANDLE_SETTLE_SECONDS -
+                                _get_resolution_seconds(resolution))
+                if final_end >= gap[0]:
+                    cache.add((gap[0], final_end), {
+                        t: candle for t, candle in candles.items() if t <= final_end})
+
+    candles = cache.get_candles(start, end)
+    candles.update(fetched)
+    if not candles:
+        return None
+
+    ts = sorted(candles.keys())
+    return _convert_candles_format({
+        "t": ts,
+        "o": [candles[t][0] for t in ts],
+        "h": [candles[t][1] for t in ts],
+        "l": [candles[t][2] for t in ts],
+        "c": [candles[t][3] for t in ts],
+        "v": [candles[t][4] for t in ts],
+    }, resolution)
 
 
 def _get_candles(symbol: str, resolution: str, start: date, end: date):
     assert start <= end, "start must come before end"
-    from_param = datetime.combine(start, datetime.min.time()).timestamp()
-    to_param = datetime.combine(end, datetime.max.time()).timestamp()
-    response = requests.get(
+    return _get_candles_between(symbol, resolution, get_day_interval(start)[0], get_day_interval(end)[1])
+
+
+def _get_candles_between(symbol: str, resolution: str, from_param: int, to_param: int):
+    response = FINNHUB.get(
         "https://finnhub.io/api/v1/stock/candle",
         params={
             "symbol": symbol,
             "resolution": resolution,
-            "from": int(from_param),
-            "to": int(to_param),
+            "from": from_param,
+            "to": to_param,
         },
-        headers={"X-Finnhub-Token": FINNHUB_API_KEY},
+        headers={"X-Finnhub-Token": get_finnhub_api_key()},
     )
     logging.info(f"Received response from {response.url}")
-
-    if response.status_code == 429:
-        logging.info("Got 429, rate limiting, waiting 10s before retrying")
-        time.sleep(10)
-        return _get_candles(symbol, resolution, start, end)
-
     response.raise_for_status()
     return response.json()
 
@@ -0,0 +1,112 @@
+from datetime import date, datetime, time, timedelta
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.data.finnhub import finnhub
+from src.data.finnhub.interval_cache import merge_intervals, subtract_intervals
+from src.trading_day import MARKET_TIMEZONE
+
+# within Finnhub free tier range
+MONDAY = date.today() - timedelta(days=date.today().weekday() + 14)
+
+
+def fake_candles_between(symbol, resolution, from_param, to_param):
+    """1m candle every minute of market hours, up to the fake current time."""
+    ts = []
+    day = datetime.fromtimestamp(from_param, tz=MARKET_TIMEZONE).date()
+    while True:
+        t = datetime.combine(day, time(9, 30), tzinfo=MARKET_TIMEZONE)
+        if t.timestamp() > to_param:
+            break
+        while day.weekday() < 5 and t.time() < time(16, 0):
+            if from_param <= t.timestamp() <= to_param and t.timestamp() + 60 <= finnhub.time.time():
+                ts.append(int(t.timestamp()))
+            t += timedelta(minutes=1)
+        day += timedelta(days=1)
+    if not ts:
+        return {"s": "no_data"}
+    return {"s": "ok", "t": ts, "o": [1.] * len(ts), "h": [2.] * len(ts), "l": [0.5] * len(ts), "c": [1.5] * len(ts), "v": [100] * len(ts)}
+
+
+class TestIntervals(unittest.TestCase):
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals(
+            [(10, 20), (0, 5), (6, 8), (15, 30)]), [(0, 8), (10, 30)])
+
+    def test_subtract_intervals(self):
+        self.assertEqual(subtract_intervals(
+            (0, 100), [(10, 20), (30, 40)]), [(0, 9), (21, 29), (41, 100)])
+        self.assertEqual(subtract_intervals((12, 18), [(10, 20)]), [])
+        self.assertEqual(subtract_intervals((0, 5), []), [(0, 5)])
+
+
+class TestCandleIntervalCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.now = datetime.combine(
+            MONDAY + timedelta(days=30), time(12, 0), tzinfo=MARKET_TIMEZONE)
+        self.patchers = [
+            mock.patch("src.caching.basics.get_paths", return_value={
+                       "data": {"cache": {"dir": self.tmp_dir.name}}}),
+            mock.patch.object(finnhub, "time", mock.Mock(
+                time=lambda: self.now.timestamp())),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.fetch = mock.patch.object(
+            finnhub, "_get_candles_between", side_effect=fake_candles_between).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_subranges_are_served_from_cache(self):
+        candles = finnhub.get_1m_candles("AAPL", MONDAY, MONDAY + timedelta(days=4))
+        assert candles
+        self.assertEqual(len(candles), 5 * 390)
+        self.assertEqual(self.fetch.call_count, 1)
+
+        tuesday = finnhub.get_1m_candles(
+            "AAPL", MONDAY + timedelta(days=1), MONDAY + timedelta(days=1))
+        assert tuesday
+        self.assertEqual(len(tuesday), 390)
+        self.assertEqual(tuesday[0]["datetime"], datetime.combine(
+            MONDAY + timedelta(days=1), time(9, 30), tzinfo=MARKET_TIMEZONE))
+        self.assertEqual(self.fetch.call_count, 1)
+
+        # only the missing days are fetched, in one call
+        candles = finnhub.get_1m_candles(
+            "AAPL", MONDAY - timedelta(days=3), MONDAY + timedelta(days=7))
+        assert candles
+        self.assertEqual(len(candles), 7 * 390)
+        self.assertEqual(self.fetch.call_count, 3)
+
+        self.assertIsNone(finnhub.get_1m_candles(
+            "AAPL", MONDAY + timedelta(days=5), MONDAY + timedelta(days=6)))
+        self.assertEqual(self.fetch.call_count, 3)
+
+    def test_live_loop_fetches_only_new_candles(self):
+        today = MONDAY + timedelta(days=2)
+        self.now = datetime.combine(today, time(10, 0), tzinfo=MARKET_TIMEZONE)
+
+        candles = finnhub.get_1m_candles("AAPL", MONDAY, today)
+        assert candles
+        self.assertEqual(len(candles), 2 * 390 + 30)
+        self.assertEqual(self.fetch.call_count, 1)
+
+        for minute in range(1, 6):
+            self.now = datetime.combine(
+                today, time(10, minute), tzinfo=MARKET_TIMEZONE)
+            candles = finnhub.get_1m_candles("AAPL", MONDAY, today)
+            assert candles
+            self.assertEqual(len(candles), 2 * 390 + 30 + minute)
+            self.assertEqual(self.fetch.call_count, 1 + minute)
+
+            # fetched from the last settled candle onward
+            from_param = self.fetch.call_args.args[2]
+            self.assertGreaterEqual(from_param, datetime.combine(
+                today, time(9, 57), tzinfo=MARKET_TIMEZONE).timestamp())
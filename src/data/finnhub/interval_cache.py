@@ -0,0 +1,135 @@
+from datetime import date, datetime, time, timedelta
+import os
+from typing import Iterator, Optional
+
+from src.caching.basics import _get_cache_path, read_json_cache, write_json_cache
+from src.trading_day import MARKET_TIMEZONE
+
+#
+# Cache of candles by time interval, for one symbol and resolution.
+#
+# Each market day is a segment (`finnhub/candle_intervals/<symbol>_<resolution>_<day>`) holding the intervals of
+# that day that were fetched, and the candles in them (Finnhub's columnar format).
+# A request is answered from the segments it spans; only the gaps not covered yet are fetched,
+# then merged back into the segments (adjacent intervals are merged, so fully fetched days are one interval).
+#
+# Intervals are inclusive, in epoch seconds.
+#
+
+Interval = tuple[int, int]
+
+CANDLE_INTERVALS_CACHE_PREFIX = "finnhub/candle_intervals/"
+FIELDS = ("t", "o", "h", "l", "c", "v")
+
+
+def merge_intervals(intervals: list[Interval]) -> list[Interval]:
+    """Sorts intervals, merging overlapping and adjacent ones."""
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(interval: Interval, covered: list[Interval]) -> list[Interval]:
+    """Parts of `interval` not in `covered` (merged intervals)."""
+    gaps: list[Interval] = []
+    start, end = interval
+    for covered_start, covered_end in covered:
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            gaps.append((start, covered_start - 1))
+        start = max(start, covered_end + 1)
+        if start > end:
+            break
+    if start <= end:
+        gaps.append((start, end))
+    return gaps
+
+
+def get_day_interval(day: date) -> Interval:
+    start = datetime.combine(day, time(0, 0), tzinfo=MARKET_TIMEZONE)
+    end = datetime.combine(day + timedelta(days=1),
+                           time(0, 0), tzinfo=MARKET_TIMEZONE)
+    return int(start.timestamp()), int(end.timestamp()) - 1
+
+
+def _generate_days(start: date, end: date) -> Iterator[date]:
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+class Segment:
+    def __init__(self, intervals: list[Interval], candles: dict[int, tuple]):
+        self.intervals = intervals
+        self.candles = candles  # t -> (o, h, l, c, v)
+
+    @staticmethod
+    def from_dict(d: Optional[dict]) -> "Segment":
+        if not d:
+            return Segment([], {})
+        candles = {t: (o, h, l, c, v)
+                   for t, o, h, l, c, v in zip(*(d[field] for field in FIELDS))}
+        return Segment([tuple(i) for i in d["intervals"]], candles)
+
+    def to_dict(self) -> dict:
+        ts = sorted(self.candles.keys())
+        d: dict = {"intervals": [list(i) for i in self.intervals], "t": ts}
+        for i, field in enumerate(FIELDS[1:]):
+            d[field] = [self.candles[t][i] for t in ts]
+        return d
+
+
+class CandleIntervalCache:
+    def __init__(self, symbol: str, resolution: str):
+        self.symbol = symbol
+        self.resolution = resolution
+
+    def _get_cache_key(self, day: date) -> str:
+        return f"{CANDLE_INTERVALS_CACHE_PREFIX}{self.symbol}_{self.resolution}_{day.isoformat()}"
+
+    def _read_segment(self, day: date) -> Segment:
+        return Segment.from_dict(read_json_cache(self._get_cache_key(day)))
+
+    def get_gaps(self, start: date, end: date) -> list[Interval]:
+        """Intervals from `start` to `end` (market days, inclusive) not cached yet, adjacent ones merged."""
+        gaps = []
+        for day in _generate_days(start, end):
+            gaps.extend(subtract_intervals(get_day_interval(
+                day), self._read_segment(day).intervals))
+        return merge_intervals(gaps)
+
+    def get_candles(self, start: date, end: date) -> dict[int, tuple]:
+        """Cached candles from `start` to `end` (market days, inclusive), t -> (o, h, l, c, v)."""
+        candles = {}
+        for day in _generate_days(start, end):
+            candles.update(self._read_segment(day).candles)
+        return candles
+
+    def add(self, interval: Interval, candles: dict[int, tuple]) -> None:
+        """Records that `interval` was fetched, `candles` being all candles in it."""
+        start_day = datetime.fromtimestamp(
+            interval[0], tz=MARKET_TIMEZONE).date()
+        end_day = datetime.fromtimestamp(
+            interval[1], tz=MARKET_TIMEZONE).date()
+        for day in _generate_days(start_day, end_day):
+            day_start, day_end = get_day_interval(day)
+            day_interval = (max(day_start, interval[0]),
+                            min(day_end, interval[1]))
+
+            segment = self._read_segment(day)
+            segment.intervals = merge_intervals(
+                segment.intervals + [day_interval])
+            segment.candles.update({t: candle for t, candle in candles.items(
+            ) if day_interval[0] <= t <= day_interval[1]})
+
+            key = self._get_cache_key(day)
+            os.makedirs(os.path.dirname(_get_cache_path(key)), exist_ok=True)
+            write_json_cache(key, segment.to_dict())
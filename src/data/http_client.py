@@ -0,0 +1,223 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import dataclasses
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional, Protocol, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.data.rate_limit import TokenBucket, get_token_bucket_path
+
+#
+# Shared HTTP client of data providers: each provider has a pooled session per process (keep-alive connections per
+# host, instead of a new connection per request), a rate limiter, and retries with jittered exponential backoff on
+# 429s, server errors and connection errors (honoring Retry-After).
+#
+# Requests block (`get`). asyncio callers can `await get_async`, and sync callers can fan calls out with
+# `map_concurrently`; both run requests on threads sharing the provider's connection pool.
+#
+
+RETRIED_STATUSES = {500, 502, 503, 504}
+
+
+class RateLimiter(Protocol):
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        ...
+
+    def drain(self) -> None:
+        ...
+
+
+class LocalTokenBucket:
+    """
+    Token bucket of one process (see `rate_limit.TokenBucket` to share one between processes).
+    Holds up to `capacity` tokens, refilled at `rate` tokens per second.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Returns 0 if acquired, else seconds to wait before trying again."""
+        with self.lock:
+            right_now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens +
+                              (right_now - self.updated_at) * self.rate)
+            self.updated_at = right_now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def drain(self) -> None:
+        with self.lock:
+            self.tokens = 0.
+            self.updated_at = time.monotonic()
+
+
+class SharedTokenBucket:
+    """
+    `rate_limit.TokenBucket` named `name`, shared by every process using the name (e.g. recorder workers).
+    Its file is found on first use, so providers can be built at import.
+    """
+
+    def __init__(self, name: str, capacity: float, rate: float):
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        self._bucket: Optional[TokenBucket] = None
+
+    @property
+    def bucket(self) -> TokenBucket:
+        if self._bucket is None:
+            self._bucket = TokenBucket(get_token_bucket_path(
+                self.name), capacity=self.capacity, rate=self.rate)
+        return self._bucket
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        return self.bucket.acquire(tokens, timeout)
+
+    def drain(self) -> None:
+        self.bucket.drain()
+
+
+@dataclasses.dataclass
+class RetryPolicy:
+    # retries of server and connection errors (429s are retried until they stop)
+    max_retries: int = 5
+    base_delay: float = 1.
+    max_delay: float = 60.
+
+    def get_delay(self, attempt: int) -> float:
+        """Backoff before retry `attempt` (0-based), with full jitter so processes do not retry in lockstep."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def _get_retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class Provider:
+    def __init__(self, name: str, rate_limiter: Optional[RateLimiter] = None, retry: RetryPolicy = RetryPolicy(),
+                 pool_size: int = 10, timeout: Optional[float] = 30.):
+        self.name = name
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        # (a forked process gets its own connections)
+        with self._session_lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session, self._session_pid = session, os.getpid()
+            return self._session
+
+    def get(self, url: str, rate_limiter: Optional[RateLimiter] = None, **kwargs) -> requests.Response:
+        """
+        `requests.get` through the provider's session, waiting for `rate_limiter` (the provider's by default)
+        before each attempt. Returns the last response, whatever its status.
+        """
+        rate_limiter = rate_limiter or self.rate_limiter
+        kwargs.setdefault("timeout", self.timeout)
+        retries = 0
+        rate_limited = 0
+        while True:
+            if rate_limiter:
+                rate_limiter.acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if retries >= self.retry.max_retries:
+                    raise
+                delay = self.retry.get_delay(retries)
+                retries += 1
+                logging.info(
+                    f"{self.name}: {type(e).__name__}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code == 429:
+                retry_after = _get_retry_after(response)
+                if rate_limiter:
+                    # (so others sharing the limiter back off too, and the limiter spaces out the retry)
+                    rate_limiter.drain()
+                    delay = retry_after or 0.
+                else:
+                    delay = retry_after or self.retry.get_delay(rate_limited)
+                rate_limited += 1
+                logging.info(
+                    f"{self.name}: rate limited, {response.url}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRIED_STATUSES and retries < self.retry.max_retries:
+                delay = _get_retry_after(
+                    response) or self.retry.get_delay(retries)
+                retries += 1
+                logging.info(
+                    f"{self.name}: {response.status_code}, {response.url}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            return response
+
+    async def get_async(self, url: str, **kwargs) -> requests.Response:
+        return await asyncio.to_thread(self.get, url, **kwargs)
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_concurrently(fn: Callable[[T], R], items: Iterable[T], concurrency: int = 8) -> list[R]:
+    """`[fn(item) for item in items]`, running up to `concurrency` calls at once (e.g. requests to providers)."""
+    items = list(items)
+    if concurrency <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+
+def get_calls_per_minute(provider_name: str, default: int) -> int:
+    return int(os.environ.get(f"{provider_name.upper()}_CALLS_PER_MINUTE", str(default)))
+
+
+def build_limited_provider(name: str, default_calls_per_minute: int, **kwargs: Any) -> Provider:
+    """
+    Provider limited to `<NAME>_CALLS_PER_MINUTE` (or the default) requests per minute across processes
+    (they share the API key, so e.g. recorder workers must not each get the whole quota).
+    """
+    calls_per_minute = get_calls_per_minute(name, default_calls_per_minute)
+    return Provider(name, rate_limiter=SharedTokenBucket(name, capacity=1, rate=calls_per_minute / 60), **kwargs)
@@ -0,0 +1,97 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src.data.http_client import LocalTokenBucket, Provider, RetryPolicy, build_limited_provider, map_concurrently
+from src.data.polygon.stand_in import PolygonStandIn
+
+URL_PATH = "/v2/aggs/grouped/locale/us/market/stocks/2022-01-03"
+
+# short delays so tests are quick
+RETRY = RetryPolicy(max_retries=2, base_delay=0.01, max_delay=0.05)
+
+
+class RecordingTokenBucket(LocalTokenBucket):
+    """Records when tokens were acquired, by the bucket's clock."""
+
+    def __init__(self, capacity: float, rate: float):
+        super().__init__(capacity, rate)
+        self.acquired_at: list[float] = []
+        self.recording_lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        with self.recording_lock:
+            wait = super().try_acquire(tokens)
+            if not wait:
+                self.acquired_at.append(self.updated_at)
+        return wait
+
+
+class TestProvider(unittest.TestCase):
+    def setUp(self):
+        self.stand_in = PolygonStandIn(calls=5, period=0.5).__enter__()
+        self.url = self.stand_in.base_url + URL_PATH
+
+    def tearDown(self):
+        self.stand_in.__exit__()
+
+    def test_retries_rate_limits_and_server_errors(self):
+        provider = Provider("test", retry=RETRY)
+        self.stand_in.forced_statuses = [429, 429, 429, 500, 503]
+        response = provider.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["T"], "AAPL")
+        self.assertEqual(self.stand_in.count(429), 3)
+
+    def test_gives_up_after_max_retries(self):
+        provider = Provider("test", retry=RETRY)
+        self.stand_in.forced_statuses = [500, 500, 500, 500]
+        response = provider.get(self.url)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.stand_in.count(500), 3)
+
+    def test_rate_limiter_keeps_within_quota(self):
+        rate_limiter = RecordingTokenBucket(capacity=1, rate=5 / 0.5)
+        provider = Provider("test", rate_limiter=rate_limiter, retry=RETRY)
+
+        async def get_all():
+            return await asyncio.gather(*[provider.get_async(self.url) for _ in range(12)])
+
+        responses = asyncio.run(get_all())
+
+        self.assertEqual([r.status_code for r in responses], [200] * 12)
+        # (requests can still reach the stand-in closer together than they were sent, and be retried after a 429)
+        self.assertEqual(len(rate_limiter.acquired_at),
+                         12 + self.stand_in.count(429))
+        # never more than 5 requests sent per 0.5s
+        for earlier, later in zip(rate_limiter.acquired_at, rate_limiter.acquired_at[5:]):
+            self.assertGreaterEqual(later - earlier, 0.5 - 1e-9)
+
+
+def _try_acquire(name: str) -> bool:
+    # (like a module building its provider at import, in each process)
+    provider = build_limited_provider(name, 1)
+    assert provider.rate_limiter
+    return provider.rate_limiter.acquire(timeout=0)
+
+
+class TestBuildLimitedProvider(unittest.TestCase):
+    def test_quota_is_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as locks_dir, \
+                mock.patch("src.data.rate_limit.get_paths", return_value={"data": {"locks": {"dir": locks_dir}}}):
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                self.assertTrue(executor.submit(_try_acquire, "test").result())
+            self.assertFalse(_try_acquire("test"))
+
+
+class TestMapConcurrently(unittest.TestCase):
+    def test_keeps_order(self):
+        def slow_square(x: int) -> int:
+            time.sleep(0.01 * (5 - x))
+            return x * x
+        self.assertEqual(map_concurrently(
+            slow_square, range(5)), [0, 1, 4, 9, 16])
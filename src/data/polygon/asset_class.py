@@ -3,33 +3,67 @@ from typing import Optional
 
 from src.data.polygon.polygon import is_ticker_one_of
 
+#
+# Each predicate has a `types` attribute: the Polygon types it is true for, so tickers can be classified
+# in bulk (see `enrich_tickers_with_asset_class`).
+#
+
+STOCK_TYPES = ("CS", "PFD", "ADRC")
+
 
 def is_stock(ticker, day: Optional[date] = None) -> bool:
     # "ADRC" -> sometimes don't clear or are supported by brokers, also can be China
-    return is_ticker_one_of(ticker, ["CS", "PFD", "ADRC"], day=day)
+    return is_ticker_one_of(ticker, STOCK_TYPES, day=day)
+
+
+setattr(is_stock, "types", STOCK_TYPES)
+
+
+ETF_TYPES = ("ETF", "ETN")
 
 
 def is_etf(ticker, day: Optional[date] = None) -> bool:
     # "ETN" -> can take longer to clear?
-    return is_ticker_one_of(ticker, ["ETF", "ETN"], day=day)
+    return is_ticker_one_of(ticker, ETF_TYPES, day=day)
+
+
+setattr(is_etf, "types", ETF_TYPES)
+
+
+WARRANT_TYPES = ("WARRANT",)
 
 
 def is_warrant(ticker, day: Optional[date] = None) -> bool:
     # NOTE: "ADRW" -> Polygon showed 0 on 2022-01-15, let's save a request
-    return is_ticker_one_of(ticker, ["WARRANT"], day=day)
+    return is_ticker_one_of(ticker, WARRANT_TYPES, day=day)
+
+
+setattr(is_warrant, "types", WARRANT_TYPES)
 
 
 def is_warrant_format(ticker: str) -> bool:
     return ticker.upper().endswith("W") or ".WS" in ticker.upper()
 
 
+RIGHT_TYPES = ("RIGHT",)
+
+
 def is_right(ticker, day: Optional[date] = None) -> bool:
     # NOTE: "ADRR"
-    return is_ticker_one_of(ticker, ["RIGHT"], day=day)
+    return is_ticker_one_of(ticker, RIGHT_TYPES, day=day)
+
+
+setattr(is_right, "types", RIGHT_TYPES)
+
+
+UNIT_TYPES = ("UNIT",)
 
 
 def is_unit(ticker, day: Optional[date] = None) -> bool:
-    return is_ticker_one_of(ticker, ["UNIT"], day=day)
+    return is_ticker_one_of(ticker, UNIT_TYPES, day=day)
+
+
+setattr(is_unit, "types", UNIT_TYPES)
 
 
 def is_unit_format(ticker: str) -> bool:
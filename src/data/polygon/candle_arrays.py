@@ -0,0 +1,122 @@
+from datetime import date, datetime
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+from src.caching.basics import _get_cache_path, create_temp_file
+from src.data.http_client import map_concurrently
+from src.data.polygon.get_candles import get_raw_candles_by_day
+from src.data.types.candles import CandleIntraday
+from src.trading_day import MARKET_TIMEZONE, today
+
+#
+# Binary cache of 1m candles, one structured array per symbol per day (`polygon/candles_1m/<symbol>_<day>.npy`).
+#
+# Derived from the JSON candles cache (which stays what gets fetched), but loads without parsing JSON
+# or creating a `datetime` per candle. Candles are only turned into `CandleIntraday` dicts when asked for.
+#
+
+CANDLES_1M_CACHE_PREFIX = "polygon/candles_1m/"
+
+CANDLE_DTYPE = np.dtype([
+    ("t", np.int64),  # epoch seconds
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+    ("trades", np.int64),
+    ("vwap", np.float64),  # NaN if unknown
+])
+
+
+def _get_candle_array_cache_key(symbol: str, day: date) -> str:
+    return f"{CANDLES_1M_CACHE_PREFIX}{symbol}_{day.isoformat()}.npy"
+
+
+def from_raw_candles(raw_candles: list[dict]) -> np.ndarray:
+    """Polygon aggs results to a candle array (sorted by time)."""
+    candles = np.empty(len(raw_candles), dtype=CANDLE_DTYPE)
+    candles["t"] = [c["t"] // 1000 for c in raw_candles]
+    candles["open"] = [c["o"] for c in raw_candles]
+    candles["high"] = [c["h"] for c in raw_candles]
+    candles["low"] = [c["l"] for c in raw_candles]
+    candles["close"] = [c["c"] for c in raw_candles]
+    candles["volume"] = [c["v"] for c in raw_candles]
+    candles["trades"] = [c.get("n", 0) for c in raw_candles]
+    candles["vwap"] = [c.get("vw", np.nan) or np.nan for c in raw_candles]
+    return np.sort(candles, order="t", kind="stable")
+
+
+def to_candle(row: np.void) -> CandleIntraday:
+    vwap = float(row["vwap"])
+    candle = {
+        "open": float(row["open"]),
+        "high": float(row["high"]),
+        "low": float(row["low"]),
+        "close": float(row["close"]),
+        "volume": float(row["volume"]),
+        "trades": int(row["trades"]),
+        "vwap": None if np.isnan(vwap) else vwap,
+        "t": int(row["t"]),
+        "datetime": datetime.fromtimestamp(int(row["t"]), tz=MARKET_TIMEZONE),
+    }
+    return candle  # type: ignore
+
+
+def to_candles(candles: np.ndarray) -> list[CandleIntraday]:
+    return [to_candle(row) for row in candles]
+
+
+def _read_candle_array(symbol: str, day: date) -> Optional[np.ndarray]:
+    try:
+        return np.load(_get_cache_path(_get_candle_array_cache_key(symbol, day)))
+    except (FileNotFoundError, ValueError, EOFError):
+        return None
+
+
+def _write_candle_array(symbol: str, day: date, candles: np.ndarray) -> None:
+    path = _get_cache_path(_get_candle_array_cache_key(symbol, day))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = create_temp_file(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, candles)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def get_1m_candle_array(symbol: str, day: date) -> np.ndarray:
+    """
+    1m candles of `symbol` on `day` (empty if none).
+    NOTE: same-day candles are not cached, like the JSON cache.
+    """
+    candles = _read_candle_array(symbol, day)
+    if candles is not None:
+        return candles
+
+    response = get_raw_candles_by_day(symbol, "1", day, day).get(day) or {}
+    candles = from_raw_candles(response.get("results", []))
+    if day < today():
+        _write_candle_array(symbol, day, candles)
+    return candles
+
+
+def get_1m_candle_arrays(symbols: list[str], day: date) -> dict[str, np.ndarray]:
+    """
+    1m candles of each of `symbols` on `day`, leaving out symbols without candles.
+    """
+    symbol_to_candles = {}
+    # (fetched concurrently, as uncached symbols are a request each)
+    all_candles = map_concurrently(
+        lambda symbol: get_1m_candle_array(symbol, day), symbols, concurrency=4)
+    for symbol, candles in zip(symbols, all_candles):
+        if not len(candles):
+            logging.warning(f"no candles for {symbol} on {day}")
+            continue
+        symbol_to_candles[symbol] = candles
+    return symbol_to_candles
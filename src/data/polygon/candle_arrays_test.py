@@ -0,0 +1,55 @@
+from datetime import date, datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.data.polygon import candle_arrays
+from src.trading_day import MARKET_TIMEZONE
+
+DAY = date(2022, 1, 3)
+RAW_CANDLES = [
+    {"t": 1641220260000, "o": 10.5, "h": 11, "l": 10, "c": 10.75, "v": 200, "n": 3, "vw": 10.6},
+    {"t": 1641220200000, "o": 10, "h": 10.5, "l": 9.5, "c": 10.5, "v": 100, "n": 1},
+]
+
+
+class TestCandleArrays(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp_dir.name, "polygon", "candles"))
+        self.patcher = mock.patch("src.caching.basics.get_paths", return_value={
+                                  "data": {"cache": {"dir": self.tmp_dir.name}}})
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_from_raw_candles(self):
+        candles = candle_arrays.from_raw_candles(RAW_CANDLES)
+
+        self.assertEqual(list(candles["t"]), [1641220200, 1641220260])
+        assert np.isnan(candles["vwap"][0])
+
+        candle = candle_arrays.to_candle(candles[1])
+        self.assertEqual(candle["datetime"], datetime(
+            2022, 1, 3, 9, 31, tzinfo=MARKET_TIMEZONE))
+        self.assertEqual((candle["open"], candle["close"], candle["volume"], candle["trades"], candle["vwap"]),
+                         (10.5, 10.75, 200., 3, 10.6))
+        self.assertIsNone(candle_arrays.to_candle(candles[0])["vwap"])
+
+    def test_cached_after_first_load(self):
+        with mock.patch.object(candle_arrays, "get_raw_candles_by_day", return_value={DAY: {"results": RAW_CANDLES}}) as fetch:
+            first = candle_arrays.get_1m_candle_arrays(["AAPL"], DAY)["AAPL"]
+            second = candle_arrays.get_1m_candle_arrays(["AAPL"], DAY)["AAPL"]
+
+        fetch.assert_called_once()
+        self.assertEqual(first.tobytes(), second.tobytes())
+
+    def test_leaves_out_symbols_without_candles(self):
+        with mock.patch.object(candle_arrays, "get_raw_candles_by_day", return_value={DAY: {"status": "OK"}}):
+            self.assertEqual(
+                candle_arrays.get_1m_candle_arrays(["AAPL"], DAY), {})
@@ -6,7 +6,7 @@ from zoneinfo import ZoneInfo
 
 from src import trading_day
 
-from src.caching.basics import read_json_cache, write_json_cache
+from src.caching.basics import lock_cache_entry, read_json_cache, write_json_cache
 from src.data.types.candles import Candle, CandleInterday, CandleIntraday
 
 MARKET_TIMEZONE = ZoneInfo("America/New_York")
@@ -51,26 +51,58 @@ def get_candles(
     NOTE: we will cache adjusted candles, make sure not to compare with unadjusted or differently adjusted values.
     """
     # TODO: use aggregation to improve cache hits, just store 1m and D candles.
+    results_by_day = get_raw_candles_by_day(
+        symbol, resolution, start, end, adjusted=adjusted)
 
-    results_by_day = {}
+    candles = []
     for day in trading_day.generate_trading_days(start, end):
-        cache_key = f"polygon/candles/{symbol}_{resolution}_{day.isoformat()}"
-        cached = read_json_cache(cache_key)
-        results_by_day[day] = cached
+        day_candles = _convert_candles_format(
+            results_by_day[day], resolution)
+        if day_candles:
+            candles.extend(day_candles)
+    return candles
 
-    def _build_results(results_by_day):
-        candles = []
+
+def get_raw_candles_by_day(
+    symbol: str,
+    resolution: str,
+    start: date,
+    end: date,
+    adjusted=True,
+) -> dict[date, dict]:
+    """
+    Polygon responses (`results` being raw candles) of each trading day from `start` to `end`, from cache or fetched.
+    """
+    def _read_cache(results_by_day):
         for day in trading_day.generate_trading_days(start, end):
-            day_candles = _convert_candles_format(
-                results_by_day[day], resolution)
-            if day_candles:
-                candles.extend(day_candles)
-        return candles
+            if not results_by_day.get(day):
+                results_by_day[day] = read_json_cache(
+                    _get_candles_cache_key(symbol, resolution, day))
+
+    results_by_day = {}
+    _read_cache(results_by_day)
 
     # full cache hit
     if all(v for v in results_by_day.values()):
-        return _build_results(results_by_day)
+        return results_by_day
+
+    # one fetch at a time per symbol and resolution, across processes
+    with lock_cache_entry(f"polygon/candles/{symbol}_{resolution}"):
+        # another process may have fetched some of it while we waited
+        _read_cache(results_by_day)
+        if all(v for v in results_by_day.values()):
+            return results_by_day
+
+        _fetch_missing_days(symbol, resolution, results_by_day, adjusted)
 
+    return results_by_day
+
+
+def _get_candles_cache_key(symbol: str, resolution: str, day: date) -> str:
+    return f"polygon/candles/{symbol}_{resolution}_{day.isoformat()}"
+
+
+def _fetch_missing_days(symbol: str, resolution: str, results_by_day: dict, adjusted: bool):
     fetch_start = min(k for k, v in results_by_day.items() if not v)
     fetch_end = max(k for k, v in results_by_day.items() if not v)
     logging.info(
@@ -98,9 +130,7 @@ def get_candles(
         should_cache = not (day >= date.today())
         if should_cache:
             write_json_cache(
-                f"polygon/candles/{symbol}_{resolution}_{day.isoformat()}", day_data)
-
-    return _build_results(results_by_day)
+                _get_candles_cache_key(symbol, resolution, day), day_data)
 
 
 def _get_candles(symbol: str, resolution: str, start: date, end: date, adjusted=True):
@@ -1,18 +1,21 @@
 from datetime import date, datetime, time
 from functools import lru_cache
 import logging
-from time import sleep
 from typing import Optional, Tuple, TypeVar, TypedDict, cast
-import requests
+import numpy as np
 
 from src.caching.basics import (
     clear_json_cache,
     get_entry_time,
     get_matching_entries,
+    lock_cache_entry,
     read_json_cache,
     write_json_cache,
 )
-from src.data.polygon.polygon import get_polygon_api_key
+from src.data.polygon import grouped_aggs_store
+from src.data.polygon.grouped_aggs_store import get_grouped_aggs_cache_key
+from src.data.polygon.polygon import POLYGON, get_polygon_api_key, get_polygon_base_url, get_polygon_token_bucket
+from src.data.rate_limit import TokenBucket
 from src.trading_day import (
     generate_trading_days,
     get_last_market_close,
@@ -25,10 +28,6 @@ from src.trading_day import (
 )
 
 
-def get_grouped_aggs_cache_key(day: date) -> str:
-    return f'polygon/grouped_aggs/{day.strftime("%Y-%m-%d")}'
-
-
 class Ticker(TypedDict):
     T: str
     o: float
@@ -62,12 +61,17 @@ def _build_ticker(ticker: dict) -> Ticker:
 #
 # Cache design:
 # - always contains days M-F, but "results" are not present if holiday.
+# - JSON entries are the source of truth, `grouped_aggs_store` keeps a columnar copy for fast reads.
 #
 
 
 def _cache_is_missing_days(start: date, end: date) -> bool:
+    store = grouped_aggs_store.get_store()
     day = start
     while day <= end:
+        if store and store.is_fresh(day):
+            day = next_trading_day(day)
+            continue
         if not read_json_cache(get_grouped_aggs_cache_key(day)):
             return True
         day = next_trading_day(day)
@@ -151,6 +155,8 @@ def prepare_cache_grouped_aggs(start: date, end: date) -> None:
     else:
         logging.info("cache is all present, will not refetch")
 
+    grouped_aggs_store.build_store()
+
 
 class GroupedAggsResponse(TypedDict):
     results: list[Ticker]
@@ -168,40 +174,46 @@ def fetch_grouped_aggs_with_cache(day: date) -> GroupedAggsResponse:
 
     cache_key = get_grouped_aggs_cache_key(day)
 
-    if should_cache:
+    if not should_cache:
+        return fetch_grouped_aggs(day)
+
+    cache_hit, cached = _read_grouped_aggs_cache(day)
+    if cache_hit:
+        return cast(GroupedAggsResponse, cached)
+
+    with lock_cache_entry(cache_key):
+        # another process may have fetched it while we waited
         cached = read_json_cache(cache_key)
         if cached:
-            return cached
+            return cast(GroupedAggsResponse, cached)
 
-    data = fetch_grouped_aggs(day)
-
-    if should_cache:
+        data = fetch_grouped_aggs(day)
         write_json_cache(cache_key, data)
 
     return data
 
 
-def fetch_grouped_aggs(day: date) -> GroupedAggsResponse:
+def fetch_grouped_aggs(day: date, token_bucket: Optional[TokenBucket] = None) -> GroupedAggsResponse:
+    """
+    Waits for a token of `token_bucket` (Polygon's shared one by default) before each request and empties the bucket
+    on 429s (so other processes sharing the bucket back off too).
+    """
     strftime = day.strftime("%Y-%m-%d")
     logging.info(f"fetching grouped aggs for {strftime}")
 
-    while True:
-        # TODO: adjusted=false, do the adjustments on our side (more cache hits)
-        response = requests.get(
-            f"https://api.polygon.io/v2/aggs/grouped/locale/us/market/stocks/{strftime}",
-            params={
-                "adjusted": "true",
-            },
-            headers={"Authorization": f"Bearer {get_polygon_api_key()}"},
-        )
-        if response.status_code == 429:
-            logging.info("Rate limit exceeded, waiting...")
-            sleep(10)
-            continue
-        response.raise_for_status()
+    # TODO: adjusted=false, do the adjustments on our side (more cache hits)
+    response = POLYGON.get(
+        f"{get_polygon_base_url()}/v2/aggs/grouped/locale/us/market/stocks/{strftime}",
+        rate_limiter=token_bucket or get_polygon_token_bucket(),
+        params={
+            "adjusted": "true",
+        },
+        headers={"Authorization": f"Bearer {get_polygon_api_key()}"},
+    )
+    response.raise_for_status()
 
-        data = response.json()
-        return data
+    data = response.json()
+    return data
 
 
 def _enrich_grouped_aggs(grouped_aggs: GroupedAggsResponse) -> EnrichedGroupedAggsResponse:
@@ -212,6 +224,24 @@ def _enrich_grouped_aggs(grouped_aggs: GroupedAggsResponse) -> EnrichedGroupedAg
     return enriched_grouped_aggs
 
 
+def _read_grouped_aggs_cache(day: date) -> Tuple[bool, Optional[dict]]:
+    """
+    Reads from the columnar store if it is fresh for `day`, otherwise from the JSON cache entry.
+    Returns (cache_hit_bool, raw_grouped_aggs) (holidays are a cache hit without "results")
+    """
+    store = grouped_aggs_store.get_store()
+    if store and store.is_fresh(day):
+        tickers = store.get_tickers(day)
+        if tickers is None:
+            return True, {"status": "OK", "resultsCount": 0}
+        return True, {"status": "OK", "resultsCount": len(tickers), "results": tickers}
+
+    cache = read_json_cache(get_grouped_aggs_cache_key(day))
+    if not cache:
+        return False, None
+    return True, cache
+
+
 #
 # Utilities for strategies to use
 #
@@ -240,10 +270,9 @@ def get_today_grouped_aggs_from_cache(today: date) -> Tuple[bool, Optional[Enric
     If cache hit and is holiday, grouped_aggs is None
     Else, grouped_aggs is the data
     """
-    cache_key = get_grouped_aggs_cache_key(today)
-    cache = read_json_cache(cache_key)
+    cache_hit, cache = _read_grouped_aggs_cache(today)
 
-    if not cache:
+    if not cache_hit:
         return False, None
 
     # skip days where API returns no data (like trading holiday)
@@ -258,28 +287,89 @@ def get_last_n_candles(today: date, ticker: str, n: int = 14) -> Optional[list[T
     if returned None, indicates:
         - the ticker was not trading one of those days (newly listed?)
         - cache does not contain enough days of data
+    (to look up many tickers, use `get_last_n_candles_batch`)
     """
-    candles = []
-    while len(candles) < n:
-        cache_hit, grouped_aggs = get_today_grouped_aggs_from_cache_with_lru_cache(
-            today)
-        if not cache_hit:
-            # we don't have enough data in the cache
-            return None
-
-        if not grouped_aggs:
-            # holiday
-            today = previous_trading_day(today)
-            continue
+    candles, mask = get_last_n_candles_batch(today, [ticker], n=n)
+    if not mask[0].all():
+        return None
+    return [_build_ticker_from_row(ticker, row) for row in candles[0]]
+
+
+# order of fields on last axis of `get_last_n_candles_batch` candles
+CANDLE_FIELDS = grouped_aggs_store.FIELDS
 
-        if ticker not in grouped_aggs["tickermap"]:
-            # was not trading that day (listed recently?)
-            return None
 
-        candle = grouped_aggs["tickermap"][ticker]
-        candles.append(candle)
+def get_last_n_candles_batch(today: date, symbols: list[str], n: int = 14) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched `get_last_n_candles`, returns (candles, mask):
+    - candles: (len(symbols), n, len(CANDLE_FIELDS)) array, with entry [:, 0] being the most recent day
+    - mask: (len(symbols), n) array, False where the symbol was not trading that day or the cache does not go back that far
+    `get_last_n_candles` would return None for symbols where `mask[i].all()` is False.
+    """
+    candles = np.zeros((len(symbols), n, len(CANDLE_FIELDS)), dtype=np.float64)
+    mask = np.zeros((len(symbols), n), dtype=bool)
+    days = _get_last_n_days_with_results(today, n)
+
+    store = grouped_aggs_store.get_store()
+    store_day_positions = [i for i, day in enumerate(
+        days) if store and store.is_fresh(day)]
+    if store and store_day_positions:
+        day_indexes = np.array(
+            [store.day_to_index[days[i]] for i in store_day_positions], dtype=np.int64)
+        rows = store.get_rows(day_indexes, store.get_symbol_ids(symbols))
+        present = rows >= 0
+        for field_index, field in enumerate(CANDLE_FIELDS):
+            values = np.zeros(rows.shape, dtype=np.float64)
+            values[present] = store.columns[field][rows[present]]
+            candles[:, store_day_positions, field_index] = values
+        mask[:, store_day_positions] = present
+
+    # days not (yet) in the store are read from the JSON cache
+    for i in sorted(set(range(len(days))) - set(store_day_positions)):
+        _cache_hit, grouped_aggs = get_today_grouped_aggs_from_cache_with_lru_cache(
+            days[i])
+        tickermap = cast(EnrichedGroupedAggsResponse, grouped_aggs)["tickermap"]
+        for symbol_index, symbol in enumerate(symbols):
+            ticker = tickermap.get(symbol)
+            if ticker is None:
+                continue
+            candles[symbol_index, i] = [ticker.get(field, 0)  # type: ignore
+                                        for field in CANDLE_FIELDS]
+            mask[symbol_index, i] = True
+
+    return candles, mask
+
+
+def _get_last_n_days_with_results(today: date, n: int) -> list[date]:
+    """
+    Walks back from `today` (inclusive) and returns up to `n` cached days that are not holidays, most recent first.
+    Stops early if the cache does not go back far enough.
+    """
+    store = grouped_aggs_store.get_store()
+    days: list[date] = []
+    while len(days) < n:
+        if store and store.is_fresh(today):
+            has_results = store.has_results[store.day_to_index[today]]
+        else:
+            cache_hit, grouped_aggs = get_today_grouped_aggs_from_cache_with_lru_cache(
+                today)
+            if not cache_hit:
+                # we don't have enough data in the cache
+                break
+            has_results = grouped_aggs is not None
+
+        if has_results:
+            days.append(today)
         today = previous_trading_day(today)
-    return list(candles)
+    return days
+
+
+def _build_ticker_from_row(symbol: str, row: np.ndarray) -> Ticker:
+    ticker = dict(zip(CANDLE_FIELDS, row.tolist()))
+    ticker["T"] = symbol
+    ticker["v"] = int(ticker["v"])
+    ticker["n"] = int(ticker["n"])
+    return cast(Ticker, ticker)
 
 
 def get_last_2_candles(today: date, ticker: str) -> Optional[Tuple[Ticker, Ticker]]:
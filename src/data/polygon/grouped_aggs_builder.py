@@ -0,0 +1,173 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time
+import json
+import logging
+import os
+from typing import Optional
+
+from src.caching.basics import _get_cache_path, create_temp_file, delete_json_cache, get_matching_entries, write_json_cache
+from src.data.polygon import grouped_aggs_store
+from src.data.polygon.grouped_aggs import fetch_grouped_aggs
+from src.data.polygon.grouped_aggs_store import get_grouped_aggs_cache_key
+from src.data.polygon.polygon import get_polygon_token_bucket
+from src.data.rate_limit import TokenBucket
+from src.trading_day import generate_trading_days, get_last_market_close, is_during_market_hours, now, today
+
+#
+# Parallel, resumable grouped aggs cache builder.
+#
+# Workers share one rate limit (token bucket in a file), so adding workers never goes over the Polygon plan quota.
+# Progress is kept in a journal, each line being a day that was fetched and cached in a given session
+# (session = last market close at time of fetch; adjustments for splits etc. only change between sessions).
+# If the builder is interrupted, re-running it skips days already fetched in the current session.
+# Days fetched in a previous session are re-fetched and overwritten in place, nothing is deleted up front.
+# With `prune`, days outside the range are deleted once it is all fetched, so the cache is exactly the refreshed
+# range (a day left behind would keep the adjustments of the session it was last fetched in).
+#
+
+JOURNAL_CACHE_KEY = "polygon/grouped_aggs_journal.jsonl"
+
+
+def get_current_session(market_now: Optional[datetime] = None) -> Optional[str]:
+    """
+    Returns None during market hours (data fetched then is never reused, as prices may be adjusted at the next session)
+    """
+    market_now = market_now or now()
+    if is_during_market_hours(market_now):
+        return None
+    return get_last_market_close(market_now).isoformat()
+
+
+def read_journal() -> dict[date, str]:
+    """Returns day -> session it was last fetched in."""
+    days: dict[date, str] = {}
+    try:
+        with open(_get_cache_path(JOURNAL_CACHE_KEY)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # partially written line (crash), ignore
+                    continue
+                days[date.fromisoformat(entry["day"])] = entry["session"]
+    except FileNotFoundError:
+        pass
+    return days
+
+
+def _append_journal(day: date, session: Optional[str]) -> None:
+    with open(_get_cache_path(JOURNAL_CACHE_KEY), "a") as f:
+        f.write(json.dumps({
+            "day": day.isoformat(),
+            "session": session,
+            "fetched_at": now().isoformat(),
+        }) + "\n")
+
+
+def _reset_journal() -> None:
+    try:
+        os.remove(_get_cache_path(JOURNAL_CACHE_KEY))
+    except FileNotFoundError:
+        pass
+
+
+def _prune_outside(start: date, end: date) -> None:
+    """Deletes cache entries and journal lines of days before `start` or after `end`."""
+    pruned = 0
+    for key in get_matching_entries(grouped_aggs_store.GROUPED_AGGS_CACHE_PREFIX):
+        try:
+            day = date.fromisoformat(
+                key[len(grouped_aggs_store.GROUPED_AGGS_CACHE_PREFIX):])
+        except ValueError:
+            continue
+        if day < start or day > end:
+            delete_json_cache(key)
+            pruned += 1
+    logging.info(f"pruned {pruned} grouped aggs days outside {start} to {end}")
+
+    path = _get_cache_path(JOURNAL_CACHE_KEY)
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return
+    fd, tmp_path = create_temp_file(path)
+    try:
+        with os.fdopen(fd, "w") as f:
+            for line in lines:
+                try:
+                    day = date.fromisoformat(json.loads(line)["day"])
+                except (ValueError, KeyError):
+                    continue
+                if start <= day <= end:
+                    f.write(line)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _is_cacheable(day: date) -> bool:
+    # same rule as `fetch_grouped_aggs_with_cache`: today is only final after close
+    if day == today():
+        return now().time() > time(16, 0)
+    return day < today()
+
+
+def get_days_to_fetch(start: date, end: date, session: Optional[str]) -> list[date]:
+    journal = read_journal()
+
+    days = []
+    for day in generate_trading_days(start, end):
+        if not _is_cacheable(day):
+            continue
+        is_done = session is not None and journal.get(day) == session and \
+            os.path.exists(_get_cache_path(get_grouped_aggs_cache_key(day)))
+        if not is_done:
+            days.append(day)
+    return days
+
+
+def _fetch_and_cache_day(day: date, token_bucket: TokenBucket) -> date:
+    data = fetch_grouped_aggs(day, token_bucket=token_bucket)
+    write_json_cache(get_grouped_aggs_cache_key(day), data)
+    return day
+
+
+def build_grouped_aggs_cache(start: date, end: date, workers: int = 4, restart: bool = False, prune: bool = False, token_bucket: Optional[TokenBucket] = None) -> None:
+    """
+    Fetches every trading day from `start` to `end` (inclusive) not yet fetched in the current session,
+    using `workers` processes sharing `token_bucket` (Polygon plan limit by default).
+    With `restart`, ignores progress journal and re-fetches everything.
+    With `prune`, then deletes days outside `start` to `end`.
+    """
+    token_bucket = token_bucket or get_polygon_token_bucket()
+    session = get_current_session()
+
+    if restart:
+        logging.info("restarting grouped aggs cache build from scratch")
+        _reset_journal()
+
+    days = get_days_to_fetch(start, end, session)
+    logging.info(
+        f"{len(days)} days to fetch from {start} to {end} ({workers=})")
+
+    if days:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(
+                _fetch_and_cache_day, day, token_bucket) for day in days]
+            try:
+                for i, future in enumerate(as_completed(futures)):
+                    day = future.result()
+                    _append_journal(day, session)
+                    logging.info(
+                        f"fetched grouped aggs for {day} ({i + 1}/{len(days)})")
+            except BaseException:
+                # already-fetched days are in the journal, re-running will pick up from here
+                for f in futures:
+                    f.cancel()
+                raise
+
+    if prune:
+        _prune_outside(start, end)
+    grouped_aggs_store.build_store()
@@ -0,0 +1,114 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.caching.basics import read_json_cache, write_json_cache
+from src.data.polygon import grouped_aggs_builder, grouped_aggs_store
+from src.data.polygon.grouped_aggs_store import get_grouped_aggs_cache_key
+from src.data.polygon.stand_in import PolygonStandIn
+from src.data.rate_limit import TokenBucket
+from src.trading_day import generate_trading_days
+
+START = datetime.date(2022, 1, 3)
+END = datetime.date(2022, 1, 12)
+
+# 5 requests per minute, but with shorter minutes so tests are quick
+CALLS = 5
+PERIOD = 0.5
+
+
+class TestGroupedAggsBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        os.makedirs(os.path.join(cache_dir, "polygon", "grouped_aggs"))
+        self.patchers = [
+            mock.patch("src.caching.basics.get_paths",
+                       return_value={"data": {"cache": {"dir": cache_dir}}}),
+            mock.patch.dict(os.environ, {"POLYGON_API_KEY": "test-key"}),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        grouped_aggs_store._loaded_store = None
+
+        self.stand_in = PolygonStandIn(calls=CALLS, period=PERIOD).__enter__()
+        self.patchers.append(mock.patch.dict(
+            os.environ, {"POLYGON_BASE_URL": self.stand_in.base_url}))
+        self.patchers[-1].start()
+
+        self.token_bucket = TokenBucket(os.path.join(
+            self.tmp_dir.name, "polygon.bucket.json"), capacity=1, rate=CALLS / PERIOD)
+
+    def tearDown(self):
+        self.stand_in.__exit__()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        grouped_aggs_store._loaded_store = None
+        self.tmp_dir.cleanup()
+
+    def build(self, restart=False):
+        grouped_aggs_builder.build_grouped_aggs_cache(
+            START, END, workers=3, restart=restart, token_bucket=self.token_bucket)
+
+    def test_builds_within_quota(self):
+        started_at = time.monotonic()
+        self.build()
+        elapsed = time.monotonic() - started_at
+
+        days = list(generate_trading_days(START, END))
+        for day in days:
+            cached = read_json_cache(get_grouped_aggs_cache_key(day))
+            assert cached and cached["results"][0]["T"] == "AAPL"
+
+        self.assertEqual(self.stand_in.count(200), len(days))
+        # shared bucket spaces out requests of all workers, so quota is (almost) never exceeded
+        self.assertLessEqual(self.stand_in.count(429), 1)
+        self.assertGreaterEqual(elapsed, (len(days) - 1) * PERIOD / CALLS)
+
+        store = grouped_aggs_store.get_store()
+        assert store and store.days == days
+
+    @mock.patch.object(grouped_aggs_builder, "get_current_session", return_value="2022-01-12T16:00:00-05:00")
+    def test_resumes_from_journal(self, _get_current_session):
+        first_days = list(generate_trading_days(START, END))[:3]
+        session = "2022-01-12T16:00:00-05:00"
+        grouped_aggs_builder.build_grouped_aggs_cache(
+            first_days[0], first_days[-1], workers=2, token_bucket=self.token_bucket)
+        assert set(grouped_aggs_builder.read_journal().values()) == {session}
+
+        self.build()
+
+        days = list(generate_trading_days(START, END))
+        self.assertEqual(self.stand_in.count(200), len(days))
+
+        # restarting re-fetches everything, overwriting entries in place
+        self.build(restart=True)
+        self.assertEqual(self.stand_in.count(200), 2 * len(days))
+
+    def test_429_backs_off_and_retries(self):
+        self.stand_in.forced_statuses = [429, 429]
+
+        self.build()
+
+        days = list(generate_trading_days(START, END))
+        self.assertEqual(self.stand_in.count(200), len(days))
+        self.assertGreaterEqual(self.stand_in.count(429), 2)
+        assert set(grouped_aggs_builder.read_journal().keys()) == set(days)
+
+    def test_prunes_days_outside_range(self):
+        old_day = datetime.date(2021, 12, 1)
+        write_json_cache(get_grouped_aggs_cache_key(old_day), {
+                         "status": "OK", "results": [{"T": "AAPL", "c": 1.}]})
+        grouped_aggs_builder._append_journal(old_day, "2021-12-01T16:00:00-05:00")
+
+        grouped_aggs_builder.build_grouped_aggs_cache(
+            START, END, workers=3, prune=True, token_bucket=self.token_bucket)
+
+        days = list(generate_trading_days(START, END))
+        assert read_json_cache(get_grouped_aggs_cache_key(old_day)) is None
+        self.assertEqual(sorted(grouped_aggs_builder.read_journal().keys()), days)
+        store = grouped_aggs_store.get_store()
+        assert store and store.days == days
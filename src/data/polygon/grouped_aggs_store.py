@@ -0,0 +1,327 @@
+from datetime import date, datetime
+import logging
+import os
+import shutil
+from typing import Iterable, Optional, Tuple
+import uuid
+
+import numpy as np
+
+from src.caching.basics import (
+    _get_cache_path,
+    get_entry_time,
+    get_matching_entries,
+    lock_cache_entry,
+    read_json_cache,
+    write_json_cache,
+)
+
+#
+# Columnar store of the grouped aggs cache.
+#
+# The JSON cache (`polygon/grouped_aggs/YYYY-MM-DD`) stays the source of truth (it is what gets fetched and refreshed),
+# the store is a derived copy of the whole cached range that can be memory-mapped instead of re-parsing ~10k ticker
+# dicts per day.
+#
+# Layout (`polygon/grouped_aggs_store/`):
+# - `manifest.json`: points at the current build, so a rebuild can be swapped in atomically
+# - `<build_id>/days.json`: date index (ISO days, whether Polygon had results that day, cache entry time of each day)
+# - `<build_id>/symbols.json`: symbol dictionary (symbol id -> symbol)
+# - `<build_id>/<field>.npy`: one array per field, rows of all days concatenated (CSR-style, see `offsets.npy`)
+# - `<build_id>/row_index.npy`: (days x symbols) row of each symbol on each day, -1 if it did not trade that day
+#
+# Builds are serialized (`lock_cache_entry(STORE_CACHE_KEY)`), and a build only removes builds older than the one it
+# replaces (build ids sort by build time), so readers still loading the previous build are not pulled from under.
+#
+
+GROUPED_AGGS_CACHE_PREFIX = "polygon/grouped_aggs/"
+STORE_CACHE_KEY = "polygon/grouped_aggs_store"
+
+FLOAT_FIELDS = ("o", "h", "l", "c", "vw")
+INT_FIELDS = ("v", "n")
+FIELDS = ("o", "h", "l", "c", "v", "n", "vw")
+
+
+def get_grouped_aggs_cache_key(day: date) -> str:
+    return f'{GROUPED_AGGS_CACHE_PREFIX}{day.strftime("%Y-%m-%d")}'
+
+
+def _get_build_dir(build_id: str) -> str:
+    return _get_cache_path(os.path.join(STORE_CACHE_KEY, build_id))
+
+
+def _get_manifest_key() -> str:
+    return os.path.join(STORE_CACHE_KEY, "manifest.json")
+
+
+def _get_entry_timestamp(day: date) -> Optional[float]:
+    try:
+        return get_entry_time(get_grouped_aggs_cache_key(day)).timestamp()
+    except OSError:
+        return None
+
+
+class GroupedAggsStore:
+    def __init__(self, build_id: str):
+        self.build_id = build_id
+        build_dir = _get_build_dir(build_id)
+
+        days_index = read_json_cache(os.path.join(
+            STORE_CACHE_KEY, build_id, "days.json"))
+        self.days: list[date] = [date.fromisoformat(
+            d) for d in days_index["days"]]
+        self.has_results: list[bool] = days_index["has_results"]
+        self.entry_times: list[Optional[float]] = days_index["entry_times"]
+        self.day_to_index = {day: i for i, day in enumerate(self.days)}
+
+        self.symbols: list[str] = read_json_cache(
+            os.path.join(STORE_CACHE_KEY, build_id, "symbols.json"))
+        self.symbol_to_id = {symbol: i for i,
+                             symbol in enumerate(self.symbols)}
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(build_dir, f"{name}.npy"), mmap_mode="r")
+
+        self.offsets = load("offsets")
+        self.symbol_ids = load("symbol_ids")
+        self.columns = {field: load(field) for field in FIELDS}
+        self.row_index = load("row_index")
+
+        # days whose JSON cache entry was checked against the store
+        self._is_fresh: dict[date, bool] = {}
+
+    def is_fresh(self, day: date) -> bool:
+        """
+        Whether the store has `day` and it was built from the JSON cache entry currently on disk.
+        (if the JSON entry was cleared or re-fetched since, the store must not answer for that day)
+        """
+        if day not in self._is_fresh:
+            index = self.day_to_index.get(day)
+            self._is_fresh[day] = index is not None and self.entry_times[index] is not None and \
+                self.entry_times[index] == _get_entry_timestamp(day)
+        return self._is_fresh[day]
+
+    def get_day_rows(self, day: date) -> Tuple[int, int]:
+        index = self.day_to_index[day]
+        return int(self.offsets[index]), int(self.offsets[index + 1])
+
+    def get_symbol_ids(self, symbols: list[str]) -> np.ndarray:
+        """Symbol ids of `symbols`, -1 for symbols never seen in the store."""
+        return np.array([self.symbol_to_id.get(s, -1) for s in symbols], dtype=np.int64)
+
+    def get_rows(self, day_indexes: np.ndarray, symbol_ids: np.ndarray) -> np.ndarray:
+        """
+        Rows of `symbol_ids` (axis 0) on each of `day_indexes` (axis 1), -1 where absent.
+        """
+        rows = np.full((len(symbol_ids), len(day_indexes)), -1, dtype=np.int64)
+        known = symbol_ids >= 0
+        if known.any() and len(day_indexes):
+            rows[known] = self.row_index[np.ix_(
+                day_indexes, symbol_ids[known])].T
+        return rows
+
+    def get_tickers(self, day: date) -> Optional[list[dict]]:
+        """
+        Returns tickers of `day` in the same shape as `Ticker`, in the order Polygon returned them.
+        If holiday, returns None.
+        """
+        index = self.day_to_index[day]
+        if not self.has_results[index]:
+            return None
+
+        start, end = self.get_day_rows(day)
+        symbols = self.symbols
+        columns = [self.columns[field][start:end].tolist()
+                   for field in FIELDS]
+        return [
+            {"T": symbols[symbol_id], "o": o, "h": h, "l": l,
+                "c": c, "v": v, "n": n, "vw": vw}
+            for symbol_id, o, h, l, c, v, n, vw in zip(self.symbol_ids[start:end].tolist(), *columns)
+        ]
+
+
+# (manifest's inode and mtime, build id, store)
+_loaded_store: Optional[Tuple[Tuple[int, int], str, GroupedAggsStore]] = None
+
+
+def get_store() -> Optional[GroupedAggsStore]:
+    """
+    Returns the current build of the store, or None if it was never built.
+    The store is loaded once per build (arrays are memory-mapped, so this is cheap), and the manifest is only read
+    again when it changed on disk.
+    """
+    global _loaded_store
+
+    try:
+        stat = os.stat(_get_cache_path(_get_manifest_key()))
+    except OSError:
+        return None
+    manifest_version = (stat.st_ino, stat.st_mtime_ns)
+    if _loaded_store and _loaded_store[0] == manifest_version:
+        return _loaded_store[2]
+
+    manifest = read_json_cache(_get_manifest_key())
+    if not manifest:
+        return None
+    build_id = manifest["build_id"]
+
+    if _loaded_store and _loaded_store[1] == build_id:
+        store = _loaded_store[2]
+        # (the manifest was rewritten, JSON entries may have been re-fetched since they were checked)
+        store._is_fresh = {}
+    else:
+        try:
+            store = GroupedAggsStore(build_id)
+        except Exception:
+            logging.exception(
+                f"could not load grouped aggs store {build_id}, falling back to JSON cache")
+            return None
+    _loaded_store = (manifest_version, build_id, store)
+    return store
+
+
+def _get_cached_days() -> list[date]:
+    try:
+        entries = get_matching_entries(GROUPED_AGGS_CACHE_PREFIX)
+    except FileNotFoundError:
+        return []
+    days = []
+    for entry in entries:
+        try:
+            days.append(datetime.strptime(
+                entry, f"{GROUPED_AGGS_CACHE_PREFIX}%Y-%m-%d").date())
+        except ValueError:
+            continue
+    return sorted(days)
+
+
+def _read_day_from_json_cache(day: date) -> Tuple[bool, list[dict]]:
+    cache = read_json_cache(get_grouped_aggs_cache_key(day))
+    if not cache or "results" not in cache:
+        return False, []
+    return True, cache["results"]
+
+
+def build_store(days: Optional[Iterable[date]] = None) -> Optional[GroupedAggsStore]:
+    """
+    Builds the columnar store from the JSON grouped aggs cache (all cached days by default).
+    Days that are unchanged since the previous build are copied over from it instead of re-parsing their JSON.
+    """
+    # (one build at a time across processes, e.g. the nightly cache build and a backtest preparing the cache)
+    with lock_cache_entry(STORE_CACHE_KEY):
+        return _build_store(days)
+
+
+def _build_store(days: Optional[Iterable[date]]) -> Optional[GroupedAggsStore]:
+    days = sorted(days) if days is not None else _get_cached_days()
+    if not days:
+        logging.info("grouped aggs cache is empty, not building store")
+        return None
+
+    previous_store = get_store()
+
+    symbols: list[str] = []
+    symbol_to_id: dict[str, int] = {}
+    has_results: list[bool] = []
+    entry_times: list[Optional[float]] = []
+    offsets = [0]
+    symbol_id_chunks: list[np.ndarray] = []
+    column_chunks: dict[str, list[np.ndarray]] = {
+        field: [] for field in FIELDS}
+
+    reused_days = 0
+    for day in days:
+        entry_time = _get_entry_timestamp(day)
+
+        if previous_store and previous_store.is_fresh(day):
+            reused_days += 1
+            day_has_results = previous_store.has_results[previous_store.day_to_index[day]]
+            start, end = previous_store.get_day_rows(day)
+            previous_symbol_ids = previous_store.symbol_ids[start:end].tolist()
+            day_symbols = [previous_store.symbols[i]
+                           for i in previous_symbol_ids]
+            for field in FIELDS:
+                column_chunks[field].append(
+                    np.array(previous_store.columns[field][start:end]))
+        else:
+            day_has_results, raw_tickers = _read_day_from_json_cache(day)
+            day_symbols = [t["T"] for t in raw_tickers]
+            for field in FLOAT_FIELDS:
+                column_chunks[field].append(np.array(
+                    [t.get(field, 0) for t in raw_tickers], dtype=np.float64))
+            for field in INT_FIELDS:
+                # NOTE: "v" is often a float in Polygon responses, truncate like `_build_ticker` does
+                column_chunks[field].append(np.array(
+                    [int(t.get(field, 0)) for t in raw_tickers], dtype=np.int64))
+
+        for symbol in day_symbols:
+            if symbol not in symbol_to_id:
+                symbol_to_id[symbol] = len(symbols)
+                symbols.append(symbol)
+        symbol_id_chunks.append(np.array(
+            [symbol_to_id[s] for s in day_symbols], dtype=np.int32))
+
+        has_results.append(day_has_results)
+        entry_times.append(entry_time)
+        offsets.append(offsets[-1] + len(day_symbols))
+
+    logging.info(
+        f"building grouped aggs store for {len(days)} days ({reused_days} reused from previous build), {offsets[-1]} rows")
+
+    # (microseconds, so builds sort by build time even when built within a second)
+    build_id = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+    build_dir = _get_build_dir(build_id)
+    os.makedirs(build_dir)
+
+    np.save(os.path.join(build_dir, "offsets.npy"),
+            np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(build_dir, "symbol_ids.npy"),
+            np.concatenate(symbol_id_chunks))
+    for field in FLOAT_FIELDS:
+        np.save(os.path.join(build_dir, f"{field}.npy"),
+                np.concatenate(column_chunks[field]).astype(np.float64))
+    for field in INT_FIELDS:
+        np.save(os.path.join(build_dir, f"{field}.npy"),
+                np.concatenate(column_chunks[field]).astype(np.int64))
+    np.save(os.path.join(build_dir, "row_index.npy"),
+            _build_row_index(np.array(offsets, dtype=np.int64), np.concatenate(symbol_id_chunks), len(symbols)))
+    write_json_cache(os.path.join(STORE_CACHE_KEY, build_id, "symbols.json"), symbols)
+    write_json_cache(os.path.join(STORE_CACHE_KEY, build_id, "days.json"), {
+        "days": [day.isoformat() for day in days],
+        "has_results": has_results,
+        "entry_times": entry_times,
+    })
+
+    # swap in new build atomically, readers either see the old or the new build
+    previous_manifest = read_json_cache(_get_manifest_key())
+    manifest_path = _get_cache_path(_get_manifest_key())
+    tmp_manifest_key = _get_manifest_key() + f".{build_id}.tmp"
+    write_json_cache(tmp_manifest_key, {"build_id": build_id})
+    os.replace(_get_cache_path(tmp_manifest_key), manifest_path)
+
+    if previous_manifest:
+        _remove_builds_older_than(previous_manifest["build_id"])
+
+    return get_store()
+
+
+def _build_row_index(offsets: np.ndarray, symbol_ids: np.ndarray, symbol_count: int) -> np.ndarray:
+    day_count = len(offsets) - 1
+    row_index = np.full((day_count, symbol_count), -1, dtype=np.int32)
+    day_of_row = np.repeat(np.arange(day_count), np.diff(offsets))
+    # (if a symbol shows up twice in a day, last one wins, same as `tickermap`)
+    row_index[day_of_row, symbol_ids] = np.arange(len(symbol_ids))
+    return row_index
+
+
+def _remove_builds_older_than(build_id: str) -> None:
+    # (on POSIX, processes still holding memory maps of an old build keep working after removal)
+    store_dir = _get_cache_path(STORE_CACHE_KEY)
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if name < build_id and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    build_store()
@@ -0,0 +1,170 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src.caching.basics import _get_cache_path, delete_json_cache, write_json_cache
+from src.data.polygon import grouped_aggs, grouped_aggs_store
+
+
+MONDAY = datetime.date(2022, 1, 3)
+TUESDAY = datetime.date(2022, 1, 4)
+WEDNESDAY = datetime.date(2022, 1, 5)
+
+
+def _build_stores(_i: int) -> bool:
+    for _ in range(3):
+        if grouped_aggs_store.build_store() is None:
+            return False
+    return True
+
+
+class GroupedAggsCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        cache_dir = self.tmp_dir.name
+        os.makedirs(os.path.join(cache_dir, "polygon", "grouped_aggs"))
+        self.patcher = mock.patch(
+            "src.caching.basics.get_paths", return_value={"data": {"cache": {"dir": cache_dir}}})
+        self.patcher.start()
+        grouped_aggs_store._loaded_store = None
+        grouped_aggs.get_today_grouped_aggs_from_cache_with_lru_cache.cache_clear()
+
+        write_json_cache(grouped_aggs_store.get_grouped_aggs_cache_key(MONDAY), {"status": "OK", "results": [
+            {"T": "AAPL", "o": 1.5, "h": 2.25, "l": 1, "c": 2, "v": 1000.0, "n": 10, "vw": 1.75, "t": 1},
+            {"T": "SPY", "o": 400, "h": 410, "l": 399, "c": 405.5, "v": 5000, "n": 50, "vw": 404},
+        ]})
+        write_json_cache(
+            grouped_aggs_store.get_grouped_aggs_cache_key(TUESDAY), {"status": "OK", "queryCount": 0})
+        write_json_cache(grouped_aggs_store.get_grouped_aggs_cache_key(WEDNESDAY), {"status": "OK", "results": [
+            {"T": "SPY", "o": 405, "h": 406, "l": 401, "c": 402, "v": 4000, "n": 40, "vw": 403},
+            {"T": "TSLA", "o": 900, "h": 950, "l": 890, "c": 940, "v": 3000, "n": 30},
+        ]})
+
+    def tearDown(self):
+        self.patcher.stop()
+        grouped_aggs_store._loaded_store = None
+        grouped_aggs.get_today_grouped_aggs_from_cache_with_lru_cache.cache_clear()
+        self.tmp_dir.cleanup()
+
+
+class TestGroupedAggsStore(GroupedAggsCacheTestCase):
+    def test_build_and_read(self):
+        store = grouped_aggs_store.build_store()
+        assert store
+
+        assert store.days == [MONDAY, TUESDAY, WEDNESDAY]
+        assert store.is_fresh(MONDAY)
+
+        self.assertEqual(store.get_tickers(MONDAY), [
+            {"T": "AAPL", "o": 1.5, "h": 2.25, "l": 1, "c": 2, "v": 1000, "n": 10, "vw": 1.75},
+            {"T": "SPY", "o": 400, "h": 410, "l": 399, "c": 405.5, "v": 5000, "n": 50, "vw": 404},
+        ])
+        assert store.get_tickers(TUESDAY) is None
+        self.assertEqual(store.get_tickers(WEDNESDAY)[1], {  # type: ignore
+            "T": "TSLA", "o": 900, "h": 950, "l": 890, "c": 940, "v": 3000, "n": 30, "vw": 0})
+
+        assert isinstance(store.get_tickers(MONDAY)[0]["v"], int)  # type: ignore
+
+    def test_stale_entries_are_not_served(self):
+        store = grouped_aggs_store.build_store()
+        assert store
+
+        delete_json_cache(grouped_aggs_store.get_grouped_aggs_cache_key(MONDAY))
+        grouped_aggs_store._loaded_store = None
+        store = grouped_aggs_store.get_store()
+        assert store
+
+        assert not store.is_fresh(MONDAY)
+        assert store.is_fresh(WEDNESDAY)
+
+    def test_manifest_read_only_when_changed(self):
+        store = grouped_aggs_store.build_store()
+        assert store
+        assert store.is_fresh(MONDAY)
+
+        with mock.patch.object(grouped_aggs_store, "read_json_cache") as read_json_cache:
+            assert grouped_aggs_store.get_store() is store
+            read_json_cache.assert_not_called()
+
+        # manifest rewritten with the same build: freshness is checked again
+        delete_json_cache(grouped_aggs_store.get_grouped_aggs_cache_key(MONDAY))
+        manifest_path = _get_cache_path(grouped_aggs_store._get_manifest_key())
+        stat = os.stat(manifest_path)
+        os.utime(manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert grouped_aggs_store.get_store() is store
+        assert not store.is_fresh(MONDAY)
+
+        rebuilt_store = grouped_aggs_store.build_store()
+        assert rebuilt_store and rebuilt_store is not store
+        assert grouped_aggs_store.get_store() is rebuilt_store
+
+    def test_rebuild_removes_builds_older_than_previous_one(self):
+        builds = [grouped_aggs_store.build_store() for _ in range(3)]
+        assert all(builds)
+
+        store_dir = _get_cache_path(grouped_aggs_store.STORE_CACHE_KEY)
+        self.assertEqual(sorted(name for name in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, name))), [
+                         b.build_id for b in builds[1:]])  # type: ignore
+
+    def test_overlapping_builds_keep_current_build(self):
+        with ProcessPoolExecutor(max_workers=3) as executor:
+            self.assertTrue(all(executor.map(_build_stores, range(3))))
+
+        grouped_aggs_store._loaded_store = None
+        store = grouped_aggs_store.get_store()
+        assert store
+        self.assertEqual(store.get_tickers(MONDAY)[0]["T"], "AAPL")  # type: ignore
+
+    def test_rebuild_reuses_previous_build(self):
+        first_store = grouped_aggs_store.build_store()
+        assert first_store
+        expected = first_store.get_tickers(WEDNESDAY)
+
+        with mock.patch.object(grouped_aggs_store, "_read_day_from_json_cache") as read_day:
+            second_store = grouped_aggs_store.build_store()
+            read_day.assert_not_called()
+
+        assert second_store
+        assert second_store.build_id != first_store.build_id
+        self.assertEqual(second_store.get_tickers(WEDNESDAY), expected)
+
+
+class TestLastNCandles(GroupedAggsCacheTestCase):
+    def test_batch_skips_holidays_and_masks_missing(self):
+        grouped_aggs_store.build_store()
+
+        candles, mask = grouped_aggs.get_last_n_candles_batch(
+            WEDNESDAY, ["SPY", "TSLA", "AAPL", "ZZZZ"], n=3)
+
+        self.assertEqual(candles.shape, (4, 3, len(grouped_aggs.CANDLE_FIELDS)))
+        # 2 days with results in cache, Tuesday is a holiday
+        self.assertEqual(mask.tolist(), [
+            [True, True, False],
+            [True, False, False],
+            [False, True, False],
+            [False, False, False],
+        ])
+        close = grouped_aggs.CANDLE_FIELDS.index("c")
+        self.assertEqual(candles[0, :2, close].tolist(), [402, 405.5])
+
+    def test_store_and_json_cache_agree(self):
+        from_json = grouped_aggs.get_last_n_candles(WEDNESDAY, "SPY", n=2)
+        from_json_batch = grouped_aggs.get_last_n_candles_batch(
+            WEDNESDAY, ["SPY", "AAPL"], n=2)
+
+        grouped_aggs_store.build_store()
+        grouped_aggs.get_today_grouped_aggs_from_cache_with_lru_cache.cache_clear()
+
+        self.assertEqual(grouped_aggs.get_last_n_candles(
+            WEDNESDAY, "SPY", n=2), from_json)
+        from_store_batch = grouped_aggs.get_last_n_candles_batch(
+            WEDNESDAY, ["SPY", "AAPL"], n=2)
+        np.testing.assert_array_equal(from_store_batch[0], from_json_batch[0])
+        np.testing.assert_array_equal(from_store_batch[1], from_json_batch[1])
+
+        assert grouped_aggs.get_last_n_candles(WEDNESDAY, "AAPL", n=2) is None
@@ -1,40 +1,54 @@
-from datetime import date, timedelta
+from datetime import date
 from functools import lru_cache
 import logging
 import os
-import random
 from typing import Iterable, Optional
 
-import requests
 from src.caching.basics import read_json_cache, write_json_cache
+from src.data.http_client import Provider
+from src.data.rate_limit import PRIORITIES, TokenBucket, get_token_bucket_path
 
-from src.trading_day import now, today, today_or_previous_trading_day
-from src.wait import wait_until
+from src.trading_day import today, today_or_previous_trading_day
 
 
 def get_polygon_api_key():
     return os.environ["POLYGON_API_KEY"]
 
 
-# TODO: refactor grouped_aggs to use these helpers
+def get_polygon_base_url():
+    # (overridable so we can point at a local stand-in)
+    return os.environ.get("POLYGON_BASE_URL", "https://api.polygon.io")
+
+
+def get_polygon_calls_per_minute() -> int:
+    # free tier is 5 requests / minute
+    return int(os.environ.get("POLYGON_CALLS_PER_MINUTE", "5"))
+
+
+def get_polygon_priority() -> int:
+    # live trading and recording run with "live", cache backfills with "backfill" (see run.sh)
+    # (run.sh passes it through to the container even when unset, as an empty value)
+    return PRIORITIES[os.environ.get("POLYGON_PRIORITY") or "default"]
+
+
+def get_polygon_token_bucket(path: Optional[str] = None, priority: Optional[int] = None) -> TokenBucket:
+    """
+    Rate limit shared by every process using the same Polygon API key, acquired with `priority` (the process' by
+    default). (no bursting: requests are spaced evenly, so no 60s window ever sees more than the plan limit)
+    """
+    calls_per_minute = get_polygon_calls_per_minute()
+    return TokenBucket(path or get_token_bucket_path("polygon"), capacity=1, rate=calls_per_minute / 60,
+                       priority=priority if priority is not None else get_polygon_priority())
+
+
+POLYGON = Provider("polygon")
+
+
 def _get_polygon(url: str, **kwargs):
-    while True:
-        response = requests.get(
-            url, **kwargs, headers={"Authorization": f"Bearer {get_polygon_api_key()}"})
-        if response.status_code == 429:
-            right_now = now()
-
-            target_time = right_now.replace(
-                # some jitter to resolve multi-process sharing/hogging of quota
-                second=random.randint(0, 10), microsecond=0) + timedelta(minutes=1)
-            logging.info(
-                f"Rate limit exceeded, {url.replace('https://api.polygon.io', '')}, waiting for {target_time - right_now}...")
-            wait_until(target_time)
-            continue
-
-        response.raise_for_status()
-
-        return response
+    response = POLYGON.get(
+        url, rate_limiter=get_polygon_token_bucket(), **kwargs, headers={"Authorization": f"Bearer {get_polygon_api_key()}"})
+    response.raise_for_status()
+    return response
 
 
 def _get_polygon_with_next_url_pagination(url: str, **initial_kwargs):
@@ -0,0 +1,95 @@
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+from typing import Optional
+
+
+class PolygonStandIn:
+    """
+    Local stand-in for the Polygon API, for tests.
+    Enforces a quota of `calls` requests per `period` seconds (sliding window) per API key, answering 429 when over it.
+    Serves grouped aggs (`/v2/aggs/grouped/locale/us/market/stocks/<day>`) with one made-up ticker per day.
+    """
+
+    def __init__(self, calls: int = 5, period: float = 60.):
+        self.calls = calls
+        self.period = period
+        self.lock = threading.Lock()
+        self.request_times: dict[str, collections.deque] = collections.defaultdict(
+            collections.deque)
+        self.responses: list[tuple[str, int]] = []  # (path, status)
+        self.forced_statuses: list[int] = []  # answered before anything else
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = stand_in._handle(self.path, self.headers.get(
+                    "Authorization", ""))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, status: int) -> int:
+        with self.lock:
+            return sum(1 for _, s in self.responses if s == status)
+
+    def _is_over_quota(self, api_key: str) -> bool:
+        right_now = time.monotonic()
+        times = self.request_times[api_key]
+        while times and right_now - times[0] >= self.period:
+            times.popleft()
+        if len(times) >= self.calls:
+            return True
+        times.append(right_now)
+        return False
+
+    def _handle(self, path: str, api_key: str) -> tuple[int, dict]:
+        with self.lock:
+            if self.forced_statuses:
+                status, body = self.forced_statuses.pop(0), {
+                    "status": "ERROR"}
+            elif self._is_over_quota(api_key):
+                status, body = 429, {
+                    "status": "ERROR", "error": "You've exceeded the maximum requests per minute"}
+            else:
+                status, body = self._route(path)
+            self.responses.append((path, status))
+        return status, body
+
+    def _route(self, path: str) -> tuple[int, dict]:
+        match = re.match(
+            r"^/v2/aggs/grouped/locale/us/market/stocks/(\d{4}-\d{2}-\d{2})", path)
+        if match:
+            day = match.group(1)
+            day_number = int(day.replace("-", "")) % 100
+            return 200, {"status": "OK", "queryCount": 1, "resultsCount": 1, "adjusted": True, "results": [
+                {"T": "AAPL", "o": 100 + day_number, "h": 110 + day_number, "l": 90 + day_number,
+                    "c": 105 + day_number, "v": 1000, "n": 10, "vw": 104 + day_number, "t": 0},
+            ]}
+        return 404, {"status": "NOT_FOUND"}
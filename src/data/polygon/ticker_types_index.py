@@ -0,0 +1,214 @@
+from datetime import date
+import logging
+import os
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from src.caching.basics import _get_cache_path, create_temp_file, get_matching_entries, read_json_cache
+from src.data.polygon.polygon import get_tickers_by_type
+from src.trading_day import today_or_previous_trading_day
+
+#
+# Index of Polygon ticker types (`polygon/ticker_details/<type>_<day>` cache entries) by day, so classifying the
+# tickers of a day is one lookup instead of a cache read (and dict lookup) per type per ticker.
+#
+# Each symbol's types are a bitmask (see `TICKER_TYPES`), stored as runs of days with the same mask
+# (symbols rarely change type, so a symbol takes a run or two across years of days):
+# - `days`: cached days, sorted (ISO), and `covered`: bitmask of the types cached (non-empty) on each day
+# - `symbols`: symbol dictionary (symbol id -> symbol)
+# - `run_symbol_ids`, `run_starts`, `run_ends`, `run_masks`: symbol, days [start, end) (indexes of `days`), mask
+#
+# Days or types not in the index (e.g. today's, before the index is rebuilt) are answered from the cache entries.
+#
+
+TICKER_DETAILS_CACHE_PREFIX = "polygon/ticker_details/"
+INDEX_CACHE_KEY = "polygon/ticker_types_index.npz"
+
+# types of `asset_class` predicates
+TICKER_TYPES = ("CS", "PFD", "ADRC", "ETF", "ETN", "WARRANT", "RIGHT", "UNIT")
+TYPE_BITS = {t: 1 << i for i, t in enumerate(TICKER_TYPES)}
+
+
+def get_types_mask(types: Iterable[str]) -> int:
+    mask = 0
+    for t in types:
+        mask |= TYPE_BITS[t]
+    return mask
+
+
+class TickerTypesIndex:
+    def __init__(self, arrays):
+        self.days = [date.fromisoformat(d) for d in arrays["days"].tolist()]
+        self.day_to_index = {day: i for i, day in enumerate(self.days)}
+        self.covered: list[int] = arrays["covered"].tolist()
+        self.symbols: list[str] = arrays["symbols"].tolist()
+        self.symbol_to_id = {symbol: i for i,
+                             symbol in enumerate(self.symbols)}
+        self.run_symbol_ids = arrays["run_symbol_ids"]
+        self.run_starts = arrays["run_starts"]
+        self.run_ends = arrays["run_ends"]
+        self.run_masks = arrays["run_masks"]
+
+        # (scanners classify the same day over and over)
+        self._last_day_masks: Optional[Tuple[int, np.ndarray]] = None
+
+    def get_day_masks(self, day: date) -> Tuple[Optional[np.ndarray], int]:
+        """
+        Masks of every symbol (by symbol id) on `day`, and the mask of types they cover.
+        (None, 0) if `day` is not in the index.
+        """
+        index = self.day_to_index.get(day)
+        if index is None:
+            return None, 0
+        if not self._last_day_masks or self._last_day_masks[0] != index:
+            masks = np.zeros(len(self.symbols), dtype=np.uint16)
+            active = (self.run_starts <= index) & (self.run_ends > index)
+            masks[self.run_symbol_ids[active]] = self.run_masks[active]
+            self._last_day_masks = (index, masks)
+        return self._last_day_masks[1], self.covered[index]
+
+    def get_symbol_ids(self, symbols: list[str]) -> np.ndarray:
+        """Symbol ids of `symbols`, -1 for symbols never seen in the index."""
+        return np.array([self.symbol_to_id.get(s, -1) for s in symbols], dtype=np.int64)
+
+
+_loaded_index: Optional[Tuple[float, TickerTypesIndex]] = None
+
+
+def get_index() -> Optional[TickerTypesIndex]:
+    """Returns the index, loaded again when rebuilt, or None if it was never built."""
+    global _loaded_index
+
+    path = _get_cache_path(INDEX_CACHE_KEY)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    if not _loaded_index or _loaded_index[0] != mtime:
+        try:
+            with np.load(path) as arrays:
+                _loaded_index = (mtime, TickerTypesIndex(arrays))
+        except Exception:
+            logging.exception(
+                "could not load ticker types index, falling back to JSON cache")
+            return None
+    return _loaded_index[1]
+
+
+def _get_cached_day_types() -> dict[date, list[str]]:
+    try:
+        entries = get_matching_entries(TICKER_DETAILS_CACHE_PREFIX)
+    except FileNotFoundError:
+        return {}
+    day_types: dict[date, list[str]] = {}
+    for entry in entries:
+        t, _, day = entry[len(TICKER_DETAILS_CACHE_PREFIX):].rpartition("_")
+        if t not in TYPE_BITS:
+            continue
+        try:
+            day_types.setdefault(date.fromisoformat(day), []).append(t)
+        except ValueError:
+            continue
+    return day_types
+
+
+def build_index() -> Optional[TickerTypesIndex]:
+    """Builds the index from every cached `polygon/ticker_details` entry."""
+    day_types = _get_cached_day_types()
+    if not day_types:
+        logging.info("ticker details cache is empty, not building index")
+        return None
+    days = sorted(day_types.keys())
+
+    symbols: list[str] = []
+    symbol_to_id: dict[str, int] = {}
+    covered = []
+    # symbol id -> index of its last run
+    last_runs: dict[int, int] = {}
+    run_symbol_ids: list[int] = []
+    run_starts: list[int] = []
+    run_ends: list[int] = []
+    run_masks: list[int] = []
+
+    for i, day in enumerate(days):
+        masks: dict[int, int] = {}
+        day_covered = 0
+        for t in day_types[day]:
+            tickers = read_json_cache(f"{TICKER_DETAILS_CACHE_PREFIX}{t}_{day}")
+            if not tickers:
+                # (empty entries are a miss of `get_tickers_by_type`, which fetches again: left to it)
+                continue
+            day_covered |= TYPE_BITS[t]
+            for ticker in tickers:
+                symbol = ticker["ticker"]
+                if symbol not in symbol_to_id:
+                    symbol_to_id[symbol] = len(symbols)
+                    symbols.append(symbol)
+                symbol_id = symbol_to_id[symbol]
+                masks[symbol_id] = masks.get(symbol_id, 0) | TYPE_BITS[t]
+        covered.append(day_covered)
+
+        for symbol_id, mask in masks.items():
+            run = last_runs.get(symbol_id)
+            if run is not None and run_ends[run] == i and run_masks[run] == mask:
+                run_ends[run] = i + 1
+                continue
+            last_runs[symbol_id] = len(run_symbol_ids)
+            run_symbol_ids.append(symbol_id)
+            run_starts.append(i)
+            run_ends.append(i + 1)
+            run_masks.append(mask)
+
+    logging.info(
+        f"building ticker types index for {len(days)} days, {len(symbols)} symbols, {len(run_symbol_ids)} runs")
+
+    path = _get_cache_path(INDEX_CACHE_KEY)
+    fd, tmp_path = create_temp_file(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                days=np.array([day.isoformat() for day in days]),
+                covered=np.array(covered, dtype=np.uint16),
+                symbols=np.array(symbols, dtype=str),
+                run_symbol_ids=np.array(run_symbol_ids, dtype=np.int32),
+                run_starts=np.array(run_starts, dtype=np.int32),
+                run_ends=np.array(run_ends, dtype=np.int32),
+                run_masks=np.array(run_masks, dtype=np.uint16),
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return get_index()
+
+
+def get_ticker_type_masks(symbols: list[str], day: date, types: Iterable[str] = TICKER_TYPES) -> np.ndarray:
+    """
+    Masks of the Polygon types of `symbols` on `day` (see `TYPE_BITS`), answering for (at least) `types`.
+    """
+    day = today_or_previous_trading_day(day)
+    masks = np.zeros(len(symbols), dtype=np.uint16)
+
+    covered = 0
+    index = get_index()
+    if index:
+        day_masks, covered = index.get_day_masks(day)
+        if day_masks is not None:
+            symbol_ids = index.get_symbol_ids(symbols)
+            known = symbol_ids >= 0
+            masks[known] = day_masks[symbol_ids[known]]
+
+    for t in types:
+        if covered & TYPE_BITS[t]:
+            continue
+        tickers = get_tickers_by_type(t, day)
+        masks[np.fromiter((s in tickers for s in symbols), dtype=bool, count=len(symbols))] |= TYPE_BITS[t]
+    return masks
+
+
+def main():
+    build_index()
@@ -0,0 +1,121 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.caching.basics import write_json_cache
+from src.data.polygon import asset_class, polygon, ticker_types_index
+from src.scan.utils.asset_class import enrich_tickers_with_asset_class
+
+MONDAY = datetime.date(2022, 1, 3)
+TUESDAY = datetime.date(2022, 1, 4)
+WEDNESDAY = datetime.date(2022, 1, 5)
+THURSDAY = datetime.date(2022, 1, 6)
+
+TICKER_DETAILS = {
+    ("CS", MONDAY): ["AAPL", "SPAC"],
+    ("CS", TUESDAY): ["AAPL", "SPAC"],
+    ("CS", WEDNESDAY): ["AAPL"],
+    ("ETF", MONDAY): ["SPY"],
+    ("ETF", TUESDAY): ["SPY"],
+    ("ETF", WEDNESDAY): ["SPY"],
+    ("UNIT", WEDNESDAY): ["SPAC"],
+    ("WARRANT", MONDAY): ["SPACW"],
+    ("WARRANT", WEDNESDAY): ["SPACW"],
+}
+# every type is cached on those days (an empty entry is not a cache hit of `get_tickers_by_type`)
+for day in [MONDAY, TUESDAY, WEDNESDAY]:
+    for t in ticker_types_index.TICKER_TYPES:
+        TICKER_DETAILS.setdefault((t, day), [f"ZZ{t}"])
+
+
+class TestTickerTypesIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        cache_dir = self.tmp_dir.name
+        os.makedirs(os.path.join(cache_dir, "polygon", "ticker_details"))
+        self.patcher = mock.patch(
+            "src.caching.basics.get_paths", return_value={"data": {"cache": {"dir": cache_dir}}})
+        self.patcher.start()
+        ticker_types_index._loaded_index = None
+        polygon.get_tickers_by_type.cache_clear()
+
+        for (t, day), symbols in TICKER_DETAILS.items():
+            write_json_cache(f"polygon/ticker_details/{t}_{day}", [
+                {"ticker": symbol, "type": t} for symbol in symbols])
+
+    def tearDown(self):
+        self.patcher.stop()
+        ticker_types_index._loaded_index = None
+        polygon.get_tickers_by_type.cache_clear()
+        self.tmp_dir.cleanup()
+
+    def test_builds_runs(self):
+        index = ticker_types_index.build_index()
+        assert index is not None
+
+        runs = {}
+        for symbol_id, start, end, mask in zip(index.run_symbol_ids.tolist(), index.run_starts.tolist(), index.run_ends.tolist(), index.run_masks.tolist()):
+            if not index.symbols[symbol_id].startswith("ZZ"):
+                runs.setdefault(index.symbols[symbol_id], []).append(
+                    (start, end, mask))
+        cs, unit, etf, warrant = [ticker_types_index.TYPE_BITS[t]
+                                  for t in ["CS", "UNIT", "ETF", "WARRANT"]]
+        self.assertEqual(runs, {
+            "AAPL": [(0, 3, cs)],
+            "SPAC": [(0, 2, cs), (2, 3, unit)],
+            "SPY": [(0, 3, etf)],
+            "SPACW": [(0, 1, warrant), (2, 3, warrant)],
+        })
+
+    def test_matches_per_ticker_lookups(self):
+        ticker_types_index.build_index()
+        classes = {
+            "is_stock": asset_class.is_stock,
+            "is_etf": asset_class.is_etf,
+            "is_warrant": asset_class.is_warrant,
+            "is_unit": asset_class.is_unit,
+            "is_spac_format": lambda symbol, day: symbol.startswith("SPAC"),
+        }
+        symbols = ["AAPL", "SPAC", "SPY", "SPACW", "NOPE"]
+
+        for day in [MONDAY, TUESDAY, WEDNESDAY]:
+            with mock.patch.object(polygon, "_get_tickers_by_type_raw", side_effect=AssertionError("not cached")):
+                tickers = list(enrich_tickers_with_asset_class(
+                    day, [{"T": symbol} for symbol in symbols], classes))
+            expected = []
+            for symbol in symbols:
+                values = {name: is_asset_class(symbol, day=day)
+                          for name, is_asset_class in classes.items()}
+                if any(values.values()):
+                    expected.append({"T": symbol, **values})
+            self.assertEqual(tickers, expected)
+
+    def test_falls_back_to_cache_entries(self):
+        ticker_types_index.build_index()
+        write_json_cache(f"polygon/ticker_details/CS_{THURSDAY}", [
+                         {"ticker": "TSLA", "type": "CS"}])
+
+        with mock.patch.object(polygon, "_get_tickers_by_type_raw", return_value=[]) as fetch:
+            masks = ticker_types_index.get_ticker_type_masks(
+                ["AAPL", "TSLA"], THURSDAY, asset_class.STOCK_TYPES)
+        self.assertEqual(masks.tolist(), [0, ticker_types_index.TYPE_BITS["CS"]])
+        # PFD and ADRC of Thursday are not cached
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_empty_entries_are_not_covered(self):
+        write_json_cache(f"polygon/ticker_details/PFD_{MONDAY}", [])
+        index = ticker_types_index.build_index()
+        assert index is not None
+        _masks, covered = index.get_day_masks(MONDAY)
+        self.assertFalse(covered & ticker_types_index.TYPE_BITS["PFD"])
+        self.assertTrue(covered & ticker_types_index.TYPE_BITS["CS"])
+
+        # like `is_ticker_type`, fetched again
+        with mock.patch.object(polygon, "_get_tickers_by_type_raw", return_value=[{"ticker": "AAPL", "type": "PFD"}]) as fetch:
+            masks = ticker_types_index.get_ticker_type_masks(
+                ["AAPL", "SPY"], MONDAY, ["CS", "PFD"])
+        fetch.assert_called_once_with("PFD", MONDAY)
+        self.assertEqual(masks.tolist(), [
+                         ticker_types_index.TYPE_BITS["CS"] | ticker_types_index.TYPE_BITS["PFD"], ticker_types_index.TYPE_BITS["ETF"]])
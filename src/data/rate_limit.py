@@ -0,0 +1,117 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from src.outputs.pathing import get_paths
+
+#
+# Rate limits shared between processes (e.g. cron jobs and the chronicle recorder using one API key).
+#
+# Requests have a priority: while a request of a higher priority is waiting for a token, lower priority ones do
+# not take tokens, so live paths are served first and backfills get what is left. Waiting requests are registered
+# in the bucket's file, and the registration expires if not renewed (so a killed process does not block others).
+#
+
+# priorities, highest first
+LIVE = 0
+DEFAULT = 1
+BACKFILL = 2
+PRIORITIES = {"live": LIVE, "default": DEFAULT, "backfill": BACKFILL}
+
+# how long a waiting request keeps its place after it was expected to try again
+WAITER_TTL = 2.
+
+
+def get_token_bucket_path(name: str) -> str:
+    locks_dir = get_paths()["data"]["locks"]["dir"]
+    os.makedirs(locks_dir, exist_ok=True)
+    return os.path.join(locks_dir, f"{name}.bucket.json")
+
+
+class TokenBucket:
+    """
+    Token bucket whose state lives in a file, so every process using the same file shares one quota.
+    Holds up to `capacity` tokens, refilled at `rate` tokens per second, acquired with `priority`.
+    """
+
+    def __init__(self, path: str, capacity: float, rate: float, priority: int = DEFAULT):
+        self.path = path
+        self.capacity = capacity
+        self.rate = rate
+        self.priority = priority
+
+    def with_priority(self, priority: int) -> "TokenBucket":
+        """Same bucket, acquired with `priority`."""
+        return TokenBucket(self.path, self.capacity, self.rate, priority)
+
+    def _update(self, take: float = 0, drain: bool = False) -> float:
+        """
+        Refills bucket, then takes `take` tokens if available and no request of a higher priority is waiting.
+        Returns 0 if tokens were taken, else seconds until trying again.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), "r+") as f:
+                raw = f.read()
+                right_now = time.time()
+                try:
+                    state = json.loads(raw)
+                except ValueError:
+                    state = {"tokens": self.capacity, "updated_at": right_now}
+
+                elapsed = max(0., right_now - state["updated_at"])
+                tokens = min(self.capacity,
+                             state["tokens"] + elapsed * self.rate)
+                # waiter -> (priority, expires at)
+                waiting = {waiter: (priority, expires_at) for waiter, (priority, expires_at) in state.get(
+                    "waiting", {}).items() if expires_at > right_now}
+                waiter = f"{os.getpid()}-{threading.get_ident()}"
+
+                wait = 0.
+                if drain:
+                    tokens = 0.
+                elif take:
+                    is_preempted = any(priority < self.priority for other, (priority, _) in waiting.items()
+                                       if other != waiter)
+                    if not is_preempted and tokens >= take:
+                        tokens -= take
+                        waiting.pop(waiter, None)
+                    else:
+                        # (when preempted, tries again after the next token, which the other request should take)
+                        wait = max(take - tokens, 1 if is_preempted else 0) / self.rate
+                        waiting[waiter] = (
+                            self.priority, right_now + wait + WAITER_TTL)
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(
+                    {"tokens": tokens, "updated_at": right_now, "waiting": waiting}))
+            return wait
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Returns 0 if acquired, else seconds to wait before trying again."""
+        return self._update(take=tokens)
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            logging.debug(
+                f"waiting {wait:.2f}s for rate limit token ({os.path.basename(self.path)}, priority {self.priority})")
+            time.sleep(wait)
+
+    def drain(self) -> None:
+        """Empties the bucket, e.g. when the server says we are over quota (429)."""
+        self._update(drain=True)
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.data import rate_limit
+from src.data.polygon import polygon
+from src.data.rate_limit import BACKFILL, LIVE, TokenBucket
+
+RATE = 20.  # tokens per second
+
+
+class TestTokenBucketPriorities(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        bucket = TokenBucket(os.path.join(
+            self.tmp_dir.name, "test.bucket.json"), capacity=1, rate=RATE)
+        self.live = bucket.with_priority(LIVE)
+        self.backfill = bucket.with_priority(BACKFILL)
+        # (waiters are per thread)
+        self.live_thread = ThreadPoolExecutor(max_workers=1)
+        self.backfill_thread = ThreadPoolExecutor(max_workers=1)
+        bucket.drain()
+
+    def tearDown(self):
+        self.live_thread.shutdown()
+        self.backfill_thread.shutdown()
+        self.tmp_dir.cleanup()
+
+    def try_live(self) -> float:
+        return self.live_thread.submit(self.live.try_acquire).result()
+
+    def try_backfill(self) -> float:
+        return self.backfill_thread.submit(self.backfill.try_acquire).result()
+
+    def test_waiting_live_request_preempts_backfill(self):
+        self.assertGreater(self.try_live(), 0)
+        time.sleep(1.5 / RATE)
+
+        # a token is available, but kept for the waiting live request
+        self.assertGreater(self.try_backfill(), 0)
+        self.assertEqual(self.try_live(), 0)
+
+        time.sleep(1.5 / RATE)
+        self.assertEqual(self.try_backfill(), 0)
+
+    def test_abandoned_wait_expires(self):
+        with mock.patch.object(rate_limit, "WAITER_TTL", 0.):
+            self.assertGreater(self.try_live(), 0)
+        time.sleep(1.5 / RATE)
+        self.assertEqual(self.try_backfill(), 0)
+
+
+class TestPolygonPriority(unittest.TestCase):
+    def test_empty_priority_is_default(self):
+        for value, priority in [("live", LIVE), ("backfill", BACKFILL), ("", rate_limit.DEFAULT)]:
+            with mock.patch.dict(os.environ, {"POLYGON_PRIORITY": value}):
+                self.assertEqual(polygon.get_polygon_priority(), priority)
@@ -3,15 +3,19 @@ import json
 import logging
 import os
 from pprint import pprint
-from time import sleep
 from typing import Optional
 import requests
 from src.caching.basics import get_matching_entries, read_json_cache, write_json_cache
+from src.data.http_client import build_limited_provider, map_concurrently
 
 from src.outputs.pathing import get_paths
 from src.trading_day import today
 
 
+# TD allows 120 requests / minute
+TD = build_limited_provider("td", 120)
+
+
 def _get_consumer_key():
     return os.environ['TD_CONSUMER_KEY']
 
@@ -44,12 +48,7 @@ def _get_data(url: str, **kwargs):
             "Authorization": f"Bearer {access_token}",
         })
         kwargs['headers'] = headers
-        response = requests.get(
-            "https://api.tdameritrade.com" + url, **kwargs)
-        if response.status_code == 429:
-            logging.info("Rate limited, waiting...")
-            sleep(5)
-            return _get_data(url, **kwargs)
+        response = TD.get("https://api.tdameritrade.com" + url, **kwargs)
         _log_response(response)
         response.raise_for_status()
     except:
@@ -60,12 +59,7 @@ def _get_data(url: str, **kwargs):
             "apikey": _get_consumer_key(),
         })
         kwargs['params'] = params
-        response = requests.get(
-            "https://api.tdameritrade.com" + url, **kwargs)
-        if response.status_code == 429:
-            logging.info("Rate limited, waiting...")
-            sleep(5)
-            return _get_data(url, **kwargs)
+        response = TD.get("https://api.tdameritrade.com" + url, **kwargs)
         _log_response(response)
         response.raise_for_status()
 
@@ -196,11 +190,11 @@ def get_fundamentals(symbols: list[str], day: Optional[date] = None) -> dict:
         else:
             symbols_to_fetch.append(symbol)
 
-    # Fetch in chunks
+    # Fetch in chunks, concurrently
     chunks = [symbols_to_fetch[x:x+100]
               for x in range(0, len(symbols_to_fetch), 100)]
-    for chunk in chunks:
-        fundamentals.update(_get_fundamentals(chunk))
+    for fetched in map_concurrently(_get_fundamentals, chunks, concurrency=4):
+        fundamentals.update(fetched)
 
     # Write cache
     for symbol, data in fundamentals.items():
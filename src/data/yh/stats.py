@@ -2,11 +2,15 @@ from datetime import date, timedelta
 import logging
 import os
 from typing import Optional, cast
-import requests
-from src.caching.basics import get_matching_entries, read_json_cache, write_json_cache
+from src.caching.basics import get_matching_entries, lock_cache_entry, read_json_cache, write_json_cache
+from src.data.http_client import build_limited_provider
 from src.trading_day import get_last_market_close, now
 
 
+# (rapidapi basic plans allow 5 requests / second)
+YH = build_limited_provider("yh", 300)
+
+
 def _get_headers():
     return {
         'x-rapidapi-host': "yh-finance.p.rapidapi.com",
@@ -15,7 +19,7 @@ def _get_headers():
 
 
 def _fetch_stats(symbol: str):
-    response = requests.get("https://yh-finance.p.rapidapi.com/stock/v3/get-statistics", headers=_get_headers(), params={
+    response = YH.get("https://yh-finance.p.rapidapi.com/stock/v3/get-statistics", headers=_get_headers(), params={
         "symbol": symbol,
     })
     response.raise_for_status()
@@ -46,11 +50,17 @@ def _get_stats(symbol: str):
         if cached:
             return cached
 
-    logging.info(f"fetching stats for {symbol}")
-    data = _fetch_stats(symbol)
+    with lock_cache_entry(cache_key):
+        # another process may have fetched it while we waited
+        cached = read_json_cache(cache_key)
+        if cached:
+            return cached
 
-    if should_cache:
-        write_json_cache(cache_key, data)
+        logging.info(f"fetching stats for {symbol}")
+        data = _fetch_stats(symbol)
+
+        if should_cache:
+            write_json_cache(cache_key, data)
 
     return data
 
@@ -0,0 +1,380 @@
+import collections
+import math
+from typing import Deque, Optional
+
+#
+# Streaming technical indicators: state is seeded once from history, then each new candle is an O(1) update
+# (amortized; CCI's mean deviation is O(window)), instead of recomputing whole series every minute.
+#
+# Values match the `ta` library (same warmup, same quirks), except `WindowedRSI`/`WilliamsR` which match `pandas_ta`
+# as called by minion. Undefined values (warmup) are NaN, like in `ta`.
+#
+
+NAN = float("nan")
+
+
+class RunningSum:
+    """
+    Sum of a sliding window of non-negative values (optionally decaying: existing terms are multiplied by `decay`
+    on each add). Is exactly 0 when every value in the window is 0, despite floating point residue.
+    """
+
+    def __init__(self, decay: float = 1.):
+        self.decay = decay
+        self.total = 0.
+        self.nonzero = 0
+
+    def add(self, x: float) -> None:
+        self.total = self.decay * self.total + x
+        self.nonzero += x != 0
+
+    def remove(self, x: float, weight: float = 1.) -> None:
+        self.total -= weight * x
+        self.nonzero -= x != 0
+        if not self.nonzero:
+            self.total = 0.
+
+    @property
+    def value(self) -> float:
+        return max(self.total, 0.)
+
+
+class EMA:
+    """`ta.trend.EMAIndicator` (pandas `ewm(span=window, adjust=False)`, NaN for the first window - 1 values)"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.alpha = 2 / (window + 1)
+        self.count = 0
+        self.ema = NAN
+
+    def update(self, x: float) -> float:
+        self.ema = x if self.count == 0 else self.alpha * \
+            x + (1 - self.alpha) * self.ema
+        self.count += 1
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self.ema if self.count >= self.window else NAN
+
+
+class MACD:
+    """`ta.trend.MACD`"""
+
+    def __init__(self, window_fast: int = 12, window_slow: int = 26, window_sign: int = 9):
+        self.fast = EMA(window_fast)
+        self.slow = EMA(window_slow)
+        self.signal_ema = EMA(window_sign)
+
+    def update(self, close: float) -> None:
+        self.fast.update(close)
+        self.slow.update(close)
+        # signal line starts at the first defined MACD value
+        if not math.isnan(self.macd):
+            self.signal_ema.update(self.macd)
+
+    @property
+    def macd(self) -> float:
+        return self.fast.value - self.slow.value
+
+    @property
+    def signal(self) -> float:
+        return self.signal_ema.value
+
+
+class RollingExtremes:
+    """Max and min of the last `window` values (monotonic deques)."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.count = 0
+        self.maxes: Deque[tuple[int, float]] = collections.deque()
+        self.mins: Deque[tuple[int, float]] = collections.deque()
+
+    def update(self, high: float, low: float) -> None:
+        i = self.count
+        self.count += 1
+        while self.maxes and self.maxes[-1][1] <= high:
+            self.maxes.pop()
+        self.maxes.append((i, high))
+        while self.mins and self.mins[-1][1] >= low:
+            self.mins.pop()
+        self.mins.append((i, low))
+        while self.maxes[0][0] <= i - self.window:
+            self.maxes.popleft()
+        while self.mins[0][0] <= i - self.window:
+            self.mins.popleft()
+
+    @property
+    def max(self) -> float:
+        return self.maxes[0][1] if self.count >= self.window else NAN
+
+    @property
+    def min(self) -> float:
+        return self.mins[0][1] if self.count >= self.window else NAN
+
+
+class WilliamsR:
+    """`ta.momentum.WilliamsRIndicator` / `pandas_ta.willr`"""
+
+    def __init__(self, window: int = 14):
+        self.extremes = RollingExtremes(window)
+        self.close = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.extremes.update(high, low)
+        self.close = close
+        return self.value
+
+    @property
+    def value(self) -> float:
+        highest_high, lowest_low = self.extremes.max, self.extremes.min
+        if math.isnan(highest_high):
+            return NAN
+        if highest_high == lowest_low:
+            return NAN
+        return -100 * (highest_high - self.close) / (highest_high - lowest_low)
+
+
+class WindowedRSI:
+    """
+    `pandas_ta.rsi` computed over only the last `window` + 1 closes (as minion does): average gains and losses are
+    exponentially weighted (alpha = 1 / window, pandas `adjust=True`) over the last `window` changes.
+    """
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.decay = 1 - 1 / window
+        self.dropped_weight = self.decay ** window
+        self.changes: Deque[float] = collections.deque()
+        self.previous_close: Optional[float] = None
+        # weighted sums over the window
+        self.gains = RunningSum(decay=self.decay)
+        self.losses = RunningSum(decay=self.decay)
+
+    def update(self, close: float) -> float:
+        if self.previous_close is not None:
+            change = close - self.previous_close
+            self.gains.add(max(change, 0.))
+            self.losses.add(max(-change, 0.))
+            self.changes.append(change)
+            if len(self.changes) > self.window:
+                dropped = self.changes.popleft()
+                self.gains.remove(max(dropped, 0.), weight=self.dropped_weight)
+                self.losses.remove(max(-dropped, 0.), weight=self.dropped_weight)
+        self.previous_close = close
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if len(self.changes) < self.window:
+            return NAN
+        gains, losses = self.gains.value, self.losses.value
+        if gains + losses == 0:
+            return NAN
+        return 100 * gains / (gains + losses)
+
+
+class CCI:
+    """`ta.trend.CCIIndicator`"""
+
+    def __init__(self, window: int = 20, constant: float = 0.015):
+        self.window = window
+        self.constant = constant
+        self.typical_prices: Deque[float] = collections.deque(maxlen=window)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.typical_prices.append((high + low + close) / 3.0)
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if len(self.typical_prices) < self.window:
+            return NAN
+        # (mean deviation needs a pass over the window anyway, so no running sum for the mean)
+        mean = sum(self.typical_prices) / self.window
+        mean_deviation = sum(abs(tp - mean)
+                             for tp in self.typical_prices) / self.window
+        if mean_deviation == 0:
+            return NAN
+        return (self.typical_prices[-1] - mean) / (self.constant * mean_deviation)
+
+
+class MFI:
+    """`ta.volume.MFIIndicator`"""
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.flows: Deque[float] = collections.deque()
+        self.previous_typical_price: Optional[float] = None
+        self.positive = RunningSum()
+        self.negative = RunningSum()
+
+    def update(self, high: float, low: float, close: float, volume: float) -> float:
+        typical_price = (high + low + close) / 3.0
+        flow = 0.
+        if self.previous_typical_price is not None:
+            if typical_price > self.previous_typical_price:
+                flow = typical_price * volume
+            elif typical_price < self.previous_typical_price:
+                flow = -typical_price * volume
+        self.previous_typical_price = typical_price
+
+        self.positive.add(max(flow, 0.))
+        self.negative.add(max(-flow, 0.))
+        self.flows.append(flow)
+        if len(self.flows) > self.window:
+            dropped = self.flows.popleft()
+            self.positive.remove(max(dropped, 0.))
+            self.negative.remove(max(-dropped, 0.))
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if len(self.flows) < self.window:
+            return NAN
+        positive, negative = self.positive.value, self.negative.value
+        if negative == 0:
+            return NAN if positive == 0 else 100.
+        return 100 - 100 / (1 + positive / negative)
+
+
+class PSAR:
+    """`ta.trend.PSARIndicator`"""
+
+    def __init__(self, step: float = 0.02, max_step: float = 0.20):
+        self.step = step
+        self.max_step = max_step
+        self.count = 0
+        self.up_trend = True
+        self.acceleration_factor = step
+        self.up_trend_high = NAN
+        self.down_trend_low = NAN
+        self.psar = NAN
+        self.highs: Deque[float] = collections.deque(maxlen=2)
+        self.lows: Deque[float] = collections.deque(maxlen=2)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.count == 0:
+            self.up_trend_high = high
+            self.down_trend_low = low
+
+        if self.count < 2:
+            # first values are the close
+            self.psar = close
+        elif self.up_trend:
+            psar = self.psar + self.acceleration_factor * \
+                (self.up_trend_high - self.psar)
+            if low < psar:
+                self.up_trend = False
+                psar = self.up_trend_high
+                self.down_trend_low = low
+                self.acceleration_factor = self.step
+            else:
+                if high > self.up_trend_high:
+                    self.up_trend_high = high
+                    self.acceleration_factor = min(
+                        self.acceleration_factor + self.step, self.max_step)
+                low1, low2 = self.lows[-1], self.lows[-2]
+                if low2 < psar:
+                    psar = low2
+                elif low1 < psar:
+                    psar = low1
+            self.psar = psar
+        else:
+            psar = self.psar - self.acceleration_factor * \
+                (self.psar - self.down_trend_low)
+            if high > psar:
+                self.up_trend = True
+                psar = self.down_trend_low
+                self.up_trend_high = high
+                self.acceleration_factor = self.step
+            else:
+                if low < self.down_trend_low:
+                    self.down_trend_low = low
+                    self.acceleration_factor = min(
+                        self.acceleration_factor + self.step, self.max_step)
+                high1, high2 = self.highs[-1], self.highs[-2]
+                if high2 > psar:
+                    psar = high2
+                elif high1 > psar:
+                    psar = high1
+            self.psar = psar
+
+        self.highs.append(high)
+        self.lows.append(low)
+        self.count += 1
+        return self.psar
+
+    @property
+    def value(self) -> float:
+        return self.psar
+
+
+class ADX:
+    """
+    `ta.trend.ADXIndicator` with `fillna=True` (0 during warmup).
+    Directional indicators (+DI/-DI) start one candle after the window, like `ta`.
+    """
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.count = 0
+        self.previous: Optional[tuple[float, float, float]] = None  # high, low, close
+
+        # Wilder-smoothed sums of true range and directional movements
+        self.true_range = 0.
+        self.plus_dm = 0.
+        self.minus_dm = 0.
+
+        self.dx_sum = 0.  # to seed ADX with the mean of the first DXs
+        self.adx = 0.
+        self.di_plus = 0.
+        self.di_minus = 0.
+
+    def update(self, high: float, low: float, close: float) -> float:
+        i = self.count
+        self.count += 1
+        if self.previous is None:
+            self.previous = (high, low, close)
+            return self.adx
+
+        previous_high, previous_low, previous_close = self.previous
+        self.previous = (high, low, close)
+
+        true_range = max(high, previous_close) - min(low, previous_close)
+        up, down = high - previous_high, previous_low - low
+        plus_dm = up if up > down and up > 0 else 0.
+        minus_dm = down if down > up and down > 0 else 0.
+
+        w = self.window
+        if i <= w:
+            self.true_range += true_range
+            self.plus_dm += plus_dm
+            self.minus_dm += minus_dm
+        else:
+            self.true_range += true_range - self.true_range / w
+            self.plus_dm += plus_dm - self.plus_dm / w
+            self.minus_dm += minus_dm - self.minus_dm / w
+        if i < w:
+            return self.adx
+
+        di_plus = 100 * self.plus_dm / self.true_range if self.true_range != 0 else 0.
+        di_minus = 100 * self.minus_dm / self.true_range if self.true_range != 0 else 0.
+        dx = 100 * abs((di_plus - di_minus) / (di_plus + di_minus)
+                       ) if di_plus + di_minus != 0 else 0.
+        if i > w:
+            self.di_plus, self.di_minus = di_plus, di_minus
+
+        if i < 2 * w - 1:
+            self.dx_sum += dx
+        elif i == 2 * w - 1:
+            self.adx = (self.dx_sum + dx) / w
+        else:
+            self.adx = (self.adx * (w - 1) + dx) / w
+        return self.adx
+
+    @property
+    def value(self) -> float:
+        return self.adx
@@ -0,0 +1,97 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import ta
+
+from src.indicators import streaming
+
+N = 400
+
+
+def random_candles(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0, 1, N))
+    opens = np.concatenate([[100], closes[:-1]])
+    highs = np.maximum(opens, closes) + rng.uniform(0, 1, N)
+    lows = np.minimum(opens, closes) - rng.uniform(0, 1, N)
+    volumes = rng.integers(100, 10000, N).astype(float)
+    # flat stretch, to hit zero-division edge cases
+    closes[200:230] = opens[200:230] = highs[200:230] = lows[200:230] = 100.
+    return pd.DataFrame({"high": highs, "low": lows, "close": closes, "volume": volumes})
+
+
+class TestStreamingIndicators(unittest.TestCase):
+    def setUp(self):
+        self.df = random_candles()
+        self.highs, self.lows, self.closes, self.volumes = (
+            self.df[c] for c in ("high", "low", "close", "volume"))
+
+    def stream(self, indicator, fields, value=lambda i: i.value):
+        values = []
+        for row in self.df[fields].itertuples(index=False):
+            indicator.update(*row)
+            values.append(value(indicator))
+        return np.array(values)
+
+    def assertSeriesClose(self, actual, expected):
+        np.testing.assert_allclose(
+            actual, np.asarray(expected, dtype=float), rtol=1e-7, atol=1e-7, equal_nan=True)
+
+    def test_ema(self):
+        self.assertSeriesClose(self.stream(streaming.EMA(20), ["close"]),
+                               ta.trend.EMAIndicator(self.closes, window=20).ema_indicator())
+
+    def test_macd(self):
+        expected = ta.trend.MACD(
+            self.closes, window_slow=26, window_fast=12, window_sign=9)
+        self.assertSeriesClose(self.stream(streaming.MACD(12, 26, 9), ["close"], lambda i: i.macd),
+                               expected.macd())
+        self.assertSeriesClose(self.stream(streaming.MACD(12, 26, 9), ["close"], lambda i: i.signal),
+                               expected.macd_signal())
+
+    def test_cci(self):
+        self.assertSeriesClose(self.stream(streaming.CCI(20, 0.015), ["high", "low", "close"]),
+                               ta.trend.CCIIndicator(self.highs, self.lows, self.closes, window=20, constant=0.015).cci())
+
+    def test_psar(self):
+        self.assertSeriesClose(self.stream(streaming.PSAR(0.021, 0.2), ["high", "low", "close"]),
+                               ta.trend.PSARIndicator(self.highs, self.lows, self.closes, step=0.021, max_step=0.2).psar())
+
+    def test_mfi(self):
+        self.assertSeriesClose(self.stream(streaming.MFI(14), ["high", "low", "close", "volume"]),
+                               ta.volume.MFIIndicator(self.highs, self.lows, self.closes, self.volumes, window=14).money_flow_index())
+
+    def test_adx(self):
+        expected = ta.trend.ADXIndicator(
+            self.highs, self.lows, self.closes, window=14, fillna=True)
+        fields = ["high", "low", "close"]
+        with np.errstate(invalid="ignore"):
+            self.assertSeriesClose(self.stream(
+                streaming.ADX(14), fields), expected.adx())
+        self.assertSeriesClose(self.stream(streaming.ADX(14), fields, lambda i: i.di_plus),
+                               expected.adx_pos())
+        self.assertSeriesClose(self.stream(streaming.ADX(14), fields, lambda i: i.di_minus),
+                               expected.adx_neg())
+
+    def test_williamsr(self):
+        self.assertSeriesClose(self.stream(streaming.WilliamsR(20), ["high", "low", "close"]),
+                               ta.momentum.WilliamsRIndicator(self.highs, self.lows, self.closes, lbp=20).williams_r())
+
+    def test_windowed_rsi(self):
+        window = 14
+
+        def pandas_ta_rsi(closes: pd.Series) -> float:
+            # what `pandas_ta.rsi(closes, length=window)` computes
+            change = closes.diff()
+            alpha = 1 / window
+            gains = change.clip(lower=0).ewm(
+                alpha=alpha, min_periods=window).mean()
+            losses = change.clip(upper=0).abs().ewm(
+                alpha=alpha, min_periods=window).mean()
+            return (100 * gains / (gains + losses)).values[-1]
+
+        expected = [pandas_ta_rsi(self.closes[max(0, i - window):i + 1])
+                    for i in range(N)]
+        self.assertSeriesClose(self.stream(
+            streaming.WindowedRSI(window), ["close"]), expected)
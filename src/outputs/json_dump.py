@@ -1,9 +1,16 @@
 
+import dataclasses
 import json
 import datetime
+import typing
 
 from src.trading_day import MARKET_TIMEZONE
 
+try:  # faster parsing, if installed
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class DateTimeEncoder(json.JSONEncoder):
     # Override the default method
@@ -33,6 +40,109 @@ def from_json_string(s: str):
     return json.loads(s, cls=MarketTimezoneDateTimeDecoder)
 
 
+#
+# Schema decoding: objects whose datetime fields are known are decoded by parsing only those fields,
+# instead of checking every string of every object like `MarketTimezoneDateTimeDecoder` (giving the same result).
+#
+# Other fields can hold anything (tickers, intention extras), so they get the same conversion as the decoder,
+# unless the line has no other strings that the decoder would convert (the usual case), checked on the raw line.
+#
+
+
+@dataclasses.dataclass
+class Schema:
+    datetimes: tuple[str, ...] = ()
+    objects: dict[str, "Schema"] = dataclasses.field(
+        default_factory=dict)  # nested objects
+    lists: dict[str, "Schema"] = dataclasses.field(
+        default_factory=dict)  # lists of objects
+
+
+def _is_datetime_like(value) -> bool:
+    # what `MarketTimezoneDateTimeDecoder` converts
+    return isinstance(value, str) and len(value) > 18 and value[10] == "T"
+
+
+def _count_datetime_like_strings(s: str) -> int:
+    """
+    At least the number of strings of JSON `s` (without escapes) that are datetime-like:
+    strings with a "T" at 10 (there is no "T" outside of strings).
+    """
+    count = 0
+    i = s.find("T", 11)
+    while i != -1:
+        if s[i - 11] == '"' and '"' not in s[i - 10:i]:
+            count += 1
+        i = s.find("T", i + 1)
+    return count
+
+
+def _parse_datetime(value: str, parsed: dict[str, datetime.datetime]) -> datetime.datetime:
+    # (the same times repeat in a line, like the `now` of every entry of a snapshot)
+    dt = parsed.get(value)
+    if dt is None:
+        dt = parsed[value] = datetime.datetime.fromisoformat(
+            value).astimezone(MARKET_TIMEZONE)
+    return dt
+
+
+def _convert_datetimes(value, parsed: dict[str, datetime.datetime]):
+    """Same conversion as `MarketTimezoneDateTimeDecoder`, for a decoded value."""
+    if isinstance(value, list):
+        for item in value:
+            _convert_datetimes(item, parsed)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if _is_datetime_like(item):
+                value[key] = _parse_datetime(item, parsed)
+            else:
+                _convert_datetimes(item, parsed)
+    return value
+
+
+def _convert_schema_datetimes(obj: dict, schema: Schema, parsed: dict[str, datetime.datetime]) -> int:
+    """Converts known datetime fields of `obj`, returning how many."""
+    count = 0
+    for key in schema.datetimes:
+        if _is_datetime_like(obj.get(key)):
+            obj[key] = _parse_datetime(obj[key], parsed)
+            count += 1
+    for key, nested_schema in schema.objects.items():
+        if isinstance(obj.get(key), dict):
+            count += _convert_schema_datetimes(obj[key],
+                                               nested_schema, parsed)
+    for key, nested_schema in schema.lists.items():
+        if isinstance(obj.get(key), list):
+            for item in obj[key]:
+                if isinstance(item, dict):
+                    count += _convert_schema_datetimes(item,
+                                                       nested_schema, parsed)
+    return count
+
+
+def loads(s: str):
+    """Plain JSON (no datetime conversion), with orjson if installed."""
+    if orjson is not None:
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:  # NaN and Infinity, which `json` writes
+            pass
+    return json.loads(s)
+
+
+def from_json_string_with_schema(s: str, schema: Schema):
+    """Same as `from_json_string` for an object of `schema`."""
+    obj = loads(s)
+    parsed: dict[str, datetime.datetime] = {}
+    if not isinstance(obj, dict):
+        return _convert_datetimes(obj, parsed)
+    converted = _convert_schema_datetimes(obj, schema, parsed)
+    if "\\" in s or _count_datetime_like_strings(s) != converted:
+        # (converted fields are not strings anymore, so are left as they are)
+        _convert_datetimes(obj, parsed)
+    return obj
+
+
 def write_json(path: str, o):
     with open(path, 'w') as f:
         print(to_json_string(o), file=f)
@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 
 from src.trading_day import now
 from src.outputs import json_dump
@@ -11,3 +12,42 @@ class TestJsonDump(unittest.TestCase):
         d = json_dump.from_json_string(message)
 
         assert right_now == d['d']
+
+
+class TestSchemaDecoding(unittest.TestCase):
+    ENTRY_SCHEMA = json_dump.Schema(datetimes=("now",))
+    SCHEMA = json_dump.Schema(datetimes=("now",), objects={"meta": ENTRY_SCHEMA},
+                              lists={"entries": ENTRY_SCHEMA})
+
+    def assert_same_decoding(self, o):
+        message = json_dump.to_json_string(o)
+        expected = json_dump.from_json_string(message)
+        for backend in [json_dump.orjson, None]:
+            with unittest.mock.patch.object(json_dump, "orjson", backend):
+                decoded = json_dump.from_json_string_with_schema(
+                    message, self.SCHEMA)
+            assert decoded == expected
+            assert json_dump.to_json_string(
+                decoded) == json_dump.to_json_string(expected)
+
+    def test_same_as_decoder(self):
+        right_now = now()
+        ticker = {"T": "AAPL", "c": 1.5, "v": 100, "name": "Tesla"}
+        self.assert_same_decoding({"now": right_now, "entries": [
+            {"now": right_now, "ticker": ticker},
+            {"now": right_now, "ticker": dict(ticker, T="MSFT")},
+        ], "meta": None})
+
+    def test_same_as_decoder_with_other_datetimes(self):
+        right_now = now()
+        self.assert_same_decoding({"now": right_now, "entries": [
+            {"now": right_now, "ticker": {"T": "AAPL", "listed_at": right_now,
+                                          "nested": [{"at": right_now}, right_now.isoformat()]}},
+            {"now": "not a datetime", "ticker": {"T": "AAPL", "c": float("nan")}},
+        ], "meta": {"now": right_now, "extra": {"at": right_now}}})
+
+    def test_same_as_decoder_with_escapes(self):
+        right_now = now()
+        self.assert_same_decoding({"now": right_now, "entries": [
+            {"now": right_now, "ticker": {"T": "Ünïcode", "at": right_now}},
+        ]})
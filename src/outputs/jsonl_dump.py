@@ -18,9 +18,13 @@ def append_jsonl(path: typing.Optional[str], lines: typing.Iterable[dict]):
         pprint.pprint(lines)
 
 
-def read_jsonl_lines(path: str) -> typing.Iterator[dict]:
+def read_jsonl_lines(path: str, schema: typing.Optional[json_dump.Schema] = None) -> typing.Iterator[dict]:
+    """Lines of `path`, decoded faster with the `schema` of every line, if given."""
     with open(path) as f:
-        yield from (json_dump.from_json_string(line) for line in f)
+        if schema is not None:
+            yield from (json_dump.from_json_string_with_schema(line, schema) for line in f)
+        else:
+            yield from (json_dump.from_json_string(line) for line in f)
 
 
 def main():
@@ -11,6 +11,9 @@ def get_chronicle_folder_paths(chronicle_name: str, target_environment_name: Opt
         'dir': dir_path,
         'metadata.json': os.path.join(dir_path, 'metadata.json'),
         'snapshots.jsonl': os.path.join(dir_path, 'snapshots.jsonl'),
+        'snapshots.index.json': os.path.join(dir_path, 'snapshots.index.json'),
+        'missed_minutes.jsonl': os.path.join(dir_path, 'missed_minutes.jsonl'),
+        'manifest.json': os.path.join(dir_path, 'manifest.json'),
     }
 
 
@@ -24,6 +27,7 @@ def get_results_folder_paths(results_folder_name: str, target_environment_name:
         "plain-filled-orders.jsonl": os.path.join(dir_path, "plain-filled-orders.jsonl"),
         "intentions.jsonl": os.path.join(dir_path, "intentions.jsonl"),
         "intentioned-filled-orders.jsonl": os.path.join(dir_path, "intentioned-filled-orders.jsonl"),
+        "intentioned-filled-orders": os.path.join(dir_path, "intentioned-filled-orders"),
         "summary.json": os.path.join(dir_path, "summary.json"),
         "metadata.json": os.path.join(dir_path, "metadata.json"),
     }
@@ -88,12 +92,18 @@ def get_paths(target_environment_name: Optional[str] = None):
         outputs_dir, 'order_intentions_{algo_name}.jsonl')
     output_paths["performance_csv"] = os.path.join(
         outputs_dir, 'performance-{environment}.csv')
+    output_paths["losers_gridsearch_pockets_jsonl"] = os.path.join(
+        outputs_dir, 'losers_gridsearch_pockets.jsonl')
 
     paths['data']["logs"] = {'dir': os.path.join(data_dir, 'logs')}
 
     paths['data']["cache"] = {
         'dir': os.path.join(data_dir, 'cache')}
 
+    # state shared between processes (e.g. rate limits)
+    paths['data']["locks"] = {
+        'dir': os.path.join(data_dir, 'locks')}
+
     return paths
 
 
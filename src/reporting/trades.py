@@ -194,27 +194,23 @@ def get_closed_trades_from_orders_csv(path, build_trade=build_trade) -> typing.I
 
 
 def group_orders_by_trade(filled_orders):
-    orders_by_symbol = {}
+    # orders and quantity of the open position of each symbol
+    open_orders = {}
+    open_quantities = {}
     for order in filled_orders:  # latest last
-        orders_by_symbol[order["symbol"]] = orders_by_symbol.get(
-            order["symbol"], []) + [order]
-
-    for orders in orders_by_symbol.values():
-        current_qty = 0
-        index_of_last_trade = 0
-        for i in range(len(orders)):
-            order = orders[i]
-
-            quantity = int(order["quantity"])
-            qty_diff = quantity if order["side"] == 'buy' else -quantity
-
-            current_qty += qty_diff
-            if current_qty == 0:
-
-                # before : is inclusive, after : is exclusive
-                trade_orders = orders[index_of_last_trade:i + 1]
-                index_of_last_trade = i + 1
-
-                yield trade_orders
-
-        # NOTE: open trades are not yielded
+        symbol = order["symbol"]
+        trade_orders = open_orders.setdefault(symbol, [])
+        trade_orders.append(order)
+
+        quantity = int(order["quantity"])
+        qty_diff = quantity if order["side"] == 'buy' else -quantity
+
+        current_qty = open_quantities.get(symbol, 0) + qty_diff
+        if current_qty == 0:
+            del open_orders[symbol]
+            open_quantities.pop(symbol, None)
+            yield trade_orders
+        else:
+            open_quantities[symbol] = current_qty
+
+    # NOTE: open trades are not yielded
@@ -1,8 +1,9 @@
+import datetime
 import os
 import typing
 from src.outputs import jsonl_dump, json_dump, pathing
 from src import types
-from src.results import summary, metadata
+from src.results import summary, metadata, order_store
 
 
 def rm_f(path: str) -> None:
@@ -28,7 +29,7 @@ def overwrite_orders(result_name: str, orders: list[types.FilledOrder]):
 def read_orders(result_name: str) -> typing.Iterator[types.FilledOrder]:
     paths = pathing.get_results_folder_paths(result_name)
     path = paths['plain-filled-orders.jsonl']
-    return (types.FilledOrder.from_dict(o) for o in jsonl_dump.read_jsonl_lines(path))
+    return (types.FilledOrder.from_dict(o) for o in jsonl_dump.read_jsonl_lines(path, schema=types.FILLED_ORDER_SCHEMA))
 
 #
 # Intentions
@@ -53,7 +54,7 @@ def append_intentions(result_name: str, intentions: list[types.Intention]):
 def read_intentions(result_name: str) -> typing.Iterator[types.Intention]:
     paths = pathing.get_results_folder_paths(result_name)
     path = paths['intentions.jsonl']
-    return (types.Intention.from_dict(i) for i in jsonl_dump.read_jsonl_lines(path))
+    return (types.Intention.from_dict(i) for i in jsonl_dump.read_jsonl_lines(path, schema=types.INTENTION_SCHEMA))
 
 #
 # Intention Filled Orders
@@ -62,17 +63,38 @@ def read_intentions(result_name: str) -> typing.Iterator[types.Intention]:
 
 def overwrite_intention_filled_orders(result_name: str, orders: list[types.FilledOrder]):
     paths = pathing.get_results_folder_paths(result_name)
-    path = paths['intentioned-filled-orders.jsonl']
 
-    rm_f(path)
-    jsonl_dump.append_jsonl(path, (o.to_dict()
-                            for o in sorted(orders, key=lambda o: o.datetime)))
+    rm_f(paths['intentioned-filled-orders.jsonl'])  # written before segments
+    order_store.write_orders(paths['intentioned-filled-orders'], orders)
+
+
+def append_intention_filled_orders(result_name: str, orders: list[types.FilledOrder]):
+    paths = pathing.get_results_folder_paths(result_name)
+    order_store.append_orders(paths['intentioned-filled-orders'], orders)
+
+
+def get_intention_filled_orders_end(result_name: str) -> typing.Optional[datetime.datetime]:
+    """
+    Time of the last intention filled order, None if there are none or they were written before segments
+    (so can't be appended to).
+    """
+    paths = pathing.get_results_folder_paths(result_name)
+    if os.path.exists(paths['intentioned-filled-orders.jsonl']):
+        return None
+    return order_store.get_end(paths['intentioned-filled-orders'])
 
 
-def read_intention_filled_orders(result_name: str) -> typing.Iterator[types.FilledOrder]:
+def read_intention_filled_orders(result_name: str, start: typing.Optional[datetime.date] = None, end: typing.Optional[datetime.date] = None, symbols: typing.Optional[typing.Iterable[str]] = None) -> typing.Iterator[types.FilledOrder]:
+    """
+    Orders by time, between `start` and `end` (inclusive) and with one of `symbols` if given.
+    """
     paths = pathing.get_results_folder_paths(result_name)
     path = paths['intentioned-filled-orders.jsonl']
-    return (types.FilledOrder.from_dict(o) for o in jsonl_dump.read_jsonl_lines(path))
+    if os.path.exists(path):  # written before segments
+        with open(path) as f:
+            yield from order_store.filter_order_lines(f, start, end, set(symbols) if symbols is not None else None)
+        return
+    yield from order_store.query_orders(paths['intentioned-filled-orders'], start, end, symbols)
 
 #
 # Summary
@@ -10,4 +10,5 @@ def write_results(results_name: str, orders: list[types.FilledOrder], metadata:
     crud.create_result(results_name)
 
     dumping.overwrite_metadata(results_name, metadata)
-    dumping.overwrite_intention_filled_orders(results_name, orders)
+    # (a new result, so its store is empty)
+    dumping.append_intention_filled_orders(results_name, orders)
@@ -1,27 +1,68 @@
+import collections
 import logging
+import typing
 from src.results import dumping
 from src import types
+from src.trading_day import MARKET_TIMEZONE
 
 
-def enhance_order_with_intention(order: types.FilledOrder, intentions: list[types.Intention]) -> types.FilledOrder:
+def enhance_order_with_intention(order: types.FilledOrder, intentions: typing.Union[list[types.Intention], types.IntentionIndex]) -> types.FilledOrder:
     intention = types.FilledOrder.find_matching_intention(order, intentions)
     if intention is not None:
-        if order.intention:
-            # TODO: merge the intentions together
-            logging.warning(
-                "Observed multiple intentions for the same order! Keeping the original one.")
+        if order.intention and order.intention != intention:
+            # fields of the original intention win
+            order.intention = order.intention.merge(intention)
         else:
             order.intention = intention
     return order
 
 
-def update(result_name: str):
+def _get_order_key(order: types.FilledOrder) -> tuple:
+    return (order.symbol, order.quantity, order.price, order.datetime)
+
+
+def get_new_orders(result_name: str, orders: typing.Iterable[types.FilledOrder]) -> typing.Optional[list[types.FilledOrder]]:
+    """
+    `orders` that are not in the intention filled orders yet, i.e. from the time of the last one on
+    (leaving out those already stored at that time).
+    None if intention filled orders can't be appended to.
+    """
+    end = dumping.get_intention_filled_orders_end(result_name)
+    if end is None:
+        return None
+
+    stored_at_end = collections.Counter(_get_order_key(o) for o in dumping.read_intention_filled_orders(
+        result_name, start=end.astimezone(MARKET_TIMEZONE).date()) if o.datetime == end)
+    new_orders = []
+    for order in orders:
+        if order.datetime < end:
+            continue
+        key = _get_order_key(order)
+        if order.datetime == end and stored_at_end[key] > 0:
+            stored_at_end[key] -= 1
+            continue
+        new_orders.append(order)
+    return new_orders
+
+
+def update(result_name: str, full: bool = False):
+    """
+    Enhances filled orders with their intention. Only orders newer than the last intention filled order
+    are added, unless `full`.
+    """
     logging.info(
         f"Updating intention_filled_orders.jsonl for {result_name}...")
-    intentions = list(dumping.read_intentions(result_name))
+    intentions = types.IntentionIndex(dumping.read_intentions(result_name))
 
-    dumping.overwrite_intention_filled_orders(result_name, [enhance_order_with_intention(
-        order, intentions) for order in dumping.read_orders(result_name)])
+    orders = dumping.read_orders(result_name)
+    new_orders = None if full else get_new_orders(result_name, orders)
+    if new_orders is None:
+        dumping.overwrite_intention_filled_orders(result_name, [enhance_order_with_intention(
+            order, intentions) for order in orders])
+    else:
+        logging.info(f"appending {len(new_orders)} orders")
+        dumping.append_intention_filled_orders(result_name, [enhance_order_with_intention(
+            order, intentions) for order in new_orders])
     logging.info(
         f"Done updating intention_filled_orders.jsonl for {result_name}.")
 
@@ -31,6 +72,8 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument('result_name', type=str)
+    parser.add_argument('--full', action='store_true',
+                        help="rewrite all orders, not only append new ones")
     args = parser.parse_args()
 
-    update(args.result_name)
+    update(args.result_name, full=args.full)
@@ -0,0 +1,253 @@
+import dataclasses
+import datetime
+import heapq
+import itertools
+import os
+import typing
+
+from src import types
+from src.outputs import json_dump
+from src.trading_day import MARKET_TIMEZONE
+
+#
+# Orders of a result, stored in segments by month (`<dir>/<YYYY-MM>.jsonl`, each sorted by time),
+# with an index (`<dir>/index.json`) of the time range and symbols of each segment.
+# Queries only read segments that can match, and skip non-matching lines before parsing them.
+# Appending orders only rewrites segments that the new orders do not come after.
+# The index is written last and records each segment's size, so lines appended by an interrupted append
+# (not in the index yet) are truncated away by the next one.
+#
+
+INDEX_FILE_NAME = "index.json"
+
+# orders are dumped with sorted keys, so their own `datetime` comes first
+DATETIME_PREFIX = '{"datetime": "'
+
+
+@dataclasses.dataclass
+class SegmentIndex:
+    name: str
+    start: datetime.datetime
+    end: datetime.datetime
+    count: int
+    symbols: dict[str, int]  # symbol -> count of orders
+    size: typing.Optional[int] = None  # bytes of the segment file, None in indexes written before sizes were
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "count": self.count,
+            "symbols": self.symbols,
+            "size": self.size,
+        }
+
+    @staticmethod
+    def from_dict(d: dict):
+        return SegmentIndex(name=d["name"], start=d["start"], end=d["end"], count=d["count"], symbols=d["symbols"],
+                            size=d.get("size"))
+
+    @staticmethod
+    def from_orders(name: str, orders: list[types.FilledOrder]):
+        symbols: dict[str, int] = {}
+        for order in orders:
+            symbols[order.symbol] = symbols.get(order.symbol, 0) + 1
+        return SegmentIndex(name=name, start=orders[0].datetime, end=orders[-1].datetime, count=len(orders), symbols=symbols)
+
+    def may_match(self, start: typing.Optional[datetime.date], end: typing.Optional[datetime.date], symbols: typing.Optional[set[str]]) -> bool:
+        if start is not None and self.end.astimezone(MARKET_TIMEZONE).date() < start:
+            return False
+        if end is not None and self.start.astimezone(MARKET_TIMEZONE).date() > end:
+            return False
+        if symbols is not None and symbols.isdisjoint(self.symbols.keys()):
+            return False
+        return True
+
+
+@dataclasses.dataclass
+class OrderStoreIndex:
+    segments: list[SegmentIndex]  # by time
+
+    def to_dict(self) -> dict:
+        return {"segments": [s.to_dict() for s in self.segments]}
+
+    @staticmethod
+    def from_dict(d: dict):
+        return OrderStoreIndex(segments=[SegmentIndex.from_dict(s) for s in d["segments"]])
+
+
+def get_segment_name(dt: datetime.datetime) -> str:
+    dt = dt.astimezone(MARKET_TIMEZONE)
+    return f"{dt.year:04d}-{dt.month:02d}"
+
+
+def _get_segment_path(dir_path: str, name: str) -> str:
+    return os.path.join(dir_path, f"{name}.jsonl")
+
+
+def _write_atomically(path: str, lines: typing.Iterable[str]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for line in lines:
+            print(line, file=f)
+    os.replace(tmp_path, path)
+
+
+def read_index(dir_path: str) -> typing.Optional[OrderStoreIndex]:
+    try:
+        return OrderStoreIndex.from_dict(json_dump.read_json(os.path.join(dir_path, INDEX_FILE_NAME)))
+    except FileNotFoundError:
+        return None
+
+
+def _write_index(dir_path: str, index: OrderStoreIndex):
+    _write_atomically(os.path.join(dir_path, INDEX_FILE_NAME),
+                      [json_dump.to_json_string(index.to_dict())])
+
+
+def _group_by_segment(orders: typing.Iterable[types.FilledOrder]) -> dict[str, list[types.FilledOrder]]:
+    orders_by_segment: dict[str, list[types.FilledOrder]] = {}
+    for order in sorted(orders, key=lambda o: o.datetime):
+        orders_by_segment.setdefault(
+            get_segment_name(order.datetime), []).append(order)
+    return orders_by_segment
+
+
+def write_orders(dir_path: str, orders: typing.Iterable[types.FilledOrder]):
+    """Replaces all orders in the store."""
+    os.makedirs(dir_path, exist_ok=True)
+    orders_by_segment = _group_by_segment(orders)
+
+    # while segments are being replaced, the store has no index (so is not read half-written)
+    previous_index = read_index(dir_path)
+    try:
+        os.remove(os.path.join(dir_path, INDEX_FILE_NAME))
+    except FileNotFoundError:
+        pass
+    if previous_index:
+        for segment in previous_index.segments:
+            if segment.name not in orders_by_segment:
+                os.remove(_get_segment_path(dir_path, segment.name))
+
+    segments = []
+    for name, segment_orders in sorted(orders_by_segment.items()):
+        path = _get_segment_path(dir_path, name)
+        _write_atomically(path, (json_dump.to_json_string(
+            o.to_dict()) for o in segment_orders))
+        segment = SegmentIndex.from_orders(name, segment_orders)
+        segment.size = os.path.getsize(path)
+        segments.append(segment)
+    _write_index(dir_path, OrderStoreIndex(segments=segments))
+
+
+def append_orders(dir_path: str, orders: typing.Iterable[types.FilledOrder]):
+    """
+    Adds orders to the store. Segments are appended to when the new orders come after their last order,
+    otherwise merged and rewritten.
+    """
+    os.makedirs(dir_path, exist_ok=True)
+    index = read_index(dir_path) or OrderStoreIndex(segments=[])
+    segments = {s.name: s for s in index.segments}
+
+    for name, new_orders in _group_by_segment(orders).items():
+        path = _get_segment_path(dir_path, name)
+        segment = segments.get(name)
+        if segment is None or (segment.size is not None and new_orders[0].datetime >= segment.end):
+            with open(path, "a" if segment else "w") as f:
+                if segment is not None:
+                    # (drop lines of an interrupted append)
+                    f.truncate(segment.size)
+                for order in new_orders:
+                    print(json_dump.to_json_string(order.to_dict()), file=f)
+            updated = SegmentIndex.from_orders(name, new_orders)
+            updated.size = os.path.getsize(path)
+            if segment is not None:
+                updated.start = segment.start
+                updated.count += segment.count
+                for symbol, count in segment.symbols.items():
+                    updated.symbols[symbol] = updated.symbols.get(
+                        symbol, 0) + count
+            segments[name] = updated
+        else:
+            merged = list(heapq.merge(_read_segment(
+                dir_path, name, segment.count), new_orders, key=lambda o: o.datetime))
+            _write_atomically(path, (json_dump.to_json_string(
+                o.to_dict()) for o in merged))
+            segments[name] = SegmentIndex.from_orders(name, merged)
+            segments[name].size = os.path.getsize(path)
+
+    _write_index(dir_path, OrderStoreIndex(
+        segments=[segments[name] for name in sorted(segments)]))
+
+
+def get_end(dir_path: str) -> typing.Optional[datetime.datetime]:
+    """Time of the last order in the store, None if there is no store or it is empty."""
+    index = read_index(dir_path)
+    if index is None or not index.segments:
+        return None
+    return index.segments[-1].end
+
+
+def _read_segment(dir_path: str, name: str, count: int) -> typing.Iterator[types.FilledOrder]:
+    """The `count` orders of a segment in the index (leaving out lines of an interrupted append)."""
+    with open(_get_segment_path(dir_path, name)) as f:
+        for line in itertools.islice(f, count):
+            yield types.FilledOrder.from_dict(
+                json_dump.from_json_string_with_schema(line, types.FILLED_ORDER_SCHEMA))
+
+
+def filter_order_lines(lines: typing.Iterable[str], start: typing.Optional[datetime.date] = None, end: typing.Optional[datetime.date] = None, symbols: typing.Optional[set[str]] = None, is_sorted: bool = False) -> typing.Iterator[types.FilledOrder]:
+    """
+    Orders of JSON `lines` between `start` and `end` (inclusive, market days) and with one of `symbols`,
+    checking dates and symbols before parsing lines (dates of lines not starting with their `datetime`,
+    e.g. not dumped by `to_json_string`, are checked once parsed).
+    """
+    symbol_needles = [f'"symbol": {json_dump.to_json_string(s)}'
+                      for s in symbols] if symbols is not None else None
+    for line in lines:
+        dated = line.startswith(DATETIME_PREFIX)
+        if dated and (start is not None or end is not None):
+            day = datetime.datetime.fromisoformat(line[len(DATETIME_PREFIX):line.index('"', len(
+                DATETIME_PREFIX))]).astimezone(MARKET_TIMEZONE).date()
+            if start is not None and day < start:
+                continue
+            if end is not None and day > end:
+                if is_sorted:
+                    break
+                continue
+
+        # (the intention can have a "symbol" too, so this only rules lines out)
+        if symbol_needles is not None and not any(needle in line for needle in symbol_needles):
+            continue
+
+        order = types.FilledOrder.from_dict(
+            json_dump.from_json_string_with_schema(line, types.FILLED_ORDER_SCHEMA))
+        if symbols is not None and order.symbol not in symbols:
+            continue
+        if not dated and (start is not None or end is not None):
+            day = order.datetime.astimezone(MARKET_TIMEZONE).date()
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+        yield order
+
+
+def _read_lines(path: str, count: int) -> typing.Iterator[str]:
+    # (lines past `count` are from an interrupted append, not in the index)
+    with open(path) as f:
+        yield from itertools.islice(f, count)
+
+
+def query_orders(dir_path: str, start: typing.Optional[datetime.date] = None, end: typing.Optional[datetime.date] = None, symbols: typing.Optional[typing.Iterable[str]] = None) -> typing.Iterator[types.FilledOrder]:
+    """
+    Orders in the store (by time) between `start` and `end` (inclusive, market days), with one of `symbols`.
+    Raises FileNotFoundError if there is no store.
+    """
+    index = read_index(dir_path)
+    if index is None:
+        raise FileNotFoundError(os.path.join(dir_path, INDEX_FILE_NAME))
+    symbol_set = set(symbols) if symbols is not None else None
+    for segment in index.segments:
+        if not segment.may_match(start, end, symbol_set):
+            continue
+        yield from filter_order_lines(_read_lines(_get_segment_path(dir_path, segment.name), segment.count), start, end, symbol_set, is_sorted=True)
@@ -0,0 +1,133 @@
+import dataclasses
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src import types
+from src.results import dumping, intention_filled_orders, order_store
+from src.outputs import json_dump, jsonl_dump
+from src.trading_day import MARKET_TIMEZONE
+
+
+def order(symbol: str, day: datetime.date, hour: int = 10) -> types.FilledOrder:
+    intention = types.Intention(datetime=datetime.datetime.combine(
+        day, datetime.time(hour - 1), tzinfo=MARKET_TIMEZONE), symbol="SPY", extra={"reason": symbol})
+    return types.FilledOrder(intention=intention, symbol=symbol, quantity=1, price=1, datetime=datetime.datetime.combine(day, datetime.time(hour), tzinfo=MARKET_TIMEZONE))
+
+
+class TestOrderStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir_path = os.path.join(self.tmp.name, "orders")
+        self.orders = [order(symbol, datetime.date(2022, month, day), hour)
+                       for month in [1, 2, 3] for day in [3, 10, 20] for symbol, hour in [("AAPL", 10), ("MSFT", 11)]]
+        self.orders.append(order("SPY", datetime.date(2022, 2, 15)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def query(self, **kwargs) -> list[types.FilledOrder]:
+        return list(order_store.query_orders(self.dir_path, **kwargs))
+
+    def test_queries_read_matching_segments(self):
+        order_store.write_orders(self.dir_path, reversed(self.orders))
+        all_orders = sorted(self.orders, key=lambda o: o.datetime)
+        self.assertEqual(self.query(), all_orders)
+
+        self.assertEqual(sorted(os.listdir(self.dir_path)), [
+                         "2022-01.jsonl", "2022-02.jsonl", "2022-03.jsonl", "index.json"])
+        with mock.patch("src.results.order_store._read_lines", wraps=order_store._read_lines) as read_lines:
+            self.assertEqual(self.query(start=datetime.date(2022, 2, 10), end=datetime.date(2022, 3, 3)), [
+                o for o in all_orders if datetime.date(2022, 2, 10) <= o.datetime.date() <= datetime.date(2022, 3, 3)])
+            self.assertEqual(read_lines.call_count, 2)
+
+            read_lines.reset_mock()
+            # SPY is in an intention of every order, but only one order
+            self.assertEqual(self.query(symbols=["SPY"]), [self.orders[-1]])
+            self.assertEqual(read_lines.call_count, 1)
+
+    def test_append(self):
+        order_store.write_orders(self.dir_path, self.orders[:6])
+        # after the last order, and in a new segment
+        order_store.append_orders(self.dir_path, self.orders[6:10])
+        # before the last order of a segment
+        order_store.append_orders(self.dir_path, self.orders[10:])
+
+        self.assertEqual(self.query(), sorted(
+            self.orders, key=lambda o: o.datetime))
+        index = order_store.read_index(self.dir_path)
+        assert index is not None
+        self.assertEqual([(s.name, s.count, s.symbols) for s in index.segments], [
+            ("2022-01", 6, {"AAPL": 3, "MSFT": 3}),
+            ("2022-02", 7, {"AAPL": 3, "MSFT": 3, "SPY": 1}),
+            ("2022-03", 6, {"AAPL": 3, "MSFT": 3}),
+        ])
+
+    def test_interrupted_append_is_dropped(self):
+        order_store.write_orders(self.dir_path, self.orders[:6])
+        # after the last order of the segment, and in a new one
+        new_orders = [order("TSLA", datetime.date(2022, 1, 25)), self.orders[6]]
+        with mock.patch.object(order_store, "_write_index", side_effect=KeyboardInterrupt()):
+            with self.assertRaises(KeyboardInterrupt):
+                order_store.append_orders(self.dir_path, new_orders)
+        # partially written line
+        with open(os.path.join(self.dir_path, "2022-01.jsonl"), "a") as f:
+            f.write('{"datetime": "2022-01')
+
+        self.assertEqual(self.query(), self.orders[:6])
+        order_store.append_orders(self.dir_path, new_orders)
+        self.assertEqual(self.query(), self.orders[:6] + new_orders)
+        with open(os.path.join(self.dir_path, "2022-01.jsonl")) as f:
+            self.assertEqual(len(f.readlines()), 7)
+
+    def test_reads_results_written_before_segments(self):
+        paths = {"data": {"results": {"dir": self.tmp.name}}}
+        with mock.patch("src.outputs.pathing.get_paths", return_value=paths):
+            os.makedirs(os.path.join(self.tmp.name, "r"))
+            jsonl_dump.append_jsonl(os.path.join(self.tmp.name, "r", "intentioned-filled-orders.jsonl"), [
+                o.to_dict() for o in self.orders])
+            self.assertEqual(list(dumping.read_intention_filled_orders(
+                "r", symbols=["MSFT"], end=datetime.date(2022, 1, 31))), [o for o in self.orders[:6] if o.symbol == "MSFT"])
+
+            dumping.overwrite_intention_filled_orders("r", self.orders)
+            self.assertEqual(sorted(os.listdir(os.path.join(self.tmp.name, "r"))), [
+                             "intentioned-filled-orders"])
+            self.assertEqual(list(dumping.read_intention_filled_orders("r", symbols=["MSFT"], end=datetime.date(2022, 1, 31))), [
+                             o for o in self.orders[:6] if o.symbol == "MSFT"])
+
+    def test_filters_dates_of_lines_not_starting_with_datetime(self):
+        lines = [json.dumps(o.to_dict(), cls=json_dump.DateTimeEncoder)
+                 for o in self.orders]
+        assert not lines[0].startswith(order_store.DATETIME_PREFIX)
+        self.assertEqual(list(order_store.filter_order_lines(lines, start=datetime.date(2022, 2, 10), end=datetime.date(2022, 3, 3))), [
+            o for o in self.orders if datetime.date(2022, 2, 10) <= o.datetime.date() <= datetime.date(2022, 3, 3)])
+
+    def test_update_appends_new_orders(self):
+        paths = {"data": {"results": {"dir": self.tmp.name}}}
+        intention = types.Intention(datetime=datetime.datetime(
+            2022, 1, 1, tzinfo=MARKET_TIMEZONE), symbol="AAPL", extra={})
+        plain_orders = [types.FilledOrder(intention=None, symbol=o.symbol, quantity=o.quantity, price=o.price, datetime=o.datetime)
+                        for o in sorted(self.orders, key=lambda o: o.datetime)]
+        # filled at the same time as the last order of the first update
+        plain_orders.insert(8, types.FilledOrder(intention=None, symbol="TSLA", quantity=1,
+                            price=1, datetime=plain_orders[7].datetime))
+        expected = [dataclasses.replace(o, intention=intention if o.symbol == "AAPL" else None)
+                    for o in plain_orders]
+
+        with mock.patch("src.outputs.pathing.get_paths", return_value=paths):
+            os.makedirs(os.path.join(self.tmp.name, "r"))
+            dumping.overwrite_intentions("r", [intention])
+            dumping.overwrite_orders("r", plain_orders[:8])
+            intention_filled_orders.update("r")
+            self.assertEqual(
+                list(dumping.read_intention_filled_orders("r")), expected[:8])
+
+            dumping.overwrite_orders("r", plain_orders)
+            with mock.patch.object(order_store, "write_orders") as write_orders:
+                intention_filled_orders.update("r")
+                write_orders.assert_not_called()
+            self.assertEqual(
+                list(dumping.read_intention_filled_orders("r")), expected)
@@ -1,16 +1,23 @@
+import datetime
 import typing
 from src.results import dumping, metadata
 from src import types
 
 
-def get_orders(result_name: str) -> typing.Iterable[types.FilledOrder]:
-    orders = list(dumping.read_intention_filled_orders(result_name))
+def get_orders(result_name: str, start: typing.Optional[datetime.date] = None, end: typing.Optional[datetime.date] = None, symbols: typing.Optional[typing.Iterable[str]] = None) -> typing.Iterable[types.FilledOrder]:
+    """
+    Orders of result, optionally only those between `start` and `end` (inclusive) and with one of `symbols`
+    (only reading the parts of the result that can match).
+    """
+    orders = list(dumping.read_intention_filled_orders(
+        result_name, start=start, end=end, symbols=symbols))
     return orders
 
 
-def get_trades(result_name: str) -> typing.Iterable[types.Trade]:
-    orders = list(dumping.read_intention_filled_orders(result_name))
-    trades = list(types.Trade.from_orders(orders))
+def get_trades(result_name: str, symbols: typing.Optional[typing.Iterable[str]] = None) -> typing.Iterable[types.Trade]:
+    """Trades of result, optionally only those of `symbols`."""
+    trades = list(types.Trade.from_orders(dumping.read_intention_filled_orders(
+        result_name, symbols=symbols), is_sorted=True))
     return trades
 
 
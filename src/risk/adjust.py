@@ -23,7 +23,8 @@ def main():
 
     initial_account = simulate_account.SettlingAccountState(
         initial_account_value, simulate_account.IdealAccountState(initial_account_value, simulate_account.build_td_simulation(), {}), [])
-    account = copy.deepcopy(initial_account)
+    simulator = simulate_account.SettlingAccountSimulator(initial_account)
+    account = simulator.snapshot()
     for order in orders:
         # TODO: evaluate at proper time of day, not close (then update portfolio_value_estimator_version)
         # portfolio_value = simulate_account.estimate_account_value(
@@ -49,8 +50,7 @@ def main():
             adjusted_order.quantity = -account.get_positions()[
                 adjusted_order.symbol]
 
-        changes = simulate_account.apply_order_to_settling_account(
-            account, adjusted_order)
+        changes = simulator.apply_order(adjusted_order)
         account = changes[-1][1]
 
         print(account.get_positions(), account.get_cash())
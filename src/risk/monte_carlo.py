@@ -0,0 +1,175 @@
+import bisect
+import dataclasses
+import datetime
+import typing
+
+import numpy as np
+
+from src import trading_day, types
+
+#
+# Monte Carlo sizing: replays the calendar of a result's trades (when each entered and exited) many times,
+# with trade outcomes resampled (bootstrapped or permuted) for each simulation, and sizes each entry as a
+# percentage of the account. All simulations and all percentages are arrays advanced together.
+#
+# Settling is modeled like `simulate_account.apply_order_to_settling_account`: buys use purchasing power,
+# sale proceeds become purchasing power at the open 1 (options) or 2 (otherwise) trading days later.
+# Entries are capped by purchasing power. Long trades only.
+#
+
+
+@dataclasses.dataclass
+class TradeCalendar:
+    rois: np.ndarray  # of the original trades
+    # (trading day index, is exit, trade index), in time order
+    events: list[typing.Tuple[int, bool, int]]
+    settlement_days: np.ndarray  # per trade
+    days: int  # trading days from first entry to last exit
+
+    @staticmethod
+    def from_trades(trades: list[types.Trade]):
+        assert trades, "no trades"
+        first_day = min(t.get_start() for t in trades).date()
+        last_day = max(t.get_end() for t in trades).date()
+        days = list(trading_day.generate_trading_days(first_day, last_day))
+
+        timed_events: list[typing.Tuple[datetime.datetime, bool, int]] = []
+        for i, trade in enumerate(trades):
+            timed_events.append((trade.get_start(), False, i))
+            timed_events.append((trade.get_end(), True, i))
+        timed_events.sort()
+
+        return TradeCalendar(
+            rois=np.array([max(t.get_roi(), -1) for t in trades]),
+            # (weekend fills count as of the next trading day)
+            events=[(bisect.bisect_left(days, dt.date()), is_exit, i)
+                    for dt, is_exit, i in timed_events],
+            settlement_days=np.array(
+                [1 if t.orders[-1].is_option() else 2 for t in trades]),
+            days=len(days),
+        )
+
+
+def sample_rois(rois: np.ndarray, simulations: int, method: str, rng: np.random.Generator) -> np.ndarray:
+    """Outcomes of trades for each simulation (simulations x trades)."""
+    if method == "bootstrap":
+        return rois[rng.integers(len(rois), size=(simulations, len(rois)))]
+    if method == "permute":
+        return rng.permuted(np.tile(rois, (simulations, 1)), axis=1)
+    raise ValueError(f"unknown sampling method {method}")
+
+
+@dataclasses.dataclass
+class MonteCarloResults:
+    portfolio_percentages: np.ndarray  # K
+    # simulations x K
+    final_balances: np.ndarray
+    max_drawdowns: np.ndarray
+    ruined: np.ndarray
+    cagrs: np.ndarray
+
+    def summarize(self, percentiles: typing.Sequence[float] = (5, 25, 50, 75, 95)) -> list[dict]:
+        summaries = []
+        for k, portfolio_percentage in enumerate(self.portfolio_percentages):
+            summaries.append({
+                "portfolio_percentage": float(portfolio_percentage),
+                "ruin_probability": float(self.ruined[:, k].mean()),
+                "max_drawdown": {f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(self.max_drawdowns[:, k], percentiles))},
+                "cagr": {f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(self.cagrs[:, k], percentiles))},
+            })
+        return summaries
+
+
+def simulate(calendar: TradeCalendar, roi_samples: np.ndarray, portfolio_percentages: typing.Sequence[float], ruin_threshold: float = 0.5) -> MonteCarloResults:
+    """
+    Replays `calendar` for each row of `roi_samples` (simulations x trades) and each of `portfolio_percentages`,
+    starting each account at 1. An account is ruined once its value falls to `ruin_threshold`.
+    """
+    percentages = np.asarray(portfolio_percentages, dtype=float)
+    shape = (roi_samples.shape[0], len(percentages))
+
+    purchasing_power = np.ones(shape)
+    settling_total = np.zeros(shape)
+    open_total = np.zeros(shape)  # open positions, at cost
+    settling_by_day: dict[int, np.ndarray] = {}
+    open_sizes: dict[int, np.ndarray] = {}
+
+    peak = np.ones(shape)
+    max_drawdowns = np.zeros(shape)
+    ruined = np.zeros(shape, dtype=bool)
+
+    for day, is_exit, i in calendar.events:
+        # at the open, settled cash becomes purchasing power
+        for settlement_day in [d for d in settling_by_day if d <= day]:
+            settled = settling_by_day.pop(settlement_day)
+            purchasing_power += settled
+            settling_total -= settled
+
+        if not is_exit:
+            account_value = purchasing_power + settling_total + open_total
+            size = np.clip(np.minimum(percentages * account_value,
+                                      purchasing_power), 0, None)
+            purchasing_power -= size
+            open_total += size
+            open_sizes[i] = size
+            continue
+
+        size = open_sizes.pop(i)
+        open_total -= size
+        proceeds = size * (1 + roi_samples[:, i, np.newaxis])
+        settlement_day = day + int(calendar.settlement_days[i])
+        settling_by_day[settlement_day] = settling_by_day.get(
+            settlement_day, 0) + proceeds
+        settling_total += proceeds
+
+        account_value = purchasing_power + settling_total + open_total
+        np.maximum(peak, account_value, out=peak)
+        np.maximum(max_drawdowns, 1 - account_value / peak, out=max_drawdowns)
+        ruined |= account_value <= ruin_threshold
+
+    final_balances = purchasing_power + settling_total + open_total
+    years = calendar.days / 252
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagrs = np.where(final_balances > 0, final_balances **
+                         (1 / years) - 1, -1.)
+
+    return MonteCarloResults(
+        portfolio_percentages=percentages,
+        final_balances=final_balances,
+        max_drawdowns=max_drawdowns,
+        ruined=ruined,
+        cagrs=cagrs,
+    )
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("result_name", type=str)
+    parser.add_argument("--simulations", type=int, default=5000)
+    parser.add_argument("--method", choices=["bootstrap", "permute"],
+                        default="bootstrap")
+    parser.add_argument("--portfolio-percentages", type=float, nargs="+",
+                        default=[0.01, 0.02, 0.04, 0.062, 0.08, 0.1, 0.15, 0.2, 0.3])
+    parser.add_argument("--ruin-threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None)
+
+    args = parser.parse_args()
+
+    from src.results import read_results
+
+    trades = [t for t in read_results.get_trades(args.result_name) if t.is_long()]
+    calendar = TradeCalendar.from_trades(trades)
+    roi_samples = sample_rois(calendar.rois, args.simulations,
+                              args.method, np.random.default_rng(args.seed))
+    results = simulate(calendar, roi_samples,
+                       args.portfolio_percentages, ruin_threshold=args.ruin_threshold)
+
+    print(f"{len(trades)} trades over {calendar.days} trading days, {args.simulations} {args.method} simulations")
+    print(f"{'size':>6} {'ruin':>6} {'dd p50':>7} {'dd p95':>7} {'cagr p5':>8} {'cagr p50':>8} {'cagr p95':>8}")
+    for summary in results.summarize():
+        print(
+            f"{summary['portfolio_percentage']:>6.1%} {summary['ruin_probability']:>6.1%} "
+            f"{summary['max_drawdown']['p50']:>7.1%} {summary['max_drawdown']['p95']:>7.1%} "
+            f"{summary['cagr']['p5']:>8.1%} {summary['cagr']['p50']:>8.1%} {summary['cagr']['p95']:>8.1%}")
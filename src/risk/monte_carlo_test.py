@@ -0,0 +1,61 @@
+import datetime
+import unittest
+
+import numpy as np
+
+from src import types
+from src.risk import monte_carlo
+from src.trading_day import MARKET_TIMEZONE
+
+
+def trade(symbol: str, entry: datetime.datetime, exit: datetime.datetime, roi: float) -> types.Trade:
+    return types.Trade(orders=[
+        types.FilledOrder(intention=None, symbol=symbol,
+                          quantity=10, price=10, datetime=entry),
+        types.FilledOrder(intention=None, symbol=symbol,
+                          quantity=-10, price=10 * (1 + roi), datetime=exit),
+    ])
+
+
+def at(day: int, hour: int) -> datetime.datetime:
+    # 2022-01-03 is a Monday
+    return datetime.datetime(2022, 1, day, hour, tzinfo=MARKET_TIMEZONE)
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def setUp(self):
+        self.calendar = monte_carlo.TradeCalendar.from_trades([
+            trade("A", at(3, 10), at(3, 11), 0.1),
+            # Tuesday: proceeds of A have not settled yet
+            trade("B", at(4, 10), at(4, 11), -0.5),
+            # Wednesday: proceeds of A settled
+            trade("C", at(5, 10), at(6, 10), 0.2),
+        ])
+
+    def test_settling_limits_entries(self):
+        results = monte_carlo.simulate(
+            self.calendar, self.calendar.rois[np.newaxis, :], [0.5, 1])
+
+        # 50%: A 0.5 -> 0.55; B capped by purchasing power, 0.5 -> 0.25; C 0.5 * 0.8 -> 0.48
+        # 100%: A 1 -> 1.1; B gets no purchasing power; C 1.1 -> 1.32
+        self.assertTrue(np.allclose(
+            results.final_balances, [[0.15 + 0.25 + 0.48, 1.32]]))
+        self.assertTrue(np.allclose(
+            results.max_drawdowns, [[1 - 0.8 / 1.05, 0]]))
+        self.assertFalse(results.ruined.any())
+
+    def test_sampled_simulations(self):
+        rng = np.random.default_rng(0)
+        permuted = monte_carlo.sample_rois(
+            self.calendar.rois, 1000, "permute", rng)
+        self.assertTrue(np.allclose(
+            np.sort(permuted, axis=1), np.sort(self.calendar.rois)))
+
+        results = monte_carlo.simulate(self.calendar, monte_carlo.sample_rois(
+            self.calendar.rois, 1000, "bootstrap", rng), [0.1, 0.5, 1], ruin_threshold=0.6)
+        self.assertEqual(results.final_balances.shape, (1000, 3))
+        summaries = results.summarize()
+        self.assertEqual([s["portfolio_percentage"] for s in summaries], [0.1, 0.5, 1])
+        # bigger bets, more ruin
+        self.assertEqual(summaries[0]["ruin_probability"], 0)
+        self.assertGreater(summaries[2]["ruin_probability"], 0)
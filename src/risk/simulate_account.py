@@ -1,16 +1,19 @@
 from pprint import pprint
+import collections.abc
 import copy
 
 import datetime
+import functools
+import heapq
 import itertools
 import logging
 import typing
 
+import numpy as np
 import pandas as pd
-import quantstats
 
 from src import trading_day, types
-from src.data.polygon import get_candles
+from src.data.polygon import get_candles, grouped_aggs_store
 
 #
 # Parameters to control ideal simulation (no settlement)
@@ -45,6 +48,12 @@ class IdealAccountState:
         return IdealAccountState(0, parameters, {})
 
 
+def get_order_cash_difference(simulation_parameters: SimulationParameters, order: types.FilledOrder) -> float:
+    size = abs(order.quantity)
+    return order.get_position_difference() - (simulation_parameters['commission_per_contract'] if order.is_option()
+                                              else simulation_parameters['commission_per_share']) * size - simulation_parameters['commission_per_order']
+
+
 def apply_order_to_account_state(state: IdealAccountState, order: types.FilledOrder) -> IdealAccountState:
     # update positions
     current_qty = state.positions.get(order.symbol, 0)
@@ -56,9 +65,7 @@ def apply_order_to_account_state(state: IdealAccountState, order: types.FilledOr
         del new_positions[order.symbol]
 
     # update cash
-    size = abs(order.quantity)
-    diff = order.get_position_difference() - (state.simulation_parameters['commission_per_contract'] if order.is_option()
-                                              else state.simulation_parameters['commission_per_share']) * size - state.simulation_parameters['commission_per_order']
+    diff = get_order_cash_difference(state.simulation_parameters, order)
     new_balance = round(state.cash + diff, 6)
 
     return IdealAccountState(new_balance, state.simulation_parameters, new_positions)
@@ -92,64 +99,143 @@ class SettlingAccountState:
         return self.ideal_account_state.positions
 
 
-def apply_order_to_settling_account(settling_account_state: SettlingAccountState, order: types.FilledOrder) -> list[typing.Tuple[datetime.datetime, SettlingAccountState]]:
-    # At start of day (assumed 9:30), increase purchasing power from pending cash settling
-    new_purchasing_power = settling_account_state.purchasing_power
-    new_settling_purgatory = copy.deepcopy(
-        settling_account_state.settling_purgatory)
-    new_settling_account_state = copy.deepcopy(settling_account_state)
-
-    changes: list[typing.Tuple[datetime.datetime,
-                               SettlingAccountState]] = []
-
-    # process settling purgatory before processing order
-    for settlement_datetime, settlement_usage in filter(lambda t: t[0] <= order.datetime, settling_account_state.settling_purgatory):
-        new_purchasing_power += settlement_usage
-        new_settling_purgatory = [(settlement_datetime, settlement_usage) for settlement_datetime,
-                                  settlement_usage in new_settling_purgatory if settlement_datetime > order.datetime]
-        new_settling_account_state = SettlingAccountState(
-            new_purchasing_power,
-            copy.deepcopy(new_settling_account_state.ideal_account_state),
-            new_settling_purgatory
+@functools.lru_cache(maxsize=None)
+def get_settlement_release_datetime(day: datetime.date, settlement_days: int) -> datetime.datetime:
+    settlement_release_day = trading_day.n_trading_days_ahead(
+        day, settlement_days)
+    return typing.cast(datetime.datetime, trading_day.get_market_open_on_day(settlement_release_day))
+
+
+class SettlingAccountSnapshot(SettlingAccountState):
+    """
+    State of a `SettlingAccountSimulator` at one point of its timeline. Positions are shared with later snapshots
+    until an order changes them (do not mutate), and the settling purgatory is read from the simulator's log
+    of settlements only when asked for.
+    """
+
+    def __init__(self, purchasing_power: float, ideal_account_state: IdealAccountState, settlements: list[typing.Tuple[datetime.datetime, float]], released_at: list[typing.Optional[int]], first_pending: int, settlement_count: int, event: int):
+        self.purchasing_power = purchasing_power
+        self.ideal_account_state = ideal_account_state
+        self._settlements = settlements
+        self._released_at = released_at
+        self._first_pending = first_pending
+        self._settlement_count = settlement_count
+        self._event = event
+
+    @property
+    def settling_purgatory(self) -> list[typing.Tuple[datetime.datetime, float]]:  # type: ignore
+        pending = [self._settlements[i] for i in range(self._first_pending, self._settlement_count)
+                   if self._released_at[i] is None or typing.cast(int, self._released_at[i]) > self._event]
+        # latest first
+        pending.reverse()
+        return pending
+
+
+class SettlingAccountSimulator:
+    """
+    Settling account simulated in place: pending settlements are in a heap (by release time), and settlements
+    are appended to a log, so states along the way are cheap snapshots instead of deep copies.
+
+    Yields the same timeline as `apply_order_to_settling_account`, except that settlements released before an
+    order are yielded in release order.
+    """
+
+    def __init__(self, account: SettlingAccountState):
+        self.simulation_parameters = account.ideal_account_state.simulation_parameters
+        self.cash = account.ideal_account_state.cash
+        self.purchasing_power = account.purchasing_power
+        self.positions = dict(account.ideal_account_state.positions)
+        self._positions_shared = False
+
+        # append-only log of settlements, and when (event number) they were released
+        self.settlements: list[typing.Tuple[datetime.datetime, float]] = list(
+            reversed(account.get_settling_purgatory()))
+        self.released_at: list[typing.Optional[int]] = [
+            None] * len(self.settlements)
+        self.first_pending = 0
+        self.event = 0
+        # (release datetime, index in log) of pending settlements
+        self.queue = [(settlement_datetime, i) for i, (settlement_datetime, _)
+                      in enumerate(self.settlements)]
+        heapq.heapify(self.queue)
+
+    def snapshot(self) -> SettlingAccountSnapshot:
+        self._positions_shared = True
+        return SettlingAccountSnapshot(
+            self.purchasing_power,
+            IdealAccountState(
+                self.cash, self.simulation_parameters, self.positions),
+            self.settlements, self.released_at, self.first_pending, len(
+                self.settlements), self.event,
         )
-        changes.append((settlement_datetime, new_settling_account_state))
-
-    # process order
-    cash_before = new_settling_account_state.ideal_account_state.cash
-    position_before = new_settling_account_state.ideal_account_state.positions.get(
-        order.symbol, 0)
-    new_account_state = apply_order_to_account_state(
-        new_settling_account_state.ideal_account_state, order)
-    cash_after = new_account_state.cash
-    position_after = new_account_state.positions.get(order.symbol, 0)
-
-    # depending on effect of order,
-    # update purchasing power or add to settling purgatory
-    diff = cash_after - cash_before
-
-    # TODO: research settling for short positions
-    if position_before < 0 or position_after < 0:
-        logging.warn(
-            f"Settling for short position is flawed, purchasing power is likely wrong")
-
-    if diff < 0:  # money being used
-        new_purchasing_power += diff  # deduct from purchasing power
-    else:  # money being added
-        # money is flowing in, schedule the cash to settle in the future
-        # Options settle in 1 day: https://td.intelliresponse.com/tddirectinvesting/public/index.jsp?interfaceID=19&sessionId=921723fb-d96f-11ec-b911-43daeb48e13c&id=7551&requestType=&source=9&question=settled+
-        # TODO: `1 or 2` better configuration needed(?)
-        settlement_release_day = trading_day.n_trading_days_ahead(
-            order.datetime.date(), 1 if order.is_option() else 2)
-        settlement_release_datetime = typing.cast(
-            datetime.datetime, trading_day.get_market_open_on_day(settlement_release_day))
-        new_settling_purgatory = [
-            (settlement_release_datetime, diff)] + new_settling_purgatory
-
-    return changes + [(order.datetime, SettlingAccountState(
-        new_purchasing_power,
-        new_account_state,
-        new_settling_purgatory
-    ))]
+
+    def settle_until(self, dt: datetime.datetime) -> list[typing.Tuple[datetime.datetime, SettlingAccountState]]:
+        """Releases settlements due at or before `dt` into purchasing power."""
+        changes: list[typing.Tuple[datetime.datetime,
+                                   SettlingAccountState]] = []
+        while self.queue and self.queue[0][0] <= dt:
+            settlement_datetime, i = heapq.heappop(self.queue)
+            self.event += 1
+            self.purchasing_power += self.settlements[i][1]
+            self.released_at[i] = self.event
+            while self.first_pending < len(self.settlements) and self.released_at[self.first_pending] is not None:
+                self.first_pending += 1
+            changes.append((settlement_datetime, self.snapshot()))
+        return changes
+
+    def settle_all(self) -> list[typing.Tuple[datetime.datetime, SettlingAccountState]]:
+        if not self.queue:
+            return []
+        return self.settle_until(max(self.queue)[0])
+
+    def apply_order(self, order: types.FilledOrder) -> list[typing.Tuple[datetime.datetime, SettlingAccountState]]:
+        # At start of day (assumed 9:30), increase purchasing power from pending cash settling
+        changes = self.settle_until(order.datetime)
+        self.event += 1
+
+        # process order
+        if self._positions_shared:
+            self.positions = dict(self.positions)
+            self._positions_shared = False
+        position_before = self.positions.get(order.symbol, 0)
+        position_after = position_before + order.quantity
+        if position_after == 0:
+            self.positions.pop(order.symbol, None)
+        else:
+            self.positions[order.symbol] = position_after
+
+        cash_before = self.cash
+        self.cash = round(
+            self.cash + get_order_cash_difference(self.simulation_parameters, order), 6)
+
+        # depending on effect of order,
+        # update purchasing power or add to settling purgatory
+        diff = self.cash - cash_before
+
+        # TODO: research settling for short positions
+        if position_before < 0 or position_after < 0:
+            logging.warn(
+                f"Settling for short position is flawed, purchasing power is likely wrong")
+
+        if diff < 0:  # money being used
+            self.purchasing_power += diff  # deduct from purchasing power
+        else:  # money being added
+            # money is flowing in, schedule the cash to settle in the future
+            # Options settle in 1 day: https://td.intelliresponse.com/tddirectinvesting/public/index.jsp?interfaceID=19&sessionId=921723fb-d96f-11ec-b911-43daeb48e13c&id=7551&requestType=&source=9&question=settled+
+            # TODO: `1 or 2` better configuration needed(?)
+            settlement_release_datetime = get_settlement_release_datetime(
+                order.datetime.date(), 1 if order.is_option() else 2)
+            heapq.heappush(self.queue, (settlement_release_datetime, len(self.settlements)))
+            self.settlements.append((settlement_release_datetime, diff))
+            self.released_at.append(None)
+
+        changes.append((order.datetime, self.snapshot()))
+        return changes
+
+
+def apply_order_to_settling_account(settling_account_state: SettlingAccountState, order: types.FilledOrder) -> list[typing.Tuple[datetime.datetime, SettlingAccountState]]:
+    return SettlingAccountSimulator(settling_account_state).apply_order(order)
+
 
 #
 # Account value estimation
@@ -214,37 +300,101 @@ def simulate_ideal_account(orders: typing.Iterator[types.FilledOrder], initial_a
 
 
 def simulate_settling_account(orders: typing.Iterator[types.FilledOrder], initial_ideal_account: IdealAccountState) -> typing.Iterator[typing.Tuple[datetime.datetime, SettlingAccountState]]:
-    initial_account = SettlingAccountState(
-        0, initial_ideal_account, [])
-    account = copy.deepcopy(initial_account)
+    simulator = SettlingAccountSimulator(SettlingAccountState(
+        0, initial_ideal_account, []))
     for order in orders:
-        changes = apply_order_to_settling_account(
-            account, order)
-        for change in changes:
-            dt, intermediate_account_state = change
-            yield dt, intermediate_account_state
-        account = changes[-1][1]
+        yield from simulator.apply_order(order)
 
     # play out the rest of purgatory
-    time_of_last_remaining_settlement = max(
-        account.get_settling_purgatory())[0]
-    remaining_settlement_changes = apply_order_to_settling_account(account, types.FilledOrder(
-        intention=None, symbol="", quantity=0, price=0, datetime=time_of_last_remaining_settlement + datetime.timedelta(seconds=1)))
-    for change in remaining_settlement_changes:
-        dt, intermediate_account_state = change
-        yield dt, intermediate_account_state
+    yield from simulator.settle_all()
+
+
+def fetch_closes(symbol: str, days: list[datetime.date]) -> dict[datetime.date, float]:
+    """
+    Closes of `symbol` on `days` (leaving out days without a candle, like holidays),
+    reading candles once per run of consecutive trading days.
+    """
+    closes: dict[datetime.date, float] = {}
+    runs: list[list[datetime.date]] = []
+    for day in sorted(days):
+        if runs and trading_day.next_trading_day(runs[-1][-1]) >= day:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+
+    for run in runs:
+        results_by_day = get_candles.get_raw_candles_by_day(
+            symbol, "D", run[0], run[-1])
+        for day in run:
+            raw_candles = (results_by_day.get(day) or {}).get("results")
+            if raw_candles:
+                closes[day] = raw_candles[-1]["c"]
+    return closes
+
+
+def get_closes_matrix(days: list[datetime.date], symbols: list[str], needed: np.ndarray) -> np.ndarray:
+    """
+    day x symbol matrix of closes where `needed` (NaN elsewhere and where there is no candle, like holidays).
+    Closes are read from the grouped aggs store, only missing ones (e.g. options, days not in the store)
+    are read from daily candles, see `fetch_closes`.
+    """
+    prices = np.full((len(days), len(symbols)), np.nan)
+    resolved = ~needed
+
+    store = grouped_aggs_store.get_store()
+    store_day_positions = [i for i, day in enumerate(
+        days) if store and store.is_fresh(day)]
+    if store and store_day_positions:
+        day_indexes = np.array(
+            [store.day_to_index[days[i]] for i in store_day_positions], dtype=np.int64)
+        rows = store.get_rows(day_indexes, store.get_symbol_ids(symbols)).T
+        present = rows >= 0
+        closes = np.full(rows.shape, np.nan)
+        closes[present] = store.columns["c"][rows[present]]
+        prices[store_day_positions] = closes
+        resolved[store_day_positions] |= present
+        # holidays have no close to look for
+        for i in store_day_positions:
+            if not store.has_results[store.day_to_index[days[i]]]:
+                resolved[i] = True
+
+    day_index = {day: i for i, day in enumerate(days)}
+    for symbol_index, symbol in enumerate(symbols):
+        missing_days = [days[i] for i in np.flatnonzero(~resolved[:, symbol_index])]
+        if not missing_days:
+            continue
+        for day, close in fetch_closes(symbol, missing_days).items():
+            prices[day_index[day], symbol_index] = close
+    return prices
 
 
 def value_at_close_every_day(settling_simulation: typing.Iterable[tuple[datetime.datetime, SettlingAccountState]]) -> typing.Iterator[typing.Tuple[datetime.date, float]]:
-    for dt, account_state in simulate_account_every_close(iter(settling_simulation)):
-        try:
-            value = estimate_account_value(
-                account_state.ideal_account_state, dt.date())
-            yield dt.date(), value
-        except HolidayError:
-            # exclude holidays from valuation iterable
-            # (so we actually get 252 trading days worth of valuation)
-            pass
+    close_states = [(dt.date(), account_state.ideal_account_state) for dt, account_state in simulate_account_every_close(
+        iter(settling_simulation))]
+    if not close_states:
+        return
+
+    # day x symbol matrices of positions held at close and closing prices (NaN if no candle)
+    symbols = sorted({symbol for _, state in close_states for symbol in state.positions})
+    symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+    positions = np.zeros((len(close_states), len(symbols)))
+    for i, (_day, state) in enumerate(close_states):
+        for symbol, size in state.positions.items():
+            positions[i, symbol_index[symbol]] = size
+
+    held = positions != 0
+    prices = get_closes_matrix([day for day, _ in close_states], symbols, held)
+
+    multipliers = np.array(
+        [100 if symbol.startswith("O:") else 1 for symbol in symbols], dtype=float)
+    position_values = (positions * np.where(held, prices, 0)) @ multipliers
+    # exclude holidays from valuation iterable
+    # (so we actually get 252 trading days worth of valuation)
+    is_holiday = (held & np.isnan(prices)).any(axis=1)
+
+    for i, (day, state) in enumerate(close_states):
+        if not is_holiday[i]:
+            yield day, state.cash + float(position_values[i])
 
 
 class Simulation:
@@ -283,243 +433,193 @@ class Simulation:
         return self.get_values().pct_change().dropna()
 
 
-def settling_stats_for_orders(orders: list[types.FilledOrder], initial_account: IdealAccountState, risk_free_rate: float = 0.02) -> dict:
-    # TODO: this is very geometric-oriented
-    # TODO: make a script to adjust arithmetic trades (fixed shares or fixed value) to scale percentage-wise with portfolio
-    stats = {}
-    stats['orders'] = len(orders)
-
-    simulation = Simulation.from_orders(orders, initial_account)
-
-    # set initial balance to be just enough to make all purchases
-    initial_balance = simulation.get_ideal_initial_balance()
-    stats['initial_balance'] = initial_balance
-
-    pnl = simulation.get_final_pnl()
-    stats['pnl'] = pnl
-
-    final_balance = pnl + initial_balance
-    stats['final_balance'] = final_balance
-
-    total_roi = pnl / initial_balance
-    stats['total_roi'] = total_roi
-
-    usage = sum(o.price * o.quantity for o in orders if o.is_buy())
-    stats['usage'] = usage
-    stats['huff_puff_ratio'] = pnl / usage
-
-    # Idea: pnl is good, usage is bad because it represents risk and work and effort
-    # So use it as a ratio like Sharpe or Sortino or whatever
-    # Here, however, the units are different.
-    # Not sure what good ranges are yet, but higher is better usually
-
-    values = simulation.get_values()
-    returns = values.pct_change()
-
-    # TODO: get start, end from metadata
-    start = values.index[0]
-    end = values.index[-1]
-    stats['start'] = start.to_pydatetime().date()
-    stats['end'] = end.to_pydatetime().date()
-    stats['days'] = len(values)
-
-    stats['quantstats'] = {}
-    # stats['quantstats']['autocorr_penalty'] = quantstats.stats.autocorr_penalty(
-    #     returns) # TODO: why returns NaN?
-    stats['quantstats']['average_losing_day_roi'] = quantstats.stats.avg_loss(
-        returns, 'day')
-    stats['quantstats']['average_losing_week_roi'] = quantstats.stats.avg_loss(
-        returns, 'week')
-    stats['quantstats']['average_losing_month_roi'] = quantstats.stats.avg_loss(
-        returns, 'month')
-    stats['quantstats']['average_losing_quarter_roi'] = quantstats.stats.avg_loss(
-        returns, 'quarter')
-    stats['quantstats']['average_losing_year_roi'] = quantstats.stats.avg_loss(
-        returns, 'year')
-    stats['quantstats']['average_day_return'] = quantstats.stats.avg_return(
-        returns, 'day')
-    stats['quantstats']['average_week_return'] = quantstats.stats.avg_return(
-        returns, 'week')
-    stats['quantstats']['average_month_return'] = quantstats.stats.avg_return(
-        returns, 'month')
-    stats['quantstats']['average_quarter_return'] = quantstats.stats.avg_return(
-        returns, 'quarter')
-    stats['quantstats']['average_year_return'] = quantstats.stats.avg_return(
-        returns, 'year')
-    stats['quantstats']['average_winning_day_roi'] = quantstats.stats.avg_win(
-        returns, 'day')
-    stats['quantstats']['average_winning_week_roi'] = quantstats.stats.avg_win(
-        returns, 'week')
-    stats['quantstats']['average_winning_month_roi'] = quantstats.stats.avg_win(
-        returns, 'month')
-    stats['quantstats']['average_winning_quarter_roi'] = quantstats.stats.avg_win(
-        returns, 'quarter')
-    stats['quantstats']['average_winning_year_roi'] = quantstats.stats.avg_win(
-        returns, 'year')
-    stats['quantstats']['best_day_roi'] = quantstats.stats.best(
-        returns, "day")
-    stats['quantstats']['best_week_roi'] = quantstats.stats.best(
-        returns, "week")
-    stats['quantstats']['best_month_roi'] = quantstats.stats.best(
-        returns, "month")
-    stats['quantstats']['best_quarter_roi'] = quantstats.stats.best(
-        returns, "quarter")
-    stats['quantstats']['best_year_roi'] = quantstats.stats.best(
-        returns, "year")
-    stats['quantstats']['cagr'] = quantstats.stats.cagr(
-        returns, rf=risk_free_rate)
-    stats['quantstats']['calmar_ratio'] = quantstats.stats.calmar(
-        returns)  # cagr / max drawdown
-    stats['quantstats']['common_sense_ratio'] = quantstats.stats.common_sense_ratio(
-        returns)  # profit factor * tail ratio (combined on-base and home-run stats)
-    stats['quantstats']['compounded_returns_total'] = quantstats.stats.comp(
-        returns)  # TODO: revisit; seems like total_roi, not sure where compounding comes in
-    stats['quantstats']['conditional_value_at_risk'] = quantstats.stats.conditional_value_at_risk(
-        returns)  # percent of portfolio at risk to big losses (95% confidence)
+#
+# Stats (computed lazily)
+#
+
+
+class LazyStats(collections.abc.Mapping):
+    """
+    Stats computed on first access, then memoized. Values can be `LazyStats` themselves (nested stats).
+    """
+
+    def __init__(self, metrics: dict[str, typing.Callable[[], typing.Any]]):
+        self._metrics = metrics
+        self._values: dict[str, typing.Any] = {}
+
+    def __getitem__(self, key: str) -> typing.Any:
+        if key not in self._values:
+            self._values[key] = self._metrics[key]()
+        return self._values[key]
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._metrics)
+
+    def __len__(self) -> int:
+        return len(self._metrics)
+
+    def to_dict(self) -> dict:
+        """Computes every stat."""
+        return {key: value.to_dict() if isinstance(value, LazyStats) else value for key, value in self.items()}
+
+
+PERIODS = ['day', 'week', 'month', 'quarter', 'year']
+
+
+class ReturnsByPeriod:
+    """
+    Returns prepared and aggregated by each period once,
+    instead of each quantstats metric preparing and resampling them again.
+    """
+
+    def __init__(self, returns: pd.Series):
+        import quantstats  # slow to import, only needed for stats
+        self._utils = quantstats.utils
+        self.returns = self._utils._prepare_returns(returns)
+        self._by_period: dict[str, pd.Series] = {}
+
+    def get(self, period: str) -> pd.Series:
+        if period not in self._by_period:
+            self._by_period[period] = self._utils.aggregate_returns(
+                self.returns, period)
+        return self._by_period[period]
+
+
+def build_quantstats_stats(returns: pd.Series, risk_free_rate: float = 0.02) -> LazyStats:
+    import quantstats  # slow to import, only needed for stats
+    qs = quantstats.stats
+    returns_by_period = ReturnsByPeriod(returns)
+
+    metrics: dict[str, typing.Callable[[], typing.Any]] = {}
+
+    def add_by_period(key_template: str, metric: typing.Callable):
+        # metric of returns aggregated by period (like `metric(returns, period)`)
+        for period in PERIODS:
+            metrics[key_template.format(period=period)] = functools.partial(
+                lambda period: metric(returns_by_period.get(period), prepare_returns=False), period)
+
+    add_by_period('average_losing_{period}_roi', qs.avg_loss)
+    add_by_period('average_{period}_return', qs.avg_return)
+    add_by_period('average_winning_{period}_roi', qs.avg_win)
+    add_by_period('best_{period}_roi', qs.best)
+    # autocorr_penalty: TODO: why returns NaN?
+    metrics['cagr'] = lambda: qs.cagr(returns, rf=risk_free_rate)
+    # cagr / max drawdown
+    metrics['calmar_ratio'] = lambda: qs.calmar(returns)
+    # profit factor * tail ratio (combined on-base and home-run stats)
+    metrics['common_sense_ratio'] = lambda: qs.common_sense_ratio(returns)
+    # TODO: revisit; seems like total_roi, not sure where compounding comes in
+    metrics['compounded_returns_total'] = lambda: qs.comp(returns)
+    # percent of portfolio at risk to big losses (95% confidence)
     # AKA cvar, expected_shortfall
-    stats['quantstats']['consecutive_losing_days_max'] = quantstats.stats.consecutive_losses(
-        returns, 'day')
-    stats['quantstats']['consecutive_losing_weeks_max'] = quantstats.stats.consecutive_losses(
-        returns, 'week')
-    stats['quantstats']['consecutive_losing_months_max'] = quantstats.stats.consecutive_losses(
-        returns, 'month')
-    stats['quantstats']['consecutive_losing_quarters_max'] = quantstats.stats.consecutive_losses(
-        returns, 'quarter')
-    stats['quantstats']['consecutive_losing_years_max'] = quantstats.stats.consecutive_losses(
-        returns, 'year')
-    stats['quantstats']['consecutive_winning_days_max'] = quantstats.stats.consecutive_wins(
-        returns, 'day')
-    stats['quantstats']['consecutive_winning_weeks_max'] = quantstats.stats.consecutive_wins(
-        returns, 'week')
-    stats['quantstats']['consecutive_winning_months_max'] = quantstats.stats.consecutive_wins(
-        returns, 'month')
-    stats['quantstats']['consecutive_winning_quarters_max'] = quantstats.stats.consecutive_wins(
-        returns, 'quarter')
-    stats['quantstats']['consecutive_winning_years_max'] = quantstats.stats.consecutive_wins(
-        returns, 'year')
-    # stats['quantstats']['cpc_index'] = quantstats.stats.cpc_index(
-    #     returns)  # TODO: what does this mean? (I know how to calc)
+    metrics['conditional_value_at_risk'] = lambda: qs.conditional_value_at_risk(
+        returns)
+    add_by_period('consecutive_losing_{period}s_max', qs.consecutive_losses)
+    add_by_period('consecutive_winning_{period}s_max', qs.consecutive_wins)
+    # cpc_index: TODO: what does this mean? (I know how to calc)
     # sounds like it's only useful in relation to itself
 
     # expected_return is same as geometric_mean, ghpr
-    stats['quantstats']['expected_return_day'] = quantstats.stats.expected_return(
-        returns, 'day')
-    stats['quantstats']['expected_return_week'] = quantstats.stats.expected_return(
-        returns, 'week')
-    stats['quantstats']['expected_return_month'] = quantstats.stats.expected_return(
-        returns, 'month')
-    stats['quantstats']['expected_return_quarter'] = quantstats.stats.expected_return(
-        returns, 'quarter')
-    stats['quantstats']['expected_return_year'] = quantstats.stats.expected_return(
-        returns, 'year')
-    stats['quantstats']['exposure'] = quantstats.stats.exposure(
-        returns)  # days we play (non-0 returns)
-    stats['quantstats']['gain_to_pain_ratio'] = quantstats.stats.gain_to_pain_ratio(
-        returns)  # sum(returns) / sum(losses)
-
-    stats['quantstats']['kelly_criterion'] = quantstats.stats.kelly_criterion(
-        returns)  # NOTE: sounds like this is flawed, quantfiction.com, he likes "Ideal f" a bit more
+    add_by_period('expected_return_{period}', qs.expected_return)
+    # days we play (non-0 returns)
+    metrics['exposure'] = lambda: qs.exposure(returns)
+    # sum(returns) / sum(losses)
+    metrics['gain_to_pain_ratio'] = lambda: qs.gain_to_pain_ratio(returns)
+    # NOTE: sounds like this is flawed, quantfiction.com, he likes "Ideal f" a bit more
     # TODO: calculate "Ideal f"
-    stats['quantstats']['kurtosis'] = quantstats.stats.kurtosis(
-        returns)  # TODO: plot the distribution
-    stats['quantstats']['max_drawdown'] = quantstats.stats.max_drawdown(
-        returns)
-    stats['quantstats']['outlier_loss_ratio'] = quantstats.stats.outlier_loss_ratio(
-        returns)  # if 3, means 1st percentile losses are 3x worse than average loss. (high -> disasters)
-    stats['quantstats']['outlier_win_ratio'] = quantstats.stats.outlier_win_ratio(
-        returns)  # if 3, means 99th percentile wins are 3x bigger than average win. (high -> home runs)
-    stats['quantstats']['payoff_ratio'] = quantstats.stats.payoff_ratio(
-        returns)  # average win / average loss; aka win_loss_ratio
-    stats['quantstats']['profit_factor'] = quantstats.stats.profit_factor(
-        returns)  # sum(wins) / sum(losses); you want >1
-    # stats['quantstats']['profit_ratio'] = quantstats.stats.profit_ratio(
-    #     returns)  # TODO: why computes same as profit_factor?
-    # stats['quantstats']['rar'] = quantstats.stats.rar(
-    #     returns, rf=risk_free_rate)  # TODO: poorly explained?
-    # stats['quantstats']['recovery_factor'] = quantstats.stats.recovery_factor(
-    #     returns)  # TODO: poorly explained?
-    stats['quantstats']['risk_of_ruin'] = quantstats.stats.risk_of_ruin(
-        returns)  # probabiliy 0-1 (AKA 'ror')
-    stats['quantstats']['risk_return_ratio'] = quantstats.stats.risk_return_ratio(
-        returns)  # (sharpe sans risk-free-rate)
-    stats['quantstats']['serenity_index'] = quantstats.stats.serenity_index(
-        returns, rf=typing.cast(int, risk_free_rate))  # higher is better; returns / penalized risk
+    metrics['kelly_criterion'] = lambda: qs.kelly_criterion(returns)
+    # TODO: plot the distribution
+    metrics['kurtosis'] = lambda: qs.kurtosis(returns)
+    metrics['max_drawdown'] = lambda: qs.max_drawdown(returns)
+    # if 3, means 1st percentile losses are 3x worse than average loss. (high -> disasters)
+    metrics['outlier_loss_ratio'] = lambda: qs.outlier_loss_ratio(returns)
+    # if 3, means 99th percentile wins are 3x bigger than average win. (high -> home runs)
+    metrics['outlier_win_ratio'] = lambda: qs.outlier_win_ratio(returns)
+    # average win / average loss; aka win_loss_ratio
+    metrics['payoff_ratio'] = lambda: qs.payoff_ratio(returns)
+    # sum(wins) / sum(losses); you want >1
+    metrics['profit_factor'] = lambda: qs.profit_factor(returns)
+    # profit_ratio: TODO: why computes same as profit_factor?
+    # rar, recovery_factor: TODO: poorly explained?
+    # probabiliy 0-1 (AKA 'ror')
+    metrics['risk_of_ruin'] = lambda: qs.risk_of_ruin(returns)
+    # (sharpe sans risk-free-rate)
+    metrics['risk_return_ratio'] = lambda: qs.risk_return_ratio(returns)
+    # higher is better; returns / penalized risk
     # 16 https://www.keyquant.com/Download/GetFile?Filename=%5CPublications%5CKeyQuant_WhitePaper_APT_Part1.pdf
     # "better sharpe" (my words)
-    stats['quantstats']['sharpe'] = quantstats.stats.sharpe(
-        returns, rf=risk_free_rate)
+    metrics['serenity_index'] = lambda: qs.serenity_index(
+        returns, rf=typing.cast(int, risk_free_rate))
     # returns / volatility (stddev of returns; not too helpful)
-    stats['quantstats']['skew'] = quantstats.stats.skew(returns)
+    metrics['sharpe'] = lambda: qs.sharpe(returns, rf=risk_free_rate)
     # more skew means more crazy
-    stats['quantstats']['smart_sharpe'] = quantstats.stats.smart_sharpe(
-        returns, rf=risk_free_rate)  # weighs big drawdowns more
-    # stats['quantstats']['smart_sortino'] = quantstats.stats.smart_sortino(
-    #     returns, rf=typing.cast(int, risk_free_rate))
-    #     # TODO: cannot find explanation for smart_sortino
-    stats['quantstats']['sortino'] = quantstats.stats.sortino(
-        returns, rf=typing.cast(int, risk_free_rate))
+    metrics['skew'] = lambda: qs.skew(returns)
+    # weighs big drawdowns more
+    metrics['smart_sharpe'] = lambda: qs.smart_sharpe(
+        returns, rf=risk_free_rate)
+    # smart_sortino: TODO: cannot find explanation for smart_sortino
     # like sharpe but uses stddev of downside (not all returns);
-    stats['quantstats']['tail_ratio'] = quantstats.stats.tail_ratio(
-        returns)  # >1 means upside crazy is better than downside crazy
-    stats['quantstats']['ulcer_index'] = quantstats.stats.ulcer_index(
-        returns)  # lower is better for risk; 0-1. "quadratic mean of drawdowns"
-    # Page 11-12 https://www.keyquant.com/Download/GetFile?Filename=%5CPublications%5CKeyQuant_WhitePaper_APT_Part1.pdf
-    # stats['quantstats']['ulcer_performance_index'] = quantstats.stats.ulcer_performance_index(
-    #     returns, rf=typing.cast(int, risk_free_rate))  # TODO: find explanation, none given
-    stats['quantstats']['upi'] = quantstats.stats.upi(
+    metrics['sortino'] = lambda: qs.sortino(
         returns, rf=typing.cast(int, risk_free_rate))
+    # >1 means upside crazy is better than downside crazy
+    metrics['tail_ratio'] = lambda: qs.tail_ratio(returns)
+    # lower is better for risk; 0-1. "quadratic mean of drawdowns"
+    # Page 11-12 https://www.keyquant.com/Download/GetFile?Filename=%5CPublications%5CKeyQuant_WhitePaper_APT_Part1.pdf
+    metrics['ulcer_index'] = lambda: qs.ulcer_index(returns)
+    # ulcer_performance_index: TODO: find explanation, none given
     # sharpe-like but volatility=ulcer index (path-aware)
-    stats['quantstats']['value_at_risk'] = quantstats.stats.value_at_risk(
-        returns)  # % of investment at risk (95% confidence) on a given day
+    metrics['upi'] = lambda: qs.upi(
+        returns, rf=typing.cast(int, risk_free_rate))
+    # % of investment at risk (95% confidence) on a given day
     # AKA var
-    stats['quantstats']['volatility'] = quantstats.stats.volatility(
-        returns)
-    stats['quantstats']['win_rate_day'] = quantstats.stats.win_rate(
-        returns, 'day')
-    stats['quantstats']['win_rate_week'] = quantstats.stats.win_rate(
-        returns, 'week')
-    stats['quantstats']['win_rate_month'] = quantstats.stats.win_rate(
-        returns, 'month')
-    stats['quantstats']['win_rate_quarter'] = quantstats.stats.win_rate(
-        returns, 'quarter')
-    stats['quantstats']['win_rate_year'] = quantstats.stats.win_rate(
-        returns, 'year')
-
-    stats['quantstats']['worst_day_roi'] = quantstats.stats.worst(
-        returns, 'day')
-    stats['quantstats']['worst_week_roi'] = quantstats.stats.worst(
-        returns, 'week')
-    stats['quantstats']['worst_month_roi'] = quantstats.stats.worst(
-        returns, 'month')
-    stats['quantstats']['worst_quarter_roi'] = quantstats.stats.worst(
-        returns, 'quarter')
-    stats['quantstats']['worst_year_roi'] = quantstats.stats.worst(
-        returns, 'year')
+    metrics['value_at_risk'] = lambda: qs.value_at_risk(returns)
+    metrics['volatility'] = lambda: qs.volatility(returns)
+    add_by_period('win_rate_{period}', qs.win_rate)
+    add_by_period('worst_{period}_roi', qs.worst)
 
     # TODO: try plotting/playing with these
-    # stats['quantstats']['to_drawdown_series'] = quantstats.stats.to_drawdown_series(returns)
-    # stats['quantstats']['compsum'] = quantstats.stats.compsum(returns)
-    # stats['quantstats']['distribution'] = quantstats.stats.distribution(
-    #     returns)
-    # stats['quantstats']['drawdown_details'] = quantstats.stats.drawdown_details(
-    #     returns)
-    # stats['quantstats']['implied_volatility'] = quantstats.stats.implied_volatility(
-    #     returns) # all NaN
-    # TODO: get this somewhere?
-    # stats['quantstats']['monthly_returns'] = quantstats.stats.monthly_returns(
-    #     returns)
-    # stats['quantstats']['outliers'] = quantstats.stats.outliers(returns)
-    # stats['quantstats']['remove_outliers'] = quantstats.stats.remove_outliers(
-    #     returns)
-    # stats['quantstats']['rolling_sharpe'] = quantstats.stats.rolling_sharpe(
-    #     returns)
-    # stats['quantstats']['rolling_sortino'] = quantstats.stats.rolling_sortino(
-    #     returns)
-    # stats['quantstats']['rolling_volatility'] = quantstats.stats.rolling_volatility(
-    #     returns)
+    # to_drawdown_series, compsum, distribution, drawdown_details, implied_volatility (all NaN)
+    # TODO: get this somewhere? monthly_returns
+    # outliers, remove_outliers, rolling_sharpe, rolling_sortino, rolling_volatility
+    return LazyStats(metrics)
+
+
+def settling_stats(orders: list[types.FilledOrder], initial_account: IdealAccountState, risk_free_rate: float = 0.02) -> LazyStats:
+    """Stats of `orders` in a settling account, each computed when first accessed."""
+    # TODO: this is very geometric-oriented
+    # TODO: make a script to adjust arithmetic trades (fixed shares or fixed value) to scale percentage-wise with portfolio
+    get_simulation = functools.lru_cache(maxsize=None)(
+        lambda: Simulation.from_orders(orders, initial_account))
+    get_values = functools.lru_cache(maxsize=None)(
+        lambda: get_simulation().get_values())
+
+    stats: LazyStats
+    stats = LazyStats({
+        'orders': lambda: len(orders),
+        # set initial balance to be just enough to make all purchases
+        'initial_balance': lambda: get_simulation().get_ideal_initial_balance(),
+        'pnl': lambda: get_simulation().get_final_pnl(),
+        'final_balance': lambda: stats['pnl'] + stats['initial_balance'],
+        'total_roi': lambda: stats['pnl'] / stats['initial_balance'],
+        'usage': lambda: sum(o.price * o.quantity for o in orders if o.is_buy()),
+        # Idea: pnl is good, usage is bad because it represents risk and work and effort
+        # So use it as a ratio like Sharpe or Sortino or whatever
+        # Here, however, the units are different.
+        # Not sure what good ranges are yet, but higher is better usually
+        'huff_puff_ratio': lambda: stats['pnl'] / stats['usage'],
+        # TODO: get start, end from metadata
+        'start': lambda: get_values().index[0].to_pydatetime().date(),
+        'end': lambda: get_values().index[-1].to_pydatetime().date(),
+        'days': lambda: len(get_values()),
+        'quantstats': lambda: build_quantstats_stats(get_values().pct_change(), risk_free_rate=risk_free_rate),
+    })
     return stats
 
 
+def settling_stats_for_orders(orders: list[types.FilledOrder], initial_account: IdealAccountState, risk_free_rate: float = 0.02) -> dict:
+    return settling_stats(orders, initial_account, risk_free_rate).to_dict()
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser()
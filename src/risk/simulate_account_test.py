@@ -0,0 +1,184 @@
+import datetime
+import importlib.util
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from src import types
+from src.caching.basics import read_json_cache, write_json_cache
+from src.data.polygon import get_candles, grouped_aggs_store
+from src.risk import simulate_account
+from src.trading_day import MARKET_TIMEZONE
+
+
+def order(symbol: str, quantity: float, price: float, dt: datetime.datetime) -> types.FilledOrder:
+    return types.FilledOrder(intention=None, symbol=symbol, quantity=quantity, price=price, datetime=dt)
+
+
+def at(day: int, hour: int, minute: int = 0) -> datetime.datetime:
+    # 2022-01-03 is a Monday
+    return datetime.datetime(2022, 1, day, hour, minute, tzinfo=MARKET_TIMEZONE)
+
+
+class TestSettlingAccountSimulator(unittest.TestCase):
+    def setUp(self):
+        self.initial_account = simulate_account.IdealAccountState.empty(
+            simulate_account.build_td_simulation())
+
+    def test_settles_sells_two_trading_days_later(self):
+        orders = [
+            order("AAPL", 10, 100, at(3, 10)),
+            order("AAPL", -10, 110, at(3, 11)),
+            order("MSFT", 5, 100, at(4, 10)),
+            order("MSFT", -5, 90, at(5, 10)),
+        ]
+        timeline = list(simulate_account.simulate_settling_account(
+            iter(orders), self.initial_account))
+
+        self.assertEqual([dt for dt, _ in timeline], [
+            at(3, 10), at(3, 11), at(4, 10), at(5, 9, 30), at(5, 10), at(7, 9, 30)])
+        self.assertEqual([state.get_purchasing_power() for _, state in timeline], [
+            -1000, -1000, -1500, -400, -400, 50])
+        self.assertEqual([state.get_settling_cash_amount() for _, state in timeline], [
+            0, 1100, 1100, 0, 450, 0])
+        self.assertEqual(timeline[3][1].get_settling_purgatory(), [])
+        self.assertEqual(timeline[4][1].get_settling_purgatory(), [
+                         (at(7, 9, 30), 450)])
+        self.assertEqual(timeline[1][1].get_positions(), {})
+        self.assertEqual(timeline[2][1].get_positions(), {"MSFT": 5})
+        self.assertEqual(timeline[-1][1].get_cash(), 50)
+
+    def test_matches_applying_orders_one_state_at_a_time(self):
+        rng = random.Random(0)
+        symbols = ["A", "B", "C", "O:C1"]
+        positions = {symbol: 0 for symbol in symbols}
+        orders = []
+        dt = at(3, 9, 31)
+        for _ in range(500):
+            dt += datetime.timedelta(minutes=rng.randint(1, 300))
+            if dt.weekday() >= 5:
+                continue
+            symbol = rng.choice(symbols)
+            quantity = -positions[symbol] if positions[symbol] else rng.randint(1, 10)
+            positions[symbol] += quantity
+            orders.append(order(symbol, quantity, rng.uniform(1, 10), dt))
+
+        simulator = simulate_account.SettlingAccountSimulator(
+            simulate_account.SettlingAccountState(0, self.initial_account, []))
+        state = simulate_account.SettlingAccountState(
+            0, self.initial_account, [])
+        for o in orders:
+            changes = simulator.apply_order(o)
+            expected_changes = simulate_account.apply_order_to_settling_account(
+                state, o)
+            self.assertEqual([dt for dt, _ in changes], [
+                             dt for dt, _ in expected_changes])
+            state = expected_changes[-1][1]
+            actual = changes[-1][1]
+            self.assertAlmostEqual(actual.get_purchasing_power(),
+                                   state.get_purchasing_power())
+            self.assertEqual(actual.get_cash(), state.get_cash())
+            self.assertEqual(actual.get_positions(), state.get_positions())
+            self.assertEqual(sorted(actual.get_settling_purgatory()),
+                             sorted(state.get_settling_purgatory()))
+
+
+class TestValueAtCloseEveryDay(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        cache_dir = self.tmp_dir.name
+        os.makedirs(os.path.join(cache_dir, "polygon", "grouped_aggs"))
+        os.makedirs(os.path.join(cache_dir, "polygon", "candles"))
+        self.patcher = mock.patch(
+            "src.caching.basics.get_paths", return_value={"data": {"cache": {"dir": cache_dir}}})
+        self.patcher.start()
+        grouped_aggs_store._loaded_store = None
+
+    def tearDown(self):
+        self.patcher.stop()
+        grouped_aggs_store._loaded_store = None
+        self.tmp_dir.cleanup()
+
+    def test_values_positions_at_close(self):
+        # stocks' closes are in the grouped aggs store, 2022-01-05 treated as a holiday
+        for day, close in [(datetime.date(2022, 1, 3), 101), (datetime.date(2022, 1, 4), 102)]:
+            write_json_cache(grouped_aggs_store.get_grouped_aggs_cache_key(day), {
+                             "status": "OK", "results": [{"T": "AAPL", "c": close}]})
+        write_json_cache(grouped_aggs_store.get_grouped_aggs_cache_key(
+            datetime.date(2022, 1, 5)), {"status": "OK", "queryCount": 0})
+        grouped_aggs_store.build_store()
+        # options' and days not (yet) in the store are in daily candles
+        for symbol, day, close in [
+            ("AAPL", datetime.date(2022, 1, 6), 104),
+            ("O:AAPL220121C00100000", datetime.date(2022, 1, 4), 1.5),
+        ]:
+            write_json_cache(f"polygon/candles/{symbol}_D_{day}", {
+                             "status": "OK", "results": [{"c": close}]})
+
+        orders = [
+            order("AAPL", 10, 100, at(3, 10)),
+            order("O:AAPL220121C00100000", 1, 1, at(4, 10)),
+            order("O:AAPL220121C00100000", -1, 2, at(5, 10)),
+            order("AAPL", -10, 105, at(7, 10)),
+        ]
+        timeline = list(simulate_account.simulate_settling_account(
+            iter(orders), simulate_account.IdealAccountState.empty(simulate_account.build_td_simulation())))
+
+        with mock.patch.object(get_candles, "read_json_cache", wraps=read_json_cache) as read_candles:
+            values = list(simulate_account.value_at_close_every_day(timeline))
+
+        commission = 0.75
+        self.assertEqual(values, [
+            (datetime.date(2022, 1, 3), -1000 + 1010),
+            (datetime.date(2022, 1, 4), -1001 - commission + 1020 + 150),
+            (datetime.date(2022, 1, 6), -999 - 2 * commission + 1040),
+            # nothing held, no closes needed
+            (datetime.date(2022, 1, 7), 51 - 2 * commission),
+            (datetime.date(2022, 1, 10), 51 - 2 * commission),
+        ])
+        # daily candles are only read for closes missing from the store
+        self.assertEqual(sorted(call.args[0] for call in read_candles.call_args_list), [
+            "polygon/candles/AAPL_D_2022-01-06",
+            "polygon/candles/O:AAPL220121C00100000_D_2022-01-04",
+        ])
+
+
+class TestStats(unittest.TestCase):
+    def test_lazy_stats_compute_once_on_access(self):
+        calls = []
+        stats = simulate_account.LazyStats({
+            "a": lambda: calls.append("a") or 1,
+            "b": lambda: calls.append("b") or stats["a"] + 1,
+            "nested": lambda: simulate_account.LazyStats({"c": lambda: 3}),
+        })
+        self.assertEqual(stats["b"], 2)
+        self.assertEqual(stats["b"], 2)
+        self.assertEqual(calls, ["b", "a"])
+        self.assertEqual(stats.to_dict(), {"a": 1, "b": 2, "nested": {"c": 3}})
+
+    @unittest.skipUnless(importlib.util.find_spec("quantstats"), "quantstats not installed")
+    def test_period_stats_match_quantstats(self):
+        import quantstats
+
+        rng = np.random.default_rng(0)
+        index = pd.bdate_range("2021-01-01", "2022-06-30")
+        values = pd.Series(1000 * np.cumprod(1 + rng.normal(0.001, 0.02, len(index))), index)
+        returns = values.pct_change()
+
+        stats = simulate_account.build_quantstats_stats(returns)
+        for period in simulate_account.PERIODS:
+            for key, metric in [
+                (f"average_losing_{period}_roi", quantstats.stats.avg_loss),
+                (f"average_{period}_return", quantstats.stats.avg_return),
+                (f"best_{period}_roi", quantstats.stats.best),
+                (f"consecutive_winning_{period}s_max", quantstats.stats.consecutive_wins),
+                (f"expected_return_{period}", quantstats.stats.expected_return),
+                (f"win_rate_{period}", quantstats.stats.win_rate),
+            ]:
+                self.assertAlmostEqual(stats[key], metric(returns, period), msg=key)
+        self.assertAlmostEqual(stats["sharpe"], quantstats.stats.sharpe(returns, rf=0.02))
@@ -3,15 +3,24 @@ from datetime import date
 
 from src.data.polygon.asset_class import is_stock
 from src.data.yh.stats import get_short_interest
+from src.scan.utils import pipeline
 from src.scan.utils.asset_class import enrich_tickers_with_asset_class
 from src.scan.utils.indicators import enrich_tickers_with_indicators, from_yesterday_candle
 from src.backtest.chronicle.prescanner import build_prescanner_with_empty_candle_getter, with_high_bias_prescan_strategy, with_kwargs
 from src.scan.utils.scanners import CandleGetter, ScannerFilter
 from src.data.polygon.grouped_aggs import Ticker
-from src.data.td.td import get_floats, get_fundamentals
+from src.data.td.td import get_floats
 
 LEADUP_PERIOD = 1
 
+MAX_CLOSE_PRICE = 5
+MIN_VOLUME = 100_000
+MIN_OPEN_TO_CLOSE_CHANGE = 0
+MIN_PERCENT_CHANGE = 0.05
+MIN_FLOAT, MAX_FLOAT = (1_000_000, 50_000_000)
+MIN_SHORT_INTEREST = 0.02
+TOP_N = 1
+
 
 class Candidate(Ticker):
     open_to_close_change: float
@@ -24,81 +33,63 @@ class Candidate(Ticker):
     float: int
 
 
-# TODO: for added fields, make idempotent (so we can rely just on scanner)
-def scanner(provided_tickers: list[Ticker], today: date, _candle_getter: CandleGetter, shallow_scan=False) -> list[Candidate]:
-    max_close_price = 5
-    min_volume = 100_000
-    min_open_to_close_change = 0
-    min_percent_change = 0.05
-    min_float, max_float = (1_000_000, 50_000_000)
-    min_short_interest = 0.02
-    top_n = 1
+def _enrich_with_floats(tickers: list[Candidate], today: date) -> list[Candidate]:
+    floats = get_floats([t['T'] for t in tickers], today)
+    tickers = [t for t in tickers if t['T'] in floats]
+    for ticker in tickers:
+        ticker["float"] = floats[ticker['T']]
+    return tickers
 
-    tickers = provided_tickers  # typing doesn't like re-typing function parameters
 
-    tickers = list(filter(lambda t: t["c"] < max_close_price, tickers))
-    tickers = list(filter(lambda t: t["v"] > min_volume, tickers))
+def _enrich_with_short_interest(ticker: Candidate, today: date) -> bool:
+    short_data = get_short_interest(ticker["T"], today)
+    if not short_data:
+        return False
+    ticker["shares_short"] = short_data["shares_short"]
+    ticker["short_interest"] = ticker["shares_short"] / ticker["float"]
+    return True
 
-    tickers = cast(list[Candidate], tickers)
 
-    for ticker in tickers:
-        ticker["open_to_close_change"] = (
-            ticker['c'] - ticker['o']) / ticker['o']
-    tickers = list(
-        filter(lambda t: t["open_to_close_change"] > min_open_to_close_change, tickers))
+PIPELINE = pipeline.Pipeline([
+    pipeline.where("max close price", lambda t: t["c"] < MAX_CLOSE_PRICE),
+    pipeline.where("min volume", lambda t: t["v"] > MIN_VOLUME),
+    pipeline.assign("open_to_close_change",
+                    lambda t: (t['c'] - t['o']) / t['o']),
+    pipeline.where("min open to close change",
+                   lambda t: t["open_to_close_change"] > MIN_OPEN_TO_CLOSE_CHANGE),
 
-    tickers = list(enrich_tickers_with_asset_class(today, tickers, {
+    pipeline.enrich("is stock", lambda tickers, today: enrich_tickers_with_asset_class(today, tickers, {
         "is_stock": is_stock,
-    }))
+    }), cost=pipeline.ASSET_CLASS),
 
-    tickers = list(enrich_tickers_with_indicators(today, tickers, {
+    pipeline.enrich("c_1d", lambda tickers, today: enrich_tickers_with_indicators(today, tickers, {
         "c_1d": from_yesterday_candle("c"),
-    }, n=LEADUP_PERIOD + 1))
-    for ticker in tickers:
-        ticker["percent_change"] = (
-            ticker["c"] - ticker["c_1d"]) / ticker["c_1d"]
-    tickers = list(
-        filter(lambda t: t["percent_change"] > min_percent_change, tickers))
+    }, n=LEADUP_PERIOD + 1), cost=pipeline.HISTORY),
+    pipeline.assign("percent_change", lambda t: (t["c"] - t["c_1d"]) / t["c_1d"]),
+    pipeline.where("min percent change",
+                   lambda t: t["percent_change"] > MIN_PERCENT_CHANGE),
 
     # Low float
-    floats = get_floats([t['T'] for t in tickers], today)
-    tickers = [t for t in tickers if t['T'] in floats]
-    for ticker in tickers:
-        ticker["float"] = floats[ticker['T']]
-    tickers = list(
-        filter(lambda t: t['float'] < max_float and t['float'] > min_float, tickers))
+    pipeline.enrich("float", _enrich_with_floats, cost=pipeline.REMOTE),
+    pipeline.where("float range", lambda t: t['float']
+                   < MAX_FLOAT and t['float'] > MIN_FLOAT),
 
     # High relative volume
-    for ticker in tickers:
-        ticker['relative_volume'] = ticker['v'] / \
-            ticker['float']  # (because >, no divide by zero)
-    tickers = list(filter(lambda t: t['relative_volume'], tickers))
-
-    if not shallow_scan:
-        # Highest volume first
-        tickers.sort(key=lambda t: t['v'], reverse=True)
-
-        # only compute tickers necessary (top_n), less quota usage
-        # TODO: achieve this using `yield` by changing Scanners to return iterators?
-        new_tickers = []
-        for ticker in tickers:
-            # Short Interest
-            # (done last to save very restricted API call quota)
-            short_data = get_short_interest(ticker["T"], today)
-            if not short_data:
-                continue
-            ticker["shares_short"] = short_data["shares_short"]
-            ticker["short_interest"] = ticker["shares_short"] / \
-                ticker["float"]
-            if not (ticker["short_interest"] > min_short_interest):
-                continue
-
-            new_tickers.append(ticker)
-            if len(new_tickers) >= top_n:
-                break
-        tickers = new_tickers
+    # (because >, no divide by zero)
+    pipeline.assign("relative_volume", lambda t: t['v'] / t['float']),
+    pipeline.where("relative volume", lambda t: t['relative_volume']),
 
-    return tickers
+    # Highest volume first, so short interest is only looked up until `top_n` are found
+    pipeline.sort_by("volume", lambda t: t['v'], reverse=True),
+    # (done last to save very restricted API call quota, skipped when shallow)
+    pipeline.lookup("short interest", _enrich_with_short_interest),
+    pipeline.where("min short interest",
+                   lambda t: t["short_interest"] > MIN_SHORT_INTEREST, cost=pipeline.QUOTAED),
+], top_n=TOP_N)
+
+
+def scanner(provided_tickers: list[Ticker], today: date, _candle_getter: CandleGetter, shallow_scan=False) -> list[Candidate]:
+    return cast(list[Candidate], PIPELINE.scan(provided_tickers, today, shallow_scan=shallow_scan))
 
 
 prescanner = with_high_bias_prescan_strategy(
@@ -1,8 +1,8 @@
-
 from datetime import date
 from typing import Callable, Iterable
 
 from src.data.polygon.grouped_aggs import TickerLike
+from src.data.polygon.ticker_types_index import get_ticker_type_masks, get_types_mask
 
 
 def enrich_tickers_with_asset_class(day: date, tickers: list[TickerLike], classes: dict[str, Callable]) -> Iterable[TickerLike]:
@@ -10,10 +10,29 @@ def enrich_tickers_with_asset_class(day: date, tickers: list[TickerLike], classe
     Adds keys of `classes` to each ticker in `tickers`.
     Ticker is skipped if no classes evaluate to true.
     Each class evaluator is passed the ticker and the day.
+    Evaluators with a `types` attribute (see `src.data.polygon.asset_class`) are evaluated for all tickers at once.
     """
-    for ticker in tickers:
-        for asset_class_name, is_asset_class in classes.items():
-            ticker[asset_class_name] = is_asset_class(ticker["T"], day=day)
+    symbols = [ticker["T"] for ticker in tickers]
+    class_types = {name: getattr(is_asset_class, "types", None)
+                   for name, is_asset_class in classes.items()}
+
+    masks = None
+    all_types = {t for types in class_types.values() if types for t in types}
+    if all_types and symbols:
+        masks = get_ticker_type_masks(symbols, day, all_types)
+
+    values = {}
+    for name, is_asset_class in classes.items():
+        types = class_types[name]
+        if types and masks is not None:
+            values[name] = ((masks & get_types_mask(types)) != 0).tolist()
+        else:
+            values[name] = [is_asset_class(symbol, day=day)
+                            for symbol in symbols]
+
+    for i, ticker in enumerate(tickers):
+        for asset_class_name in classes.keys():
+            ticker[asset_class_name] = values[asset_class_name][i]
 
         if not any(ticker[name] for name in classes.keys()):
             continue
@@ -3,9 +3,26 @@ import logging
 from typing import Callable, Iterable
 import numpy as np
 
-from src.data.polygon.grouped_aggs import TickerLike, get_last_n_candles
+from src.data.polygon.grouped_aggs import CANDLE_FIELDS, TickerLike, get_last_n_candles_batch
 from src.trading_day import previous_trading_day
 
+#
+# Indicators are callables that take a ticker's daily candles (oldest first, today last) and return a value.
+# They may also provide a `batch` attribute: a callable taking the candles of all tickers at once,
+# a (tickers x n x CANDLE_FIELDS) array, and returning one value per ticker. That way scanners can skip
+# building dicts for each candle of each ticker.
+#
+
+
+def _field_index(key: str) -> int:
+    return CANDLE_FIELDS.index(key)
+
+
+def _column_to_values(key: str, values: np.ndarray) -> list:
+    if key in ("v", "n"):
+        return values.astype(np.int64).tolist()
+    return values.tolist()
+
 
 def use_indicator(indicator, **kwargs):
     def _talib_use(candles: list[dict]):
@@ -19,6 +36,22 @@ def use_indicator(indicator, **kwargs):
         values = indicator(inputs, **kwargs)
         value = float(values[-1])
         return value
+
+    def _talib_use_batch(history: np.ndarray) -> list[float]:
+        results = []
+        for candles in history:
+            inputs = {
+                "open": np.ascontiguousarray(candles[:, _field_index("o")]),
+                "high": np.ascontiguousarray(candles[:, _field_index("h")]),
+                "low": np.ascontiguousarray(candles[:, _field_index("l")]),
+                "close": np.ascontiguousarray(candles[:, _field_index("c")]),
+                "volume": np.ascontiguousarray(candles[:, _field_index("v")]),
+            }
+            values = indicator(inputs, **kwargs)
+            results.append(float(values[-1]))
+        return results
+
+    setattr(_talib_use, "batch", _talib_use_batch)
     return _talib_use
 
 
@@ -31,6 +64,12 @@ def extract_from_n_candles_ago(key: str, n: int):
     """
     def _extract_from_n_candles_ago(candles: list[dict]):
         return candles[-(n - 1)][key]
+
+    def _extract_from_n_candles_ago_batch(history: np.ndarray) -> list:
+        return _column_to_values(key, history[:, -(n - 1), _field_index(key)])
+
+    setattr(_extract_from_n_candles_ago, "batch",
+            _extract_from_n_candles_ago_batch)
     return _extract_from_n_candles_ago
 
 
@@ -38,27 +77,51 @@ def from_yesterday_candle(key: str):
     return extract_from_n_candles_ago(key, 1)
 
 
+def _build_candle(row: np.ndarray) -> dict:
+    candle = dict(zip(CANDLE_FIELDS, row.tolist()))
+    candle["v"] = int(candle["v"])
+    candle["n"] = int(candle["n"])
+    return candle
+
+
 def enrich_tickers_with_indicators(day: date, tickers: list[TickerLike], indicators: dict[str, Callable], n=15) -> Iterable[TickerLike]:
     """
     Fetches last `n` daily candles and uses those to calculate provided indicators.
     Last value from each indicator is added to each ticker.
     To use talib, use `use_indicator` function and `talib.abstract.*` (ex: talib.abstract.RSI)
     """
-    new_tickers = []
-    for ticker in tickers:
-        # exclude today (won't be in cache), add `ticker` dict to the end which is candle-like
-        daily_candles = get_last_n_candles(
-            previous_trading_day(day), ticker["T"], n=n-1)
-        if not daily_candles:
-            continue
-        daily_candles = list(reversed(daily_candles)) + [ticker]
-
-        for indicator_name, indicator in indicators.items():
-            ticker[indicator_name] = indicator(daily_candles)
-        new_tickers.append(ticker)
-
-    if tickers and not new_tickers:
+    if not tickers:
+        return []
+
+    # exclude today (won't be in cache), one lookup for all tickers
+    previous_candles, mask = get_last_n_candles_batch(
+        previous_trading_day(day), [ticker["T"] for ticker in tickers], n=n-1)
+    has_history = mask.all(axis=1)
+
+    new_tickers = [ticker for ticker, keep in zip(
+        tickers, has_history.tolist()) if keep]
+    if not new_tickers:
         logging.warning(
             f"enrich_tickers_with_indicators: all {len(tickers)} tickers on {day} were filtered out when getting last {n} candles. Is the cache up to date?")
+        return []
+
+    # oldest first, then add `ticker` to the end which is candle-like
+    today_candles = np.array([[float(ticker.get(field, 0)) for field in CANDLE_FIELDS]  # type: ignore
+                             for ticker in new_tickers], dtype=np.float64)
+    history = np.concatenate([
+        previous_candles[has_history][:, ::-1],
+        today_candles[:, np.newaxis, :],
+    ], axis=1)
+
+    for indicator_name, indicator in indicators.items():
+        batch = getattr(indicator, "batch", None)
+        if batch:
+            values = batch(history)
+        else:
+            values = [indicator([_build_candle(row) for row in candles[:-1]] + [ticker])
+                      for ticker, candles in zip(new_tickers, history)]
+
+        for ticker, value in zip(new_tickers, values):
+            ticker[indicator_name] = value
 
     return new_tickers
@@ -0,0 +1,129 @@
+import dataclasses
+from datetime import date
+import itertools
+import logging
+import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from src.data.polygon.grouped_aggs import TickerLike
+
+#
+# Declarative scanners: a scanner is a list of stages, each tagged with its cost (see "Filter order" in
+# src/scan/README.md), ran lazily:
+# - per-ticker stages (`where`, `assign`, `lookup`) pass tickers along one at a time,
+# - batch stages (`enrich`, `sort_by`) wait for all tickers reaching them, e.g. to look them up at once.
+# With `top_n`, tickers are pulled through the pipeline until `top_n` came out, so per-ticker stages after the last
+# batch stage (e.g. quotaed lookups, on tickers sorted by preference) only run on candidates that can still make it.
+#
+# Shallow scans (prescanners) skip stages costlier than `SHALLOW_MAX_COST` and do not limit to `top_n`.
+# Each run reports time spent and tickers in/out per stage.
+#
+
+# costs, cheapest first
+OHLCV = 1  # values of the ticker's candle of the day
+ASSET_CLASS = 2  # lookups by symbol (e.g. `is_stock`), cached per day
+HISTORY = 3  # past daily candles (e.g. indicators)
+REMOTE = 4  # rate limited APIs, or batched ones (e.g. TD fundamentals, 1m candles)
+QUOTAED = 5  # APIs with a restricted quota (e.g. YH Finance)
+
+SHALLOW_MAX_COST = REMOTE
+
+
+@dataclasses.dataclass
+class StageReport:
+    name: str
+    cost: int
+    tickers_in: int = 0
+    tickers_out: int = 0
+    seconds: float = 0.
+
+    def get_selectivity(self) -> Optional[float]:
+        """Fraction of tickers kept."""
+        return self.tickers_out / self.tickers_in if self.tickers_in else None
+
+    def __str__(self) -> str:
+        selectivity = self.get_selectivity()
+        return f"{self.name} (cost {self.cost}): {self.tickers_in} -> {self.tickers_out}" + \
+            (f" ({selectivity:.1%})" if selectivity is not None else "") + f" in {self.seconds:.3f}s"
+
+
+@dataclasses.dataclass
+class Stage:
+    name: str
+    cost: int
+    # (tickers, day) -> kept tickers, given all tickers at once if `is_batch`, otherwise one at a time
+    apply: Callable[[list, date], Iterable]
+    is_batch: bool
+
+    def run(self, tickers: Iterator[TickerLike], day: date, report: StageReport) -> Iterator[TickerLike]:
+        if self.is_batch:
+            tickers_in = list(tickers)
+            started_at = time.perf_counter()
+            tickers_out = list(self.apply(tickers_in, day))
+            report.seconds += time.perf_counter() - started_at
+            report.tickers_in += len(tickers_in)
+            report.tickers_out += len(tickers_out)
+            yield from tickers_out
+            return
+
+        for ticker in tickers:
+            report.tickers_in += 1
+            started_at = time.perf_counter()
+            kept = list(self.apply([ticker], day))
+            report.seconds += time.perf_counter() - started_at
+            report.tickers_out += len(kept)
+            yield from kept
+
+
+def where(name: str, predicate: Callable[[TickerLike], bool], cost: int = OHLCV) -> Stage:
+    """Keeps tickers matching `predicate`."""
+    return Stage(name, cost, lambda tickers, _day: (t for t in tickers if predicate(t)), is_batch=False)
+
+
+def assign(key: str, compute: Callable[[TickerLike], object], cost: int = OHLCV) -> Stage:
+    """Sets `key` of each ticker."""
+    def _assign(tickers: list, _day: date) -> list:
+        for ticker in tickers:
+            ticker[key] = compute(ticker)
+        return tickers
+    return Stage(key, cost, _assign, is_batch=False)
+
+
+def lookup(name: str, enrich_ticker: Callable[[TickerLike, date], bool], cost: int = QUOTAED) -> Stage:
+    """Calls `enrich_ticker` on each ticker (e.g. to add looked up values), keeping the ones it returns True for."""
+    return Stage(name, cost, lambda tickers, day: (t for t in tickers if enrich_ticker(t, day)), is_batch=False)
+
+
+def enrich(name: str, enrich_tickers: Callable[[list, date], Iterable], cost: int) -> Stage:
+    """Passes all tickers at once to `enrich_tickers` (e.g. `enrich_tickers_with_indicators`), keeping those it returns."""
+    return Stage(name, cost, enrich_tickers, is_batch=True)
+
+
+def sort_by(name: str, key: Callable[[TickerLike], object], reverse: bool = False) -> Stage:
+    """Orders tickers, e.g. by preference before costly lookups of `top_n` pipelines."""
+    return Stage(name, OHLCV, lambda tickers, _day: sorted(tickers, key=key, reverse=reverse), is_batch=True)
+
+
+class Pipeline:
+    def __init__(self, stages: list[Stage], top_n: Optional[int] = None):
+        self.stages = stages
+        self.top_n = top_n
+
+    def run(self, tickers: list[TickerLike], day: date, shallow_scan: bool = False) -> Tuple[list[TickerLike], list[StageReport]]:
+        stages = [stage for stage in self.stages if not (
+            shallow_scan and stage.cost > SHALLOW_MAX_COST)]
+        reports = [StageReport(stage.name, stage.cost) for stage in stages]
+
+        stream: Iterator[TickerLike] = iter(tickers)
+        for stage, report in zip(stages, reports):
+            stream = stage.run(stream, day, report)
+        if self.top_n is not None and not shallow_scan:
+            stream = itertools.islice(stream, self.top_n)
+        return list(stream), reports
+
+    def scan(self, tickers: list[TickerLike], day: date, shallow_scan: bool = False) -> list[TickerLike]:
+        results, reports = self.run(tickers, day, shallow_scan=shallow_scan)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"scanned {day} ({shallow_scan=}):\n" +
+                          "\n".join(f"  {report}" for report in reports))
+        return results
@@ -0,0 +1,56 @@
+from datetime import date
+import unittest
+
+from src.scan.utils import pipeline
+
+DAY = date(2022, 1, 3)
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.looked_up = []
+
+        def look_up(ticker, _day) -> bool:
+            self.looked_up.append(ticker["T"])
+            return ticker["T"] != "B"
+
+        self.pipeline = pipeline.Pipeline([
+            pipeline.where("max close", lambda t: t["c"] < 10),
+            pipeline.assign("double_c", lambda t: t["c"] * 2),
+            pipeline.enrich("drop E", lambda tickers, _day: [
+                            t for t in tickers if t["T"] != "E"], cost=pipeline.ASSET_CLASS),
+            pipeline.sort_by("volume", lambda t: t["v"], reverse=True),
+            pipeline.lookup("lookup", look_up),
+        ], top_n=2)
+        self.tickers = [
+            {"T": "A", "c": 1, "v": 100},
+            {"T": "B", "c": 2, "v": 500},
+            {"T": "C", "c": 20, "v": 900},
+            {"T": "D", "c": 4, "v": 300},
+            {"T": "E", "c": 5, "v": 1000},
+            {"T": "F", "c": 6, "v": 200},
+        ]
+
+    def test_stops_lookups_at_top_n(self):
+        results, reports = self.pipeline.run(self.tickers, DAY)
+
+        self.assertEqual([t["T"] for t in results], ["D", "F"])
+        self.assertEqual(results[0]["double_c"], 8)
+        self.assertEqual(self.looked_up, ["B", "D", "F"])
+
+        self.assertEqual([(r.name, r.tickers_in, r.tickers_out) for r in reports], [
+            ("max close", 6, 5),
+            ("double_c", 5, 5),
+            ("drop E", 5, 4),
+            ("volume", 4, 4),
+            ("lookup", 3, 2),
+        ])
+        self.assertEqual(reports[0].get_selectivity(), 5 / 6)
+
+    def test_shallow_scan_skips_quotaed_stages(self):
+        results, reports = self.pipeline.run(
+            self.tickers, DAY, shallow_scan=True)
+
+        self.assertEqual([t["T"] for t in results], ["B", "D", "F", "A"])
+        self.assertEqual(self.looked_up, [])
+        self.assertNotIn("lookup", [r.name for r in reports])
@@ -1,7 +1,10 @@
+import ast
 from datetime import date
+import hashlib
 from importlib import import_module
+import os
 from types import ModuleType
-from typing import Callable, cast
+from typing import Callable, Optional, cast
 
 from src.data.finnhub.finnhub import get_candles
 from src.data.types.candles import CandleIntraday
@@ -36,6 +39,62 @@ def get_leadup_period(scanner: str) -> int:
     return module.LEADUP_PERIOD
 
 
+# (directory containing `src`)
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def _get_source_path(module_name: str) -> Optional[str]:
+    """Path of a `src` module's source, None if `module_name` is not a module (e.g. a name imported from one)."""
+    base = os.path.join(_ROOT_DIR, *module_name.split("."))
+    for path in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _get_src_imports(source: bytes) -> set[str]:
+    """`src` modules imported by `source` (and names imported from them, which may be modules too)."""
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+            names.update(
+                f"{node.module}.{alias.name}" for alias in node.names)
+    return {name for name in names if name == "src" or name.startswith("src.")}
+
+
+def get_scanner_module_hash(scanner: str) -> str:
+    """
+    Hash of the scanner's source, to tell when backtests of it are outdated.
+    Covers the scanner module and every `src` module it imports, directly or not (helpers, prescanner wrappers, ...).
+    """
+    return _hash_sources(_get_scanner_module(scanner).__name__)
+
+
+def _hash_sources(module_name: str) -> str:
+    """Hash of the source of `module_name` and the `src` modules it imports, transitively."""
+    sources: dict[str, bytes] = {}
+    to_visit = [module_name]
+    while to_visit:
+        module_name = to_visit.pop()
+        if module_name in sources:
+            continue
+        path = _get_source_path(module_name)
+        if path is None:
+            continue
+        with open(path, "rb") as f:
+            sources[module_name] = f.read()
+        to_visit.extend(_get_src_imports(sources[module_name]))
+
+    digest = hashlib.sha256()
+    for module_name, source in sorted(sources.items()):
+        digest.update(module_name.encode() + b"\0" +
+                      hashlib.sha256(source).digest())
+    return digest.hexdigest()
+
+
 def get_scanner(scanner_name: str) -> Scanner:
     scanner_filter = get_scanner_filter(scanner_name)
 
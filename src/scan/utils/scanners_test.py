@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.scan.utils import scanners
+
+MODULES = {
+    "src/__init__.py": "",
+    "src/scan/__init__.py": "",
+    "src/scan/scanner.py": "from src.scan import helpers\nfrom src.scan.helpers import threshold\nimport os\n",
+    "src/scan/helpers.py": "import src.scan.indicators\nthreshold = 1\n",
+    "src/scan/indicators.py": "x = 1\n",
+    "src/scan/unrelated.py": "y = 1\n",
+}
+
+
+class TestScannerModuleHash(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.write(MODULES)
+        self.patcher = mock.patch.object(
+            scanners, "_ROOT_DIR", self.tmp_dir.name)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def write(self, modules: dict[str, str]):
+        for path, source in modules.items():
+            path = os.path.join(self.tmp_dir.name, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(source)
+
+    def test_covers_transitive_imports(self):
+        initial = scanners._hash_sources("src.scan.scanner")
+
+        self.write({"src/scan/unrelated.py": "y = 2\n"})
+        self.assertEqual(scanners._hash_sources("src.scan.scanner"), initial)
+
+        self.write({"src/scan/indicators.py": "x = 2\n"})
+        self.assertNotEqual(
+            scanners._hash_sources("src.scan.scanner"), initial)
@@ -3,14 +3,14 @@ import argparse
 import logging
 from typing import cast
 from requests import HTTPError
-from src.caching.basics import clear_json_cache
 
 from src.data.polygon.grouped_aggs import (
     fetch_grouped_aggs,
     get_cache_entry_refresh_time,
     get_current_cache_range,
-    prepare_cache_grouped_aggs,
 )
+from src.data.polygon.grouped_aggs_builder import build_grouped_aggs_cache, get_current_session, get_days_to_fetch
+from src.data.polygon.polygon import get_polygon_calls_per_minute, get_polygon_token_bucket
 from src.scripts.helpers.parse_period import add_range_args, interpret_args
 from src.trading_day import (
     generate_trading_days,
@@ -23,8 +23,7 @@ from src.trading_day import (
     today_or_previous_trading_day,
 )
 
-POLYGON_CALLS_PER_MINUTE = 5  # estimating fetch time
-# For reference, 2 years of download takes about 1.75 hours
+# For reference, 2 years of download takes about 1.75 hours on free tier (5 calls per minute)
 
 
 def main():
@@ -51,12 +50,14 @@ def main():
     parser = argparse.ArgumentParser()
     parser = add_range_args(parser)
     parser.add_argument("--force", action="store_true", default=False)
+    # re-fetch every day, even ones already fetched this session (entries are overwritten, not deleted)
     parser.add_argument("--clear", action="store_true", default=False)
+    # delete days outside the range once it is fetched (e.g. days falling out of a rolling window)
+    parser.add_argument("--prune", action="store_true", default=False)
+    parser.add_argument("--workers", type=int, default=4)
     args = parser.parse_args()
 
-    if args.clear:
-        logging.info("Clearing cache before re-building...")
-        clear_json_cache("polygon/grouped_aggs/")
+    token_bucket = get_polygon_token_bucket()
 
     start, end = interpret_args(args)
 
@@ -70,7 +71,7 @@ def main():
         logging.info(f"checking whether API allows us to go back to {start}")
         while True:
             try:
-                fetch_grouped_aggs(start)  # no cache
+                fetch_grouped_aggs(start, token_bucket=token_bucket)  # no cache
                 break
             except HTTPError as e:
                 if e.response.status_code == 403:
@@ -89,8 +90,11 @@ def main():
     # estimating fetch time
     weekdays = len(list(generate_trading_days(start, end)))
     logging.info(f"{weekdays=}")
+    days_to_fetch = weekdays if args.clear else len(
+        get_days_to_fetch(start, end, get_current_session(market_now)))
+    logging.info(f"{days_to_fetch=}")
     estimated_fetch_time = timedelta(
-        minutes=weekdays / POLYGON_CALLS_PER_MINUTE)
+        minutes=days_to_fetch / get_polygon_calls_per_minute())
     logging.info(f"{estimated_fetch_time=}")
     estimated_end = market_now + estimated_fetch_time
     logging.info(f"{estimated_end=}")
@@ -113,9 +117,8 @@ def main():
             )
             exit(1)
 
-    logging.info("checking if update needed...")
-
-    prepare_cache_grouped_aggs(start, end)
+    build_grouped_aggs_cache(
+        start, end, workers=args.workers, restart=args.clear, prune=args.prune, token_bucket=token_bucket)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ from datetime import date, timedelta
 from requests import HTTPError
 
 from src.data.polygon.asset_class import is_etf, is_right, is_stock, is_unit, is_warrant
+from src.data.polygon.ticker_types_index import build_index as build_ticker_types_index
 from src.scripts.helpers.parse_period import add_range_args, interpret_args
 from src.trading_day import generate_trading_days, next_trading_day, today
 import logging
@@ -45,6 +46,8 @@ def main():
 
     logging.info("Done updating symbol details cache.")
 
+    build_ticker_types_index()
+
 
 if __name__ == "__main__":
     main()
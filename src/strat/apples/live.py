@@ -1,19 +1,18 @@
 
+import collections
 import datetime
 import logging
 import pprint
 import typing
-import numpy as np
-import pandas as pd
 
 from requests import HTTPError
-import ta
 from src.broker.generic import get_account, get_positions
 from src.strat.pdt import assert_pdt
 from src.trading_day import now, previous_trading_day
 from src.wait import get_next_minute_mark, wait_until
 from src.data.finnhub import finnhub
 from src.data.finnhub.aggregate_candles import filter_candles_during_market_hours
+from src.indicators import streaming
 
 
 ALGO_NAME = "apples"
@@ -28,9 +27,11 @@ def should_continue():
 
 
 def loop(params: dict):
+    # indicators are seeded on the first minute, then only updated with new candles
+    state = StreamingTechnicals(typing.cast(Params, params))
     while should_continue():
         try:
-            execute_phases(params)
+            execute_phases(params, state)
         except HTTPError as e:
             logging.exception(
                 f"HTTP {e.response.status_code} {e.response.text}")
@@ -65,7 +66,7 @@ def should_open_no_candles(next_minute, account, params):
     return True
 
 
-def execute_phases(params: dict):
+def execute_phases(params: dict, state: "StreamingTechnicals"):
     symbol = "AAPL"
 
     next_minute = get_next_minute_mark(now())
@@ -110,7 +111,13 @@ def execute_phases(params: dict):
             "No candles found in ({start}, {end}) for {symbol}, will not process entry criteria")
         return
 
+    # only closed candles, the one forming at next_minute would still change
+    candles = [c for c in filter_candles_during_market_hours(
+        candles) if c['datetime'] < next_minute]
+    technicals = compute_technicals(candles, typing.cast(Params, params), state)
+
     logging.info("evaluating entry criteria")
+    logging.info(pprint.pformat(technicals))
 
 
 class Params(typing.TypedDict):
@@ -165,11 +172,72 @@ class Params(typing.TypedDict):
     verbose: bool
 
 
-def compute_technicals(candles, params: Params):
-    highs = pd.Series(list(map(lambda c: float(c["high"]), candles)))
-    lows = pd.Series(list(map(lambda c: float(c["low"]), candles)))
-    closes = pd.Series(list(map(lambda c: float(c["close"]), candles)))
-    volumes = pd.Series(list(map(lambda c: float(c["volume"]), candles)))
+class StreamingTechnicals:
+    """
+    Indicator state for `compute_technicals`, seeded from history on the first update,
+    then only updated with candles newer than the last one seen.
+    """
+
+    def __init__(self, params: Params):
+        self.params = params
+        fast_period, slow_period, signal_period = params['macd_settings']
+
+        self.cci = streaming.CCI(
+            window=params['cci_period'], constant=params['cci_factor'])
+        self.macd = streaming.MACD(
+            window_fast=fast_period, window_slow=slow_period, window_sign=signal_period)
+        self.emas = [streaming.EMA(ema_period)
+                     for ema_period in params['emas']]
+        self.psar = streaming.PSAR(
+            step=params['psar_af'], max_step=params['psar_afmax'])
+        self.mfi = streaming.MFI(window=params['mfi_period'])
+        self.adx = streaming.ADX(window=params['adx_period'])
+        self.di = streaming.ADX(window=params['di_period'])
+        self.long_ema = streaming.EMA(params['long_ema_period'])
+
+        # recent values, for lookbacks
+        self.closes: collections.deque = collections.deque(
+            maxlen=params['psar_lookback_period'])
+        self.psars: collections.deque = collections.deque(
+            maxlen=params['psar_lookback_period'])
+        self.adxs: collections.deque = collections.deque(
+            maxlen=params['adx_slope_smoothing_period'] + 1)
+
+        self.last_candle = None
+
+    def update(self, candles) -> None:
+        for candle in candles:
+            if self.last_candle and candle['datetime'] <= self.last_candle['datetime']:
+                continue
+            self._add(candle)
+
+    def _add(self, candle) -> None:
+        high, low, close, volume = float(candle["high"]), float(
+            candle["low"]), float(candle["close"]), float(candle["volume"])
+
+        self.cci.update(high, low, close)
+        self.macd.update(close)
+        for ema in self.emas:
+            ema.update(close)
+        self.psar.update(high, low, close)
+        self.mfi.update(high, low, close, volume)
+        self.adx.update(high, low, close)
+        self.di.update(high, low, close)
+        self.long_ema.update(close)
+
+        self.closes.append(close)
+        self.psars.append(self.psar.value)
+        self.adxs.append(self.adx.value)
+        self.last_candle = candle
+
+
+def compute_technicals(candles, params: Params, state: typing.Optional[StreamingTechnicals] = None):
+    """
+    Pass the same `state` on every call (e.g. every minute) to only process new candles.
+    """
+    if state is None:
+        state = StreamingTechnicals(params)
+    state.update(candles)
 
     technicals = {}
 
@@ -178,25 +246,22 @@ def compute_technicals(candles, params: Params):
     #
     # CCI
     #
-    ccis = ta.trend.CCIIndicator(
-        highs, lows, closes, window=params['cci_period'], constant=params['cci_factor']).cci()
+    cci = state.cci.value
     technicals['cci'] = {
-        "value": ccis.values[-1],
-        "long_signal": ccis.values[-1] > params['cci_upper'],
-        "short_signal": ccis.values[-1] < params['cci_lower'],
+        "value": cci,
+        "long_signal": cci > params['cci_upper'],
+        "short_signal": cci < params['cci_lower'],
     }
 
     #
     # MACD
     #
-    fast_period, slow_period, signal_period = params['macd_settings']
-    macds = ta.trend.MACD(closes, window_slow=slow_period,
-                          window_fast=fast_period, window_sign=signal_period)
+    macd, macd_signal = state.macd.macd, state.macd.signal
     technicals['macd'] = {
-        "value": macds.macd().values[-1],
-        "signal": macds.macd_signal().values[-1],
-        "long_signal": macds.macd().values[-1] > macds.macd_signal().values[-1],
-        "short_signal": macds.macd().values[-1] < macds.macd_signal().values[-1],
+        "value": macd,
+        "signal": macd_signal,
+        "long_signal": macd > macd_signal,
+        "short_signal": macd < macd_signal,
     }
 
     #
@@ -207,9 +272,7 @@ def compute_technicals(candles, params: Params):
 
     technicals['ema'] = {}
 
-    ema_signals = [ta.trend.EMAIndicator(
-        closes, window=ema_period).ema_indicator() for ema_period in params['emas']]
-    ema_values = [ema.values[-1] for ema in ema_signals]
+    ema_values = [ema.value for ema in state.emas]
 
     for ema_period, ema_value in zip(params['emas'], ema_values):
         technicals['ema'][f"value_{ema_period}"] = ema_value
@@ -224,79 +287,66 @@ def compute_technicals(candles, params: Params):
         elif fast < slow:
             rightly_ordered_upside = False
 
-    state = "up" if rightly_ordered_upside else "down" if rightly_ordered_downside else "mixed"
-    long_signal = state in (
+    state_name = "up" if rightly_ordered_upside else "down" if rightly_ordered_downside else "mixed"
+    long_signal = state_name in (
         ["up", "mixed"] if params['emas_cross_criteria_any_instead_of_all'] else ["up"])
-    short_signal = state in (
+    short_signal = state_name in (
         ["down", "mixed"] if params['emas_cross_criteria_any_instead_of_all'] else ["down"])
 
-    technicals['ema']['state'] = state
+    technicals['ema']['state'] = state_name
     technicals['ema']['long_signal'] = long_signal
     technicals['ema']['short_signal'] = short_signal
 
     #
     # PSAR
     #
-    psars = ta.trend.PSARIndicator(
-        highs, lows, closes, step=params['psar_af'], max_step=params['psar_afmax']).psar()
+    psar, close = state.psar.value, state.closes[-1]
     technicals['psar'] = {
-        "value": psars.values[-1],
-        "close": closes.values[-1],
-        "long_signal": psars.values[-1] < closes.values[-1],
-        "short_signal": psars.values[-1] > closes.values[-1],
+        "value": psar,
+        "close": close,
+        "long_signal": psar < close,
+        "short_signal": psar > close,
     }
 
     #
     # PSAR lookback
     #
+    lookback_psar, lookback_close = state.psars[-params['psar_lookback_period']
+                                                ], state.closes[-params['psar_lookback_period']]
     technicals['psar_lookback'] = {
-        "value": psars.values[-params['psar_lookback_period']],
-        "close": closes.values[-params['psar_lookback_period']],
+        "value": lookback_psar,
+        "close": lookback_close,
         # must have been facing the wrong way N candles ago
-        "long_signal": psars.values[-params['psar_lookback_period']] > closes.values[-params['psar_lookback_period']],
-        "short_signal": psars.values[-params['psar_lookback_period']] < closes.values[-params['psar_lookback_period']],
+        "long_signal": lookback_psar > lookback_close,
+        "short_signal": lookback_psar < lookback_close,
     }
 
     #
     # MFI
     #
-    mfis = ta.volume.MFIIndicator(
-        highs, lows, closes, volumes, window=params['mfi_period']).money_flow_index()
+    mfi = state.mfi.value
     technicals['mfi'] = {
-        "value": mfis.values[-1],
-        "long_signal": mfis.values[-1] > params['mfi_upper'],
-        "short_signal": mfis.values[-1] < params['mfi_lower'],
+        "value": mfi,
+        "long_signal": mfi > params['mfi_upper'],
+        "short_signal": mfi < params['mfi_lower'],
     }
 
     #
     # ADX
     #
-    # suppressing warning about invalid operation (outputs and inputs look healthy)
-    # https://numpy.org/doc/stable/reference/generated/numpy.seterr.html
-    # says is usually caused by gettings nulls/nans/empty lists, none of which I have observed.
-    """
-    /usr/local/lib/python3.9/site-packages/ta/trend.py:769: RuntimeWarning: invalid value encountered in double_scalars
-      dip[idx] = 100 * (self._dip[idx] / value)
-    /usr/local/lib/python3.9/site-packages/ta/trend.py:774: RuntimeWarning: invalid value encountered in double_scalars
-      din[idx] = 100 * (self._din[idx] / value)
-    """
-    np.seterr(invalid="ignore")
-    adx_result = ta.trend.ADXIndicator(
-        highs, lows, closes, window=params['adx_period'], fillna=True)
-    np.seterr(invalid="warn")
-    adxs = adx_result.adx()
+    adx = state.adx.value
     technicals['adx'] = {
-        "value": adxs.values[-1],
-        "long_signal": adxs.values[-1] > params['adx_min_strength'],
-        "short_signal": adxs.values[-1] > params['adx_min_strength'],
+        "value": adx,
+        "long_signal": adx > params['adx_min_strength'],
+        "short_signal": adx > params['adx_min_strength'],
     }
 
     #
     # ADX Slope
     #
     assert params["adx_slope_smoothing_period"] >= 1
-    prior_value = adxs.values[-params["adx_slope_smoothing_period"] - 1]
-    adx_slope = (adxs.values[-1] - prior_value) / \
+    prior_value = state.adxs[-params["adx_slope_smoothing_period"] - 1]
+    adx_slope = (adx - prior_value) / \
         params["adx_slope_smoothing_period"]
     technicals["adx_slope"] = {
         "slope": adx_slope,
@@ -308,34 +358,28 @@ def compute_technicals(candles, params: Params):
     #
     # DI
     #
-    np.seterr(invalid="ignore")
-    adx_result = ta.trend.ADXIndicator(
-        highs, lows, closes, window=params['di_period'], fillna=True)
-    np.seterr(invalid="warn")
-    dipluses = adx_result.adx_pos()
-    diminuses = adx_result.adx_neg()
+    diplus, diminus = state.di.di_plus, state.di.di_minus
     technicals['di'] = {
-        "DI+": dipluses.values[-1],
-        "DI-": diminuses.values[-1],
-        "long_signal": dipluses.values[-1] > diminuses.values[-1],
-        "short_signal": dipluses.values[-1] < diminuses.values[-1],
+        "DI+": diplus,
+        "DI-": diminus,
+        "long_signal": diplus > diminus,
+        "short_signal": diplus < diminus,
     }
 
     #
     # Long EMA
     #
-    long_emas = ta.trend.EMAIndicator(
-        closes, window=params['long_ema_period']).ema_indicator()
+    long_ema = state.long_ema.value
     technicals['long_ema'] = {
-        "value": long_emas.values[-1],
-        "long_signal": closes.values[-1] > long_emas.values[-1],
-        "short_signal": closes.values[-1] < long_emas.values[-1],
+        "value": long_ema,
+        "long_signal": close > long_ema,
+        "short_signal": close < long_ema,
     }
 
     #
     # Time of day
     #
-    current_time = candles[-1]['datetime'].time()
+    current_time = state.last_candle['datetime'].time()
     sessions = {
         "morning": (params['start_of_morning'], params['end_of_morning']),
         "afternoon": (params['start_of_afternoon'], params['end_of_day']),
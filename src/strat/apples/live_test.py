@@ -0,0 +1,46 @@
+import datetime
+import unittest
+
+import numpy as np
+import ta
+
+from src.indicators.streaming_test import random_candles
+from src.strat.apples.live import Params, StreamingTechnicals, compute_technicals
+from src.trading_day import MARKET_TIMEZONE
+
+PARAMS: Params = {'use_cci': 'FOR_ENTRY', 'cci_period': 20, 'cci_factor': 0.015, 'cci_upper': -1000, 'cci_lower': -100, 'use_macd': 'FOR_ENTRY', 'macd_settings': (12, 26, 9), 'use_emacross': 'FOR_ENTRY', 'emas': (9, 20, 50, 200), 'emas_cross_criteria_any_instead_of_all': True, 'emas_any_on_cross_instead_of_while_rightly_ordered': False, 'use_psar': 'NO', 'psar_af': 0.021, 'psar_afmax': 0.2, 'psar_period': 2, 'use_psar_lookback': 'NO', 'psar_lookback_period': 3,
+                  'use_mfi': 'NO', 'mfi_period': 14, 'mfi_upper': 80, 'mfi_lower': 20, 'use_adx': 'FOR_ENTRY', 'adx_period': 14, 'adx_min_strength': 20, 'use_adx_slope': 'NO', 'adx_slope_smoothing_period': 5, 'use_di': 'FOR_ENTRY', 'di_period': 9, 'use_long_ema': 'NO', 'long_ema_period': 200, 'start_of_morning': datetime.time(9, 32), 'end_of_morning': datetime.time(11, 30), 'start_of_afternoon': datetime.time(14, 30), 'end_of_day': datetime.time(15, 57), 'verbose': True}
+
+
+class TestComputeTechnicals(unittest.TestCase):
+    def setUp(self):
+        self.df = random_candles(seed=1)
+        start = datetime.datetime(
+            2022, 1, 3, 9, 30, tzinfo=MARKET_TIMEZONE)
+        self.candles = [{
+            "datetime": start + datetime.timedelta(minutes=i),
+            "high": row.high, "low": row.low, "close": row.close, "open": row.close, "volume": row.volume,
+        } for i, row in enumerate(self.df.itertuples())]
+
+    def test_incremental_updates_match_full_computation(self):
+        state = StreamingTechnicals(PARAMS)
+        for end in range(250, len(self.candles) + 1, 10):
+            # like the live loop: every minute, the last few days of candles
+            incremental = compute_technicals(
+                self.candles[:end], PARAMS, state)
+            self.assertEqual(incremental, compute_technicals(
+                self.candles[:end], PARAMS))
+
+    def test_matches_ta(self):
+        technicals = compute_technicals(self.candles, PARAMS)
+
+        highs, lows, closes = self.df["high"], self.df["low"], self.df["close"]
+        with np.errstate(invalid="ignore"):
+            adx = ta.trend.ADXIndicator(
+                highs, lows, closes, window=14, fillna=True).adx()
+        self.assertAlmostEqual(technicals["adx"]["value"], adx.values[-1])
+        self.assertAlmostEqual(technicals["adx_slope"]["prior_value"], adx.values[-6])
+        self.assertAlmostEqual(technicals["cci"]["value"], ta.trend.CCIIndicator(
+            highs, lows, closes, window=20, constant=0.015).cci().values[-1])
+        self.assertAlmostEqual(technicals["ema"]["value_200"], ta.trend.EMAIndicator(
+            closes, window=200).ema_indicator().values[-1])
@@ -1,6 +1,12 @@
-from datetime import datetime, timedelta
-import itertools
-from copy import deepcopy
+from datetime import datetime
+import os
+
+from src.outputs import json_dump
+from src.strat.losers.gridsearch_columns import (
+    build_criteria_masks,
+    build_line_columns,
+    evaluate_pockets,
+)
 
 
 def get_lines_from_biggest_losers_csv(path):
@@ -98,7 +104,11 @@ def take_top_n_daily(trades, n=10):
     return new_trades
 
 
-def analyze_biggest_losers_csv(path, roi_column="overnight_strategy_roi"):
+def analyze_biggest_losers_csv(path, roi_column="overnight_strategy_roi", workers=1, results_path=None):
+    """
+    Evaluates every pocket of criteria (with `workers` processes), writing pockets with results
+    as JSON lines to `results_path` as they come (if given).
+    """
     lines = get_lines_from_biggest_losers_csv(path)
     # roi_column *must* be present
     lines = [l for l in lines if l[roi_column]]
@@ -106,64 +116,34 @@ def analyze_biggest_losers_csv(path, roi_column="overnight_strategy_roi"):
     criteria_results = []
     criteria_groupings = build_criteria_set()
     criteria_group_names = list(criteria_groupings.keys())
-    criteria_groups = list(
-        map(lambda name: criteria_groupings[name], criteria_group_names)
-    )
 
-    #
-    # starting to estimate time
-    #
-    possible_pockets = 1
-    for criteria_group in criteria_groups:
-        possible_pockets *= len(criteria_group.items())
-
-    line_count = len(lines)
-    evaluations = possible_pockets * line_count
-    evaluations_per_second = 1.8e6  # found empirically on my computer
-
-    print(
-        "estimated time:",
-        timedelta(seconds=evaluations / evaluations_per_second),
-        f"{possible_pockets=}",
-    )
     start_time = datetime.now()
 
     #
-    # do lots of work
+    # evaluate every criteria once per line, then pockets are just ANDs of masks
     #
-    for raw_criteria_set in itertools.product(
-        *map(lambda d: d.items(), criteria_groups)
-    ):
-        criteria_set_names = list(map(lambda t: t[0], raw_criteria_set))
-        criteria_set_descriptor = dict(
-            zip(criteria_group_names, criteria_set_names))
-
-        criterion = list(map(lambda t: t[1], raw_criteria_set))
-
-        # TODO: refactor this into a function so we can evaluate a criteria set independent of this loop (something exists in hybrid_backtest.py)
-        filtered_lines = lines
-        for criteria in criterion:
-            new_lines = list(filter(criteria, filtered_lines))
-            filtered_lines = new_lines
-
-        for n in [10]:
-            # for n in [8, 10, 12, 15, 20]:
-
-            results = evaluate_results(
-                take_top_n_daily(filtered_lines, n=n),
-                roi_column=roi_column,
-            )
-            if not results:
-                continue
-
-            new_criteria_set_descriptor = deepcopy(criteria_set_descriptor)
-            new_criteria_set_descriptor["top_n"] = f"top {n}"
-            criteria_results.append(
-                {
-                    "names": new_criteria_set_descriptor,
-                    "results": results,
-                }
-            )
+    columns = build_line_columns(
+        lines, roi_column=roi_column, waste_model=lambda l: 0.005)
+    group_masks = [build_criteria_masks(columns, criteria_groupings[name])
+                   for name in criteria_group_names]
+
+    results_file = open(results_path, "w") if results_path else None
+    try:
+        # top_ns=[8, 10, 12, 15, 20]
+        for criteria_set_names, n, results in evaluate_pockets(columns, group_masks, top_ns=[10], workers=workers):
+            criteria_set_descriptor = dict(
+                zip(criteria_group_names, criteria_set_names))
+            criteria_set_descriptor["top_n"] = f"top {n}"
+            pocket = {
+                "names": criteria_set_descriptor,
+                "results": results,
+            }
+            criteria_results.append(pocket)
+            if results_file:
+                results_file.write(json_dump.to_json_string(pocket) + "\n")
+    finally:
+        if results_file:
+            results_file.close()
 
     end_time = datetime.now()
     print("actual time:", end_time - start_time)
@@ -527,6 +507,8 @@ if __name__ == "__main__":
     pockets = analyze_biggest_losers_csv(
         path,
         roi_column="overnight_strategy_roi",
+        workers=os.cpu_count() or 1,
+        results_path=get_paths()["data"]["outputs"]["losers_gridsearch_pockets_jsonl"],
         # roi_column="close_to_09_30_roi",
         # roi_column="close_to_10_00_roi",
     )
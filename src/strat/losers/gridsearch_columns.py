@@ -0,0 +1,278 @@
+import collections
+from concurrent.futures import Future, ProcessPoolExecutor
+import dataclasses
+from datetime import datetime, timedelta
+import itertools
+from multiprocessing import shared_memory
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+#
+# Columnar gridsearch engine: lines are loaded once into arrays (sorted by day, keeping CSV order within a day),
+# each criterion is evaluated once per line into a boolean mask, and a pocket is the AND of its criteria's masks.
+# Per-day aggregates are then `bincount`s over day codes, instead of re-filtering line dicts for every pocket.
+#
+# Results match `evaluate_results(take_top_n_daily(filtered_lines, n))` (up to float summation order, below
+# the rounding of the results).
+#
+# With `workers` > 1, the criteria product is split into chunks (pockets sharing a prefix of criteria) evaluated
+# in worker processes, which read the columns and masks from shared memory instead of getting a copy each.
+#
+
+GEOMETRIC_COEFFICIENTS = [0.85]
+MIN_PLAYS = 10
+
+
+@dataclasses.dataclass
+class LineColumns:
+    lines: list[dict]  # sorted by day
+    day_codes: np.ndarray  # int64, index of the line's day among all days
+    net_rois: np.ndarray  # float64, roi minus waste
+    days: int
+
+    def __len__(self):
+        return len(self.day_codes)
+
+
+def build_line_columns(lines: list[dict], roi_column: str, waste_model: Callable[[dict], float]) -> LineColumns:
+    # stable, so lines of a day keep their order (top n of a day are its first n lines)
+    lines = sorted(lines, key=lambda l: l["day_of_action"])
+    day_ordinals = np.array([l["day_of_action"].toordinal()
+                            for l in lines], dtype=np.int64)
+    _, day_codes = np.unique(day_ordinals, return_inverse=True)
+    net_rois = np.array([l[roi_column] - waste_model(l)
+                        for l in lines], dtype=np.float64)
+    return LineColumns(
+        lines=lines,
+        day_codes=day_codes.astype(np.int64),
+        net_rois=net_rois,
+        days=int(day_codes.max()) + 1 if len(lines) else 0,
+    )
+
+
+def build_criteria_masks(columns: LineColumns, criteria_group: dict[str, Callable[[dict], bool]]) -> dict[str, np.ndarray]:
+    return {
+        name: np.fromiter((bool(criteria(l)) for l in columns.lines), dtype=bool, count=len(columns))
+        for name, criteria in criteria_group.items()
+    }
+
+
+def generate_pocket_masks(group_masks: list[dict[str, np.ndarray]], mask: np.ndarray) -> Iterator[tuple[list[str], np.ndarray]]:
+    """
+    Yields (criteria names, mask) of every pocket, in `itertools.product` order.
+    Masks of shared prefixes are ANDed once.
+    """
+    if not group_masks:
+        yield [], mask
+        return
+    for name, criteria_mask in group_masks[0].items():
+        prefix_mask = mask & criteria_mask
+        if np.count_nonzero(prefix_mask) < MIN_PLAYS:
+            # too few lines, so no results for any pocket under this prefix
+            continue
+        for names, pocket_mask in generate_pocket_masks(group_masks[1:], prefix_mask):
+            yield [name] + names, pocket_mask
+
+
+def take_top_n_daily_indices(columns: LineColumns, mask: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the first `n` lines of each day among the lines in `mask`."""
+    indices = np.flatnonzero(mask)
+    if not len(indices):
+        return indices
+    day_codes = columns.day_codes[indices]
+    # position of each line within its day
+    is_day_start = np.empty(len(indices), dtype=bool)
+    is_day_start[0] = True
+    is_day_start[1:] = day_codes[1:] != day_codes[:-1]
+    day_starts = np.flatnonzero(is_day_start)
+    positions = np.arange(len(indices)) - \
+        np.repeat(day_starts, np.diff(np.append(day_starts, len(indices))))
+    return indices[positions < n]
+
+
+def evaluate_indices(columns: LineColumns, indices: np.ndarray):
+    """Same results as `evaluate_results` for the lines at `indices`."""
+    plays = len(indices)
+    if plays < MIN_PLAYS:
+        return None
+
+    net_rois = columns.net_rois[indices]
+    average_roi = float(net_rois.sum()) / plays
+    win_rate = int(np.count_nonzero(net_rois > 0)) / plays
+
+    day_counts = np.bincount(columns.day_codes[indices], minlength=columns.days)
+    day_sums = np.bincount(
+        columns.day_codes[indices], weights=net_rois, minlength=columns.days)
+    traded = day_counts > 0
+    # each trade of a day weighs 1/len(trades)
+    day_rois = day_sums[traded] / day_counts[traded]
+    trading_days = int(np.count_nonzero(traded))
+    green_days = int(np.count_nonzero(day_rois > 0))
+
+    results = {
+        "avg_roi": round(average_roi, 3),
+        "win%": round(100 * win_rate, 1),
+        "plays": plays,
+        "day_win%": round(100 * green_days / trading_days, 1),
+        "days": trading_days,
+    }
+    for coefficient in GEOMETRIC_COEFFICIENTS:
+        balance = float(np.prod(1 + coefficient * day_rois))
+        results[f"g_{int(100*coefficient)}%_x"] = round(balance, 2)
+    return results
+
+
+Pocket = tuple[list[str], int, dict]  # criteria names, top n, results
+
+
+def evaluate_chunk(columns: LineColumns, group_masks: list[dict[str, np.ndarray]], prefix: list[str], top_ns: list[int]) -> list[Pocket]:
+    """Pockets (with results) whose criteria start with `prefix` (names of criteria of the first groups)."""
+    mask = np.ones(len(columns), dtype=bool)
+    for name, masks in zip(prefix, group_masks):
+        mask &= masks[name]
+    if np.count_nonzero(mask) < MIN_PLAYS:
+        return []
+
+    pockets = []
+    for names, pocket_mask in generate_pocket_masks(group_masks[len(prefix):], mask):
+        for n in top_ns:
+            results = evaluate_indices(
+                columns, take_top_n_daily_indices(columns, pocket_mask, n=n))
+            if results:
+                pockets.append((prefix + names, n, results))
+    return pockets
+
+
+def split_into_chunks(group_masks: list[dict[str, np.ndarray]], min_chunks: int) -> tuple[list[list[str]], int]:
+    """Prefixes of the criteria product giving at least `min_chunks` chunks (if possible), and pockets per chunk."""
+    prefix_length = 0
+    chunks = 1
+    while prefix_length < len(group_masks) and chunks < min_chunks:
+        chunks *= len(group_masks[prefix_length])
+        prefix_length += 1
+    pockets_per_chunk = 1
+    for masks in group_masks[prefix_length:]:
+        pockets_per_chunk *= len(masks)
+    prefixes = [list(names) for names in itertools.product(
+        *(masks.keys() for masks in group_masks[:prefix_length]))]
+    return prefixes, pockets_per_chunk
+
+
+class Progress:
+    """Prints pockets evaluated so far and an ETA, at most every `interval`."""
+
+    def __init__(self, total: int, interval: timedelta = timedelta(seconds=5)):
+        self.total = total
+        self.done = 0
+        self.interval = interval
+        self.start_time = datetime.now()
+        self.last_print_time = self.start_time
+
+    def add(self, count: int):
+        self.done += count
+        now = datetime.now()
+        if now - self.last_print_time >= self.interval or self.done >= self.total:
+            self.last_print_time = now
+            print(self.describe(now))
+
+    def describe(self, now: datetime) -> str:
+        elapsed = now - self.start_time
+        eta = elapsed * (self.total - self.done) / \
+            self.done if self.done else None
+        return f"pockets {self.done}/{self.total} ({100 * self.done / max(self.total, 1):.1f}%) elapsed {elapsed} eta {eta}"
+
+
+#
+# Shared memory for workers
+#
+
+@dataclasses.dataclass
+class SharedArray:
+    name: str
+    shape: tuple
+    dtype: str
+
+
+def _share_array(array: np.ndarray, blocks: list[shared_memory.SharedMemory]) -> SharedArray:
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return SharedArray(name=block.name, shape=array.shape, dtype=array.dtype.str)
+
+
+def _attach_array(shared: SharedArray, blocks: list[shared_memory.SharedMemory]) -> np.ndarray:
+    block = shared_memory.SharedMemory(name=shared.name)
+    blocks.append(block)
+    return np.ndarray(shared.shape, dtype=np.dtype(shared.dtype), buffer=block.buf)
+
+
+_worker_blocks: list[shared_memory.SharedMemory] = []
+_worker_columns: Optional[LineColumns] = None
+_worker_group_masks: list[dict[str, np.ndarray]] = []
+
+
+def _init_worker(day_codes: SharedArray, net_rois: SharedArray, days: int, group_names: list[list[str]], group_masks: list[SharedArray]):
+    global _worker_columns, _worker_group_masks
+    _worker_columns = LineColumns(
+        lines=[],
+        day_codes=_attach_array(day_codes, _worker_blocks),
+        net_rois=_attach_array(net_rois, _worker_blocks),
+        days=days,
+    )
+    _worker_group_masks = []
+    for names, shared in zip(group_names, group_masks):
+        masks = _attach_array(shared, _worker_blocks)
+        _worker_group_masks.append(
+            {name: masks[i] for i, name in enumerate(names)})
+
+
+def _evaluate_chunk_in_worker(prefix: list[str], top_ns: list[int]) -> list[Pocket]:
+    assert _worker_columns is not None
+    return evaluate_chunk(_worker_columns, _worker_group_masks, prefix, top_ns)
+
+
+def evaluate_pockets(columns: LineColumns, group_masks: list[dict[str, np.ndarray]], top_ns: list[int], workers: int = 1) -> Iterator[Pocket]:
+    """
+    Pockets with results, in criteria product order (then by top n), printing progress along the way.
+    """
+    prefixes, pockets_per_chunk = split_into_chunks(
+        group_masks, min_chunks=8 * workers if workers > 1 else 1)
+    progress = Progress(len(prefixes) * pockets_per_chunk)
+
+    if workers <= 1:
+        for prefix in prefixes:
+            yield from evaluate_chunk(columns, group_masks, prefix, top_ns)
+            progress.add(pockets_per_chunk)
+        return
+
+    blocks: list[shared_memory.SharedMemory] = []
+    try:
+        initargs = (
+            _share_array(columns.day_codes, blocks),
+            _share_array(columns.net_rois, blocks),
+            columns.days,
+            [list(masks.keys()) for masks in group_masks],
+            [_share_array(np.array(list(masks.values())).reshape(len(masks), len(columns)), blocks)
+             for masks in group_masks],
+        )
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            # keep a bounded number of chunks in flight, yielding them in order as they complete
+            pending: collections.deque[Future] = collections.deque()
+            try:
+                for prefix in prefixes:
+                    pending.append(executor.submit(
+                        _evaluate_chunk_in_worker, prefix, top_ns))
+                    if len(pending) >= 2 * workers:
+                        yield from pending.popleft().result()
+                        progress.add(pockets_per_chunk)
+                while pending:
+                    yield from pending.popleft().result()
+                    progress.add(pockets_per_chunk)
+            finally:
+                for future in pending:
+                    future.cancel()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
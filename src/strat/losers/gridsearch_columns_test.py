@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+from src.strat.losers.gridsearch_backtest_losers import evaluate_results, take_top_n_daily
+from src.strat.losers.gridsearch_columns import (
+    build_criteria_masks,
+    build_line_columns,
+    evaluate_indices,
+    evaluate_pockets,
+    generate_pocket_masks,
+    take_top_n_daily_indices,
+)
+
+
+def random_lines(n=3000, seed=0):
+    rng = random.Random(seed)
+    days = [date(2021, 1, 4) + timedelta(days=i) for i in range(60)]
+    return [{
+        "day_of_action": rng.choice(days),
+        "rank_day_of_action": rng.randint(1, 50),
+        "is_stock": rng.random() < 0.7,
+        "close_to_close_percent_change_day_of_action": rng.uniform(-0.6, -0.1),
+        "overnight_strategy_roi": rng.gauss(0.01, 0.1),
+    } for _ in range(n)]
+
+
+CRITERIA_GROUPINGS = {
+    "rank": {
+        "* rank": lambda _: True,
+        **{f"rank {i}": (lambda i: lambda t: t["rank_day_of_action"] <= i)(i) for i in range(5, 50, 5)},
+    },
+    "change": {
+        "change% *": lambda _: True,
+        **{f"change%<{i}": (lambda p: lambda t: t["close_to_close_percent_change_day_of_action"] < p)(i / 100) for i in range(-50, -10, 5)},
+    },
+    "ticker_class": {
+        "s": lambda t: t["is_stock"],
+        "!s": lambda t: not t["is_stock"],
+    },
+}
+
+
+class TestGridsearchColumns(unittest.TestCase):
+    def test_matches_evaluating_filtered_lines(self):
+        lines = random_lines()
+        waste_model = lambda l: 0.005
+
+        expected = {}
+        for raw_criteria_set in itertools.product(*(g.items() for g in CRITERIA_GROUPINGS.values())):
+            filtered_lines = [l for l in lines if all(
+                criteria(l) for _, criteria in raw_criteria_set)]
+            results = evaluate_results(take_top_n_daily(filtered_lines, n=10))
+            if results:
+                expected[tuple(name for name, _ in raw_criteria_set)] = results
+
+        columns = build_line_columns(
+            lines, roi_column="overnight_strategy_roi", waste_model=waste_model)
+        group_masks = [build_criteria_masks(columns, g)
+                       for g in CRITERIA_GROUPINGS.values()]
+        actual = {}
+        for names, mask in generate_pocket_masks(group_masks, np.ones(len(columns), dtype=bool)):
+            results = evaluate_indices(
+                columns, take_top_n_daily_indices(columns, mask, n=10))
+            if results:
+                actual[tuple(names)] = results
+
+        self.assertEqual(list(actual.keys()), list(expected.keys()))
+        self.assertEqual(actual, expected)
+
+    def test_parallel_matches_sequential(self):
+        columns = build_line_columns(
+            random_lines(), roi_column="overnight_strategy_roi", waste_model=lambda l: 0.005)
+        group_masks = [build_criteria_masks(columns, g)
+                       for g in CRITERIA_GROUPINGS.values()]
+
+        sequential = list(evaluate_pockets(
+            columns, group_masks, top_ns=[5, 10]))
+        parallel = list(evaluate_pockets(
+            columns, group_masks, top_ns=[5, 10], workers=3))
+
+        self.assertGreater(len(sequential), 100)
+        self.assertEqual(parallel, sequential)
@@ -8,46 +8,55 @@ from src.caching.basics import read_json_cache, write_json_cache
 #
 
 from datetime import date
+import os
+
+import numpy as np
+
 from src.strat.losers.gridsearch_backtest_losers import (
     analyze_biggest_losers_csv,
     build_criteria_set,
-    evaluate_results,
     get_lines_from_biggest_losers_csv,
     get_widest_criteria_with_results,
 )
+from src.strat.losers.gridsearch_columns import (
+    build_criteria_masks,
+    build_line_columns,
+    evaluate_indices,
+)
 
 
 def try_hybrid_model(pockets, path, baseline_start_date, is_quality_pocket):
     quality_pockets = list(filter(is_quality_pocket, pockets))
 
     lines = get_lines_from_biggest_losers_csv(path)
-
-    hybrid_model_trades = []
+    columns = build_line_columns(
+        lines, roi_column="overnight_strategy_roi", waste_model=lambda l: 0.005)
 
     criteria_set = build_criteria_set()
-
-    def pocket_includes_line(pocket, line):
-
+    criteria_masks = {}
+
+    def get_criteria_mask(dimension_name, segment_name):
+        key = (dimension_name, segment_name)
+        if key not in criteria_masks:
+            criteria = criteria_set[dimension_name][segment_name]
+            criteria_masks[key] = build_criteria_masks(
+                columns, {segment_name: criteria})[segment_name]
+        return criteria_masks[key]
+
+    # if any pocket contains the line, then we have a trade
+    hybrid_model_mask = np.zeros(len(columns), dtype=bool)
+    for pocket in quality_pockets:
         # every criteria must be met
+        pocket_mask = np.ones(len(columns), dtype=bool)
         for dimension_name, segment_name in pocket["names"].items():
             try:
-                criteria = criteria_set[dimension_name][segment_name]
+                pocket_mask &= get_criteria_mask(dimension_name, segment_name)
             except KeyError:
                 # TODO: make 'top_n' like all other criteria by having criteria apply in order
                 continue
-            if not criteria(line):
-                return False
-
-        return True
-
-    for line in lines:
-        for pocket in quality_pockets:
-            # if any pocket contains the line, then we have a trade
-            if pocket_includes_line(pocket, line):
-                hybrid_model_trades.append(line)
-                break
+        hybrid_model_mask |= pocket_mask
 
-    results = evaluate_results(hybrid_model_trades)
+    results = evaluate_indices(columns, np.flatnonzero(hybrid_model_mask))
     if not results:
         return None
 
@@ -103,7 +112,8 @@ if __name__ == "__main__":
     baseline_start_date = date(2021, 1, 1)
 
     if write_new_model:
-        pockets = analyze_biggest_losers_csv(path, baseline_start_date)
+        pockets = analyze_biggest_losers_csv(
+            path, workers=os.cpu_count() or 1)
         write_json_cache(model_cache_entry, pockets)
     else:
         pockets = read_json_cache(model_cache_entry)
@@ -1,15 +1,9 @@
-# `brew install ta-lib`, then `pip3 install TA-Lib`
-# To read ta-lib docs for a function (to see parameters like windows/timeperiods), do:
-#   >>> from talib import RSI; print(RSI.__doc__)
 import typing
 from src.entries.sizing import size_buy
 import json
 from datetime import datetime, timedelta, time
 import logging
 
-import numpy as np
-import pandas as pd
-import pandas_ta
 from requests.exceptions import HTTPError
 from src.outputs.intention import log_intentions
 from src.strat.pdt import assert_pdt
@@ -17,6 +11,7 @@ from src.strat.pdt import assert_pdt
 from src.trading_day import n_trading_days_ago, now, today
 from src.wait import wait_until
 from src.data.finnhub.finnhub import get_candles
+from src.indicators import streaming
 from src.broker.generic import get_positions, get_account, buy_symbol_market, sell_symbol_market
 
 
@@ -39,23 +34,52 @@ def get_current_position(symbol: str):
 
 
 def get_rsi(candles, timeperiod=14) -> float:
-    closes = pd.Series(list(map(lambda c: float(c["close"]), candles[-(timeperiod + 1):])))
-    rsi: pd.Series = typing.cast(pd.Series, pandas_ta.rsi(closes, length=timeperiod))
-    return typing.cast(float, rsi.values[-1])
+    rsi = streaming.WindowedRSI(window=timeperiod)
+    for candle in candles[-(timeperiod + 1):]:
+        rsi.update(float(candle["close"]))
+    return rsi.value
 
 
 def get_williamsr(candles, timeperiod=20):
-    highs = pd.Series(list(map(lambda c: float(c["high"]), candles[-(timeperiod + 1):])))
-    lows = pd.Series(list(map(lambda c: float(c["low"]), candles[-(timeperiod + 1):])))
-    closes = pd.Series(list(map(lambda c: float(c["close"]), candles[-(timeperiod + 1):])))
-    willr: pd.Series = typing.cast(pd.Series, pandas_ta.willr(highs, lows, closes, length=timeperiod))
-    return typing.cast(float, willr.values[-1])
+    willr = streaming.WilliamsR(window=timeperiod)
+    for candle in candles[-(timeperiod + 1):]:
+        willr.update(float(candle["high"]), float(
+            candle["low"]), float(candle["close"]))
+    return willr.value
+
+
+class Indicators:
+    """
+    RSI and Williams %R state, updated only with candles newer than the last one seen (instead of every minute
+    recomputing from candles). Same values as `get_rsi` and `get_williamsr`.
+    """
+
+    def __init__(self, rsiperiod: int, williamsrperiod: int, slow_williamsrperiod: int):
+        self.rsi = streaming.WindowedRSI(window=rsiperiod)
+        self.williamsr = streaming.WilliamsR(window=williamsrperiod)
+        self.slow_williamsr = streaming.WilliamsR(window=slow_williamsrperiod)
+        self.last_datetime: typing.Optional[datetime] = None
+
+    def update(self, candles) -> None:
+        for candle in candles:
+            if self.last_datetime and candle["datetime"] <= self.last_datetime:
+                continue
+            high, low, close = float(candle["high"]), float(
+                candle["low"]), float(candle["close"])
+            self.rsi.update(close)
+            self.williamsr.update(high, low, close)
+            self.slow_williamsr.update(high, low, close)
+            self.last_datetime = candle["datetime"]
 
 
 def should_continue():
     return now().time() < time(16, 1)
 
 
+# symbol -> indicators, seeded on the first minute then kept up to date
+_indicators: dict[str, Indicators] = {}
+
+
 def loop(symbol: str):
     while should_continue():
         try:
@@ -114,9 +138,16 @@ def execute_phases(symbol: str):
     
     candles = get_candles(  # NOTE: all values are unadjusted
         symbol, "1", n_trading_days_ago(today(), 4), today())
-    rsi = get_rsi(candles, timeperiod=rsiperiod)
-    williamsr = get_williamsr(candles, timeperiod=williamsrperiod)
-    slow_williamsr = get_williamsr(candles, timeperiod=slow_williamsrperiod)
+    if symbol not in _indicators:
+        _indicators[symbol] = Indicators(
+            rsiperiod, williamsrperiod, slow_williamsrperiod)
+    indicators = _indicators[symbol]
+    # only closed candles, the one forming at next_interval_start would still change
+    indicators.update(
+        [c for c in candles if c["datetime"] < next_interval_start])
+    rsi = indicators.rsi.value
+    williamsr = indicators.williamsr.value
+    slow_williamsr = indicators.slow_williamsr.value
 
     latest_price = candles[-1]["close"]
 
@@ -1,7 +1,10 @@
+import bisect
 import dataclasses
 import datetime
 import typing
 
+from src.outputs import json_dump
+
 
 @dataclasses.dataclass
 class Intention:
@@ -20,6 +23,45 @@ class Intention:
     def from_dict(d):
         return Intention(datetime=d['datetime'], symbol=d['symbol'], extra=d['extra'])
 
+    def merge(self, other: "Intention") -> "Intention":
+        """
+        New intention with the fields of both, this one's winning on conflicts.
+        Autocreated intentions (see `FilledOrder.add_intention_field`) take the time of `other`.
+        """
+        if self.extra.get("autocreated"):
+            return Intention(datetime=other.datetime, symbol=other.symbol, extra={**other.extra, **{k: v for k, v in self.extra.items() if k != "autocreated"}})
+        return Intention(datetime=self.datetime, symbol=self.symbol, extra={**other.extra, **self.extra})
+
+
+INTENTION_SCHEMA = json_dump.Schema(datetimes=("datetime",))
+
+
+class IntentionIndex:
+    """Intentions by symbol, sorted by time, to find the latest intention of a symbol at some time."""
+
+    def __init__(self, intentions: typing.Iterable[Intention]):
+        by_symbol: dict[str, list[Intention]] = {}
+        for intention in intentions:
+            by_symbol.setdefault(intention.symbol, []).append(intention)
+
+        self.intentions: dict[str, list[Intention]] = {}
+        self.datetimes: dict[str, list[datetime.datetime]] = {}
+        for symbol, symbol_intentions in by_symbol.items():
+            # stable, so the first of intentions at the same time comes first
+            symbol_intentions.sort(key=lambda i: i.datetime)
+            self.intentions[symbol] = symbol_intentions
+            self.datetimes[symbol] = [i.datetime for i in symbol_intentions]
+
+    def find_latest(self, symbol: str, at: datetime.datetime) -> typing.Optional[Intention]:
+        """Latest intention of `symbol` at or before `at` (the first one given, of those at the same time), if any."""
+        datetimes = self.datetimes.get(symbol)
+        if not datetimes:
+            return None
+        i = bisect.bisect_right(datetimes, at)
+        if i == 0:
+            return None
+        return self.intentions[symbol][bisect.bisect_left(datetimes, datetimes[i - 1])]
+
 
 @dataclasses.dataclass
 class FilledOrder:
@@ -39,10 +81,13 @@ class FilledOrder:
 
         self.intention.extra[key] = value
 
-    def find_matching_intention(self, intentions: list[Intention]) -> typing.Optional[Intention]:
+    def find_matching_intention(self, intentions: typing.Union[list[Intention], IntentionIndex]) -> typing.Optional[Intention]:
         """
-        Finds intention that has same symbol as order and date before but nearest this order, if any
+        Finds intention that has same symbol as order and date before but nearest this order, if any.
+        Pass an `IntentionIndex` when matching many orders.
         """
+        if isinstance(intentions, IntentionIndex):
+            return intentions.find_latest(self.symbol, self.datetime)
         try:
             return max(filter(
                 lambda intention: intention.symbol == self.symbol and intention.datetime <= self.datetime,
@@ -78,42 +123,42 @@ class FilledOrder:
         return FilledOrder(intention=Intention.from_dict(d['intention']) if d.get('intention', False) else None, symbol=d['symbol'], price=d['price'], quantity=d['quantity'], datetime=d['datetime'])
 
 
+FILLED_ORDER_SCHEMA = json_dump.Schema(
+    datetimes=("datetime",), objects={"intention": INTENTION_SCHEMA})
+
+
 @dataclasses.dataclass
 class Trade:
     orders: list[FilledOrder]  # assumed to be ordered from first to last
 
     @staticmethod
-    def from_orders(orders: list[FilledOrder]) -> typing.Iterator:
+    def from_orders(orders: typing.Iterable[FilledOrder], include_open: bool = False, is_sorted: bool = False) -> typing.Iterator:
         """
-        Returns Trades grouped by symbol and related orders (when position quantity resets to 0)
+        Returns Trades grouped by symbol and related orders (when position quantity resets to 0), as they close.
+        With `is_sorted` (orders already by time, as in results), orders are streamed in one pass, keeping only
+        those of open positions.
+        With `include_open`, positions still open after the last order are returned last (by symbol first seen).
         """
-
-        def group_orders_by_trade(filled_orders: list[FilledOrder]) -> typing.Iterable[list[FilledOrder]]:
-            # group by symbol
-            orders_by_symbol: dict[str, list[FilledOrder]] = {}
-            for order in filled_orders:  # latest last
-                orders_by_symbol[order.symbol] = orders_by_symbol.get(
-                    order.symbol, []) + [order]
-
-            for grouped_orders in orders_by_symbol.values():
-                orders = sorted(grouped_orders, key=lambda o: o.datetime)
-                # group by orders that go from 0 to 0 position
-                # NOTE: open trades are not yielded
-                current_qty = 0
-                index_of_last_trade = 0
-                for i in range(len(orders)):
-                    order = orders[i]
-                    current_qty += order.quantity
-                    if current_qty == 0:
-
-                        # before : is inclusive, after : is exclusive
-                        trade_orders = orders[index_of_last_trade:i + 1]
-                        index_of_last_trade = i + 1
-
-                        yield trade_orders
-
-        for trade_orders in group_orders_by_trade(orders):
-            yield Trade(orders=sorted(trade_orders, key=lambda o: o.datetime))
+        if not is_sorted:
+            orders = sorted(orders, key=lambda o: o.datetime)
+
+        # orders and quantity of the open position of each symbol
+        open_orders: dict[str, list[FilledOrder]] = {}
+        open_quantities: dict[str, float] = {}
+        for order in orders:
+            trade_orders = open_orders.setdefault(order.symbol, [])
+            trade_orders.append(order)
+            quantity = open_quantities.get(order.symbol, 0) + order.quantity
+            if quantity == 0:
+                del open_orders[order.symbol]
+                open_quantities.pop(order.symbol, None)
+                yield Trade(orders=trade_orders)
+            else:
+                open_quantities[order.symbol] = quantity
+
+        if include_open:
+            for trade_orders in open_orders.values():
+                yield Trade(orders=trade_orders)
 
     def get_quantity(self) -> float:
         return sum(o.quantity for o in self.orders if o.is_buy())
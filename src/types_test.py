@@ -58,6 +58,32 @@ class TestTrade(unittest.TestCase):
         assert trade.get_start() == start
         assert trade.get_end() == start + datetime.timedelta(hours=9)
 
+    def test_from_orders_streamed_with_open(self):
+        start = now() - datetime.timedelta(hours=7)
+        orders = [
+            types.FilledOrder(intention=None, symbol='AAPL', quantity=50, price=50,
+                              datetime=start),
+            types.FilledOrder(intention=None, symbol='TSLA', quantity=10, price=800,
+                              datetime=start + datetime.timedelta(hours=1)),
+            types.FilledOrder(intention=None, symbol='AAPL', quantity=-50, price=60,
+                              datetime=start + datetime.timedelta(hours=2)),
+            types.FilledOrder(intention=None, symbol='QQQ', quantity=5, price=300,
+                              datetime=start + datetime.timedelta(hours=3)),
+            types.FilledOrder(intention=None, symbol='TSLA', quantity=-5, price=900,
+                              datetime=start + datetime.timedelta(hours=4)),
+        ]
+
+        trades = list(types.Trade.from_orders(iter(orders), is_sorted=True))
+        assert [t.orders for t in trades] == [[orders[0], orders[2]]]
+
+        trades = list(types.Trade.from_orders(
+            iter(orders), include_open=True, is_sorted=True))
+        assert [t.orders for t in trades] == [
+            [orders[0], orders[2]],
+            [orders[1], orders[4]],
+            [orders[3]],
+        ]
+
     def test_flow(self):
         start = now() - datetime.timedelta(hours=7)
         orders = [
@@ -139,6 +165,40 @@ class TestFilledOrder(unittest.TestCase):
 
         assert order.find_matching_intention([]) == None
 
+    def test_find_intention_with_index(self):
+        start = now()
+        intentions = [
+            types.Intention(datetime=start + datetime.timedelta(minutes=3),
+                            symbol='AAPL', extra={'i': 0}),
+            types.Intention(datetime=start + datetime.timedelta(minutes=1),
+                            symbol='AAPL', extra={'i': 1}),
+            types.Intention(datetime=start + datetime.timedelta(minutes=1),
+                            symbol='AAPL', extra={'i': 2}),
+            types.Intention(datetime=start + datetime.timedelta(minutes=2),
+                            symbol='TSLA', extra={'i': 3}),
+        ]
+        index = types.IntentionIndex(intentions)
+        for symbol in ['AAPL', 'TSLA', 'QQQ']:
+            for minutes in range(5):
+                order = types.FilledOrder(intention=None, symbol=symbol, quantity=1,
+                                          price=1, datetime=start + datetime.timedelta(minutes=minutes))
+                assert order.find_matching_intention(
+                    index) is order.find_matching_intention(intentions)
+
+    def test_merge_intentions(self):
+        start = now()
+        original = types.Intention(
+            datetime=start, symbol='AAPL', extra={'a': 1, 'b': 1})
+        other = types.Intention(datetime=start - datetime.timedelta(minutes=1),
+                                symbol='AAPL', extra={'b': 2, 'c': 2})
+        assert original.merge(other) == types.Intention(
+            datetime=start, symbol='AAPL', extra={'a': 1, 'b': 1, 'c': 2})
+
+        autocreated = types.Intention(
+            datetime=start, symbol='AAPL', extra={'autocreated': True, 'b': 1})
+        assert autocreated.merge(other) == types.Intention(
+            datetime=other.datetime, symbol='AAPL', extra={'b': 1, 'c': 2})
+
     def test_to_dict_from_dict(self):
         start = now()
         order = types.FilledOrder(intention=None, symbol='AAPL', quantity=1,